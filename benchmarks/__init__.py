@@ -0,0 +1,4 @@
+"""
+Benchmarks of skinpy's hot paths. Run them with `python -m benchmarks` from the
+root of the repository; see `python -m benchmarks --help`.
+"""
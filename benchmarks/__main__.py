@@ -0,0 +1,158 @@
+import sys
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Optional
+
+import click
+
+from benchmarks.cases import all_benchmarks
+from benchmarks.harness import (
+    compare,
+    format_bytes,
+    format_seconds,
+    load_results,
+    measure,
+    save_results,
+)
+
+RESULTS_PATH = Path(__file__).parent / "results"
+
+
+@click.command()
+@click.option(
+    "-k",
+    "--select",
+    "patterns",
+    multiple=True,
+    help=(
+        "Only run benchmarks whose names match this glob pattern, like "
+        "'render.*' or '*steve*'. Can be given more than once."
+    ),
+)
+@click.option(
+    "--quick",
+    is_flag=True,
+    help="Sweep fewer scaling factors, and time for less long.",
+)
+@click.option(
+    "--min-time",
+    type=click.FloatRange(min=0, min_open=True),
+    help=("Seconds that each repeat runs for.  [default: 0.2, or 0.05 with --quick]"),
+)
+@click.option(
+    "--repeats",
+    type=click.IntRange(min=1),
+    help="Number of repeats to time.  [default: 5, or 3 with --quick]",
+)
+@click.option(
+    "-o",
+    "--output-path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=RESULTS_PATH / "latest.json",
+    show_default=True,
+    help="Path to write the results to, as JSON.",
+)
+@click.option(
+    "-b",
+    "--baseline",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=RESULTS_PATH / "baseline.json",
+    show_default=True,
+    help="Results to compare against, if the file exists.",
+)
+@click.option(
+    "--save-baseline",
+    is_flag=True,
+    help="Write the results to --baseline too, for later runs to compare against.",
+)
+@click.option(
+    "-t",
+    "--threshold",
+    type=click.FloatRange(min=0),
+    default=0.1,
+    show_default=True,
+    help=(
+        "Fraction by which the fastest time or peak memory of a benchmark can "
+        "grow over the baseline before it's a regression."
+    ),
+)
+def main(
+    patterns: tuple[str, ...],
+    quick: bool,
+    min_time: Optional[float],
+    repeats: Optional[int],
+    output_path: Path,
+    baseline: Path,
+    save_baseline: bool,
+    threshold: float,
+):
+    """
+    Measure skinpy's load, lookup, enumerate, render and encode paths.
+
+    Each benchmark reports the fastest and median time per operation, and the
+    peak memory and the memory left allocated by one operation. Encoders report
+    the size of their output too. With a
+    baseline, the command exits with status 1 if any benchmark regressed past
+    --threshold.
+    """
+    benchmarks = [
+        benchmark
+        for benchmark in all_benchmarks(quick=quick)
+        if not patterns or any(fnmatch(benchmark.name, p) for p in patterns)
+    ]
+    if not benchmarks:
+        raise click.UsageError("No benchmarks match")
+    min_time = min_time or (0.05 if quick else 0.2)
+    repeats = repeats or (3 if quick else 5)
+
+    print(
+        f"{'benchmark':<64} {'fastest':>10} {'median':>10} {'peak':>11} "
+        f"{'allocated':>11} blocks {'output':>11}"
+    )
+    results = []
+    for benchmark in benchmarks:
+        result = measure(benchmark, min_time=min_time, repeats=repeats)
+        results.append(result)
+        output = result.output_bytes
+        print(
+            f"{result.name:<64} {format_seconds(result.min_seconds):>10} "
+            f"{format_seconds(result.median_seconds):>10} "
+            f"{format_bytes(result.peak_bytes):>11} "
+            f"{format_bytes(result.allocated_bytes):>11} "
+            f"{result.allocated_blocks:6d} "
+            f"{'' if output is None else format_bytes(output):>11}"
+        )
+
+    save_results(output_path, results)
+    print(f"\nWrote {len(results)} results to {output_path}")
+
+    regressed = False
+    if baseline.exists() and not save_baseline:
+        comparisons = compare(results, load_results(baseline))
+        print(f"\nCompared with {baseline}, at a threshold of {threshold:.0%}:")
+        print(f"{'benchmark':<64} {'time':>8} {'peak':>8} {'output':>8}")
+        for comparison in comparisons:
+            regressions = comparison.regressions(threshold)
+            regressed = regressed or bool(regressions)
+            peak_ratio = comparison.peak_ratio
+            peak = "" if peak_ratio is None else f"{peak_ratio - 1:+.1%}"
+            output_ratio = comparison.output_ratio
+            output = "" if output_ratio is None else f"{output_ratio - 1:+.1%}"
+            flag = f"  REGRESSED: {', '.join(regressions)}" if regressions else ""
+            print(
+                f"{comparison.result.name:<64} "
+                f"{comparison.time_ratio - 1:>+8.1%} {peak:>8} {output:>8}{flag}"
+            )
+        missing = len(results) - len(comparisons)
+        if missing:
+            print(f"{missing} benchmarks aren't in the baseline")
+    if save_baseline:
+        save_results(baseline, results)
+        print(f"Wrote the baseline to {baseline}")
+
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+from __future__ import annotations
+
+import itertools
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from skinpy import (
+    CLASSIC_LAYOUT,
+    Encoding,
+    SLIM_LAYOUT,
+    Perspective,
+    RenderPlan,
+    Skin,
+    SkinLayout,
+)
+from skinpy.types import FACE_IDS
+
+from benchmarks.harness import Benchmark
+
+FIXTURE_PATH = Path(__file__).parent.parent / "tests" / "fixtures" / "skins"
+STEVE_PATH = FIXTURE_PATH / "steve.png"
+LAB_PATH = FIXTURE_PATH / "lab.png"
+
+# every axis-sign perspective
+PERSPECTIVES = [
+    Perspective.new(x=x, y=y, z=z)
+    for x, y, z in itertools.product(
+        ("left", "right"), ("front", "back"), ("up", "down")
+    )
+]
+SCALING_FACTORS = (1, 5, 10, 20)
+QUICK_SCALING_FACTORS = (5,)
+
+
+def synthetic_skin(layout: SkinLayout = CLASSIC_LAYOUT, seed: int = 0) -> Skin:
+    """
+    A skin of random colors, with a mix of transparent, translucent and opaque
+    texels.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = layout.image_size
+    image_color = rng.integers(0, 256, (width, height, 4), dtype=np.uint8)
+    image_color[..., 3] = rng.choice([0, 128, 255], (width, height))
+    return Skin.new(image_color, layout=layout)
+
+
+# the skins to measure, made when a benchmark is set up
+SKINS: dict[str, Callable[[], Skin]] = {
+    "steve": lambda: Skin.from_path(STEVE_PATH),
+    "lab": lambda: Skin.from_path(LAB_PATH),
+    "synthetic": synthetic_skin,
+    "synthetic-slim": lambda: synthetic_skin(SLIM_LAYOUT),
+    "synthetic-hd": lambda: synthetic_skin(CLASSIC_LAYOUT.scaled(4)),
+}
+
+
+def perspective_name(perspective: Perspective) -> str:
+    return f"{perspective.x}-{perspective.y}-{perspective.z}"
+
+
+def load_benchmarks() -> list[Benchmark]:
+    buffer = np.zeros((64, 64, 4), dtype=np.uint8)
+    steve_bytes = STEVE_PATH.read_bytes()
+    return [
+        Benchmark(
+            f"load.from_path[{name}]",
+            "load",
+            lambda path=path: lambda: Skin.from_path(path),
+            {"skin": name},
+        )
+        for name, path in (("steve", STEVE_PATH), ("lab", LAB_PATH))
+    ] + [
+        Benchmark(
+            "load.from_bytes[steve]",
+            "load",
+            lambda: lambda: Skin.from_bytes(steve_bytes),
+            {"skin": "steve"},
+        ),
+        Benchmark("load.new[blank]", "load", lambda: Skin.new),
+        Benchmark(
+            "load.new[image_color]",
+            "load",
+            lambda: lambda: Skin.new(image_color=buffer),
+        ),
+        # body parts and faces are built on first access
+        Benchmark(
+            "load.new[image_color]+one_face",
+            "load",
+            lambda: lambda: Skin.new(image_color=buffer).head.front,
+        ),
+        Benchmark(
+            "load.new[image_color]+every_face",
+            "load",
+            lambda: lambda: [
+                part.faces for part in Skin.new(image_color=buffer).body_parts
+            ],
+        ),
+    ]
+
+
+def voxels(skin: Skin, count: int) -> tuple[np.ndarray, ...]:
+    """
+    Return the x, y, z and face index of `count` voxel faces of the skin, spread
+    over all of them, so that lookups work on skins of any layout.
+    """
+    table = skin.voxel_table()
+    rows = np.linspace(0, len(table.x) - 1, count).astype(np.intp)
+    return table.x[rows], table.y[rows], table.z[rows], table.face_index[rows]
+
+
+def lookup_benchmarks() -> list[Benchmark]:
+    benchmarks = []
+    for name in ("steve", "synthetic-hd"):
+
+        def get_color(name=name):
+            skin = SKINS[name]()
+            # the middle voxel face
+            x, y, z, face_index = (int(column[1]) for column in voxels(skin, 3))
+            face_id = FACE_IDS[face_index]
+            return lambda: skin.get_color(x, y, z, face_id)
+
+        def body_part_get_color(name=name):
+            head = SKINS[name]().head
+            return lambda: head.get_color(0, 1, 2, "left")
+
+        def face_get_color(name=name):
+            face = SKINS[name]().left_arm.up
+            return lambda: face.get_color(1, 1)
+
+        def get_colors(name=name):
+            skin = SKINS[name]()
+            x, y, z, face_index = voxels(skin, 64)
+            return lambda: skin.get_colors(x, y, z, face_index)
+
+        benchmarks += [
+            Benchmark(f"lookup.get_color[{name}]", "lookup", get_color, {"skin": name}),
+            Benchmark(
+                f"lookup.body_part.get_color[{name}]",
+                "lookup",
+                body_part_get_color,
+                {"skin": name},
+            ),
+            Benchmark(
+                f"lookup.face.get_color[{name}]",
+                "lookup",
+                face_get_color,
+                {"skin": name},
+            ),
+            Benchmark(
+                f"lookup.get_colors[{name},64]",
+                "lookup",
+                get_colors,
+                {"skin": name, "count": 64},
+            ),
+        ]
+    return benchmarks
+
+
+def enumerate_benchmarks() -> list[Benchmark]:
+    benchmarks = []
+    for name in ("steve", "synthetic-hd"):
+
+        def enumerate_color(name=name):
+            skin = SKINS[name]()
+            return lambda: list(skin.enumerate_color())
+
+        def voxel_table(name=name):
+            skin = SKINS[name]()
+            return lambda: skin.voxel_table().colors
+
+        benchmarks += [
+            Benchmark(
+                f"enumerate.enumerate_color[{name}]",
+                "enumerate",
+                enumerate_color,
+                {"skin": name},
+            ),
+            Benchmark(
+                f"enumerate.voxel_table[{name}]",
+                "enumerate",
+                voxel_table,
+                {"skin": name},
+            ),
+        ]
+    return benchmarks
+
+
+def render_benchmarks(quick: bool = False) -> list[Benchmark]:
+    scaling_factors = QUICK_SCALING_FACTORS if quick else SCALING_FACTORS
+    benchmarks = []
+
+    # compiling a plan is the cold cost of a new perspective, which the plan
+    # cache hides from the renders below
+    for perspective in PERSPECTIVES:
+        view = perspective_name(perspective)
+        benchmarks.append(
+            Benchmark(
+                f"render.compile_plan[{view},10,overlay]",
+                "render",
+                lambda perspective=perspective: lambda: RenderPlan.compile(
+                    perspective, overlay=True
+                ),
+                {"perspective": view, "scaling_factor": 10, "overlay": True},
+            )
+        )
+
+    for perspective, scaling_factor, overlay in itertools.product(
+        PERSPECTIVES, scaling_factors, (False, True)
+    ):
+        view = perspective_name(perspective)
+        projection = Perspective.new(
+            x=perspective.x,
+            y=perspective.y,
+            z=perspective.z,
+            scaling_factor=scaling_factor,
+        )
+
+        def render(projection=projection, overlay=overlay):
+            skin = SKINS["steve"]()
+            # warm the plan cache
+            skin.to_isometric_image(projection, backend="numpy", overlay=overlay)
+            return lambda: skin.to_isometric_image(
+                projection, backend="numpy", overlay=overlay
+            )
+
+        benchmarks.append(
+            Benchmark(
+                f"render.isometric[steve,{view},{scaling_factor}"
+                f"{',overlay' if overlay else ''}]",
+                "render",
+                render,
+                {
+                    "skin": "steve",
+                    "perspective": view,
+                    "scaling_factor": scaling_factor,
+                    "overlay": overlay,
+                    "backend": "numpy",
+                },
+            )
+        )
+
+    # the default backend, and the other skins, at one perspective
+    perspective = PERSPECTIVES[0]
+    view = perspective_name(perspective)
+
+    # translucent overlay texels are the slow path of compositing, so the
+    # synthetic skin is measured with and without the overlay too
+    for scaling_factor, overlay in itertools.product(scaling_factors, (False, True)):
+        projection = Perspective.new(
+            x=perspective.x,
+            y=perspective.y,
+            z=perspective.z,
+            scaling_factor=scaling_factor,
+        )
+
+        def render_synthetic(projection=projection, overlay=overlay):
+            skin = SKINS["synthetic"]()
+            skin.to_isometric_image(projection, backend="numpy", overlay=overlay)
+            return lambda: skin.to_isometric_image(
+                projection, backend="numpy", overlay=overlay
+            )
+
+        benchmarks.append(
+            Benchmark(
+                f"render.isometric[synthetic,{view},{scaling_factor}"
+                f"{',overlay' if overlay else ''}]",
+                "render",
+                render_synthetic,
+                {
+                    "skin": "synthetic",
+                    "perspective": view,
+                    "scaling_factor": scaling_factor,
+                    "overlay": overlay,
+                    "backend": "numpy",
+                },
+            )
+        )
+
+
+    for name, backend in (
+        ("steve", "imagedraw"),
+        ("lab", "numpy"),
+        ("synthetic-slim", "numpy"),
+        ("synthetic-hd", "numpy"),
+    ):
+
+        def render_skin(name=name, backend=backend):
+            skin = SKINS[name]()
+            skin.to_isometric_image(perspective, backend=backend, overlay=True)
+            return lambda: skin.to_isometric_image(
+                perspective, backend=backend, overlay=True
+            )
+
+        benchmarks.append(
+            Benchmark(
+                f"render.isometric[{name},{view},10,overlay,{backend}]",
+                "render",
+                render_skin,
+                {
+                    "skin": name,
+                    "perspective": view,
+                    "scaling_factor": 10,
+                    "overlay": True,
+                    "backend": backend,
+                },
+            )
+        )
+
+    # straight to arrays, without a Pillow image, and into a preallocated one
+    for into in (False, True):
+
+        def render_array(into=into):
+            skin = SKINS["steve"]()
+            out = skin.to_isometric_array(perspective, overlay=True) if into else None
+            return lambda: skin.to_isometric_array(perspective, overlay=True, out=out)
+
+        benchmarks.append(
+            Benchmark(
+                f"render.isometric_array[steve,{view},10,overlay"
+                f"{',out' if into else ''}]",
+                "render",
+                render_array,
+                {
+                    "skin": "steve",
+                    "perspective": view,
+                    "scaling_factor": 10,
+                    "overlay": True,
+                    "out": into,
+                },
+            )
+        )
+    return benchmarks
+
+
+# the encodings to measure, by name
+ENCODINGS = {
+    "png": Encoding(),
+    "png-1": Encoding(compress_level=1),
+    "png-9": Encoding(compress_level=9),
+    "png-rle": Encoding(strategy="rle"),
+    "png-filtered": Encoding(strategy="filtered"),
+    "png-palette": Encoding(palette=True),
+    "png-9-palette": Encoding(compress_level=9, palette=True),
+    "webp": Encoding("webp"),
+    "webp-0": Encoding("webp", method=0),
+    "webp-6": Encoding("webp", method=6),
+    "raw": Encoding("raw"),
+}
+
+
+def encode_benchmarks(quick: bool = False) -> list[Benchmark]:
+    scaling_factors = QUICK_SCALING_FACTORS if quick else SCALING_FACTORS[1:]
+    perspective = PERSPECTIVES[0]
+    view = perspective_name(perspective)
+    benchmarks = []
+    for (name, encoding), scaling_factor, skin_name in itertools.product(
+        ENCODINGS.items(), scaling_factors, ("steve", "lab")
+    ):
+
+        def encode(
+            encoding=encoding, scaling_factor=scaling_factor, skin_name=skin_name
+        ):
+            image = SKINS[skin_name]().to_isometric_image(
+                Perspective.new(
+                    x=perspective.x,
+                    y=perspective.y,
+                    z=perspective.z,
+                    scaling_factor=scaling_factor,
+                ),
+                backend="numpy",
+                overlay=True,
+            )
+            return lambda: encoding.encode(image)
+
+        benchmarks.append(
+            Benchmark(
+                f"encode.{name}[{skin_name},{view},{scaling_factor},overlay]",
+                "encode",
+                encode,
+                {
+                    "skin": skin_name,
+                    "perspective": view,
+                    "scaling_factor": scaling_factor,
+                    "encoding": name,
+                },
+                output_size=len,
+            )
+        )
+    return benchmarks
+
+
+def all_benchmarks(quick: bool = False) -> list[Benchmark]:
+    return (
+        load_benchmarks()
+        + lookup_benchmarks()
+        + enumerate_benchmarks()
+        + render_benchmarks(quick)
+        + encode_benchmarks(quick)
+    )
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import gc
+import importlib.metadata
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+import numpy as np
+import PIL
+from attrs import asdict, field, frozen
+
+# results files say which version of this layout they are
+SCHEMA_VERSION = 1
+
+# memory changes smaller than this are noise, like a dict resizing
+MEMORY_NOISE_BYTES = 4096
+
+
+@frozen
+class Benchmark:
+    """
+    One thing to measure. `setup` does whatever shouldn't be measured, like
+    loading fixtures or warming caches, and returns the operation to time.
+    """
+
+    name: str
+
+    # the stage of the library being measured: load, lookup, enumerate, render or
+    # encode
+    group: str
+
+    setup: Callable[[], Callable[[], object]]
+
+    # what the benchmark is swept over, like the perspective and scaling factor
+    params: dict[str, Any] = field(factory=dict)
+
+    # for operations whose output size matters, like encoders, the size in bytes
+    # of what the operation returns
+    output_size: Optional[Callable[[Any], int]] = None
+
+
+@frozen
+class Result:
+    """
+    The measurements of a benchmark. Times are per operation, in seconds, over
+    `repeats` runs of `number` operations each, and memory is of one operation.
+    """
+
+    name: str
+    group: str
+    params: dict[str, Any]
+    number: int
+    repeats: int
+    min_seconds: float
+    median_seconds: float
+    mean_seconds: float
+    # the most memory in use at once, above what was in use before
+    peak_bytes: int
+    # the memory blocks, and their bytes, that were allocated and are still in
+    # use afterwards, the result included
+    allocated_blocks: int
+    allocated_bytes: int
+    # the size of the output, for benchmarks with an `output_size`
+    output_bytes: Optional[int] = None
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> Result:
+        return cls(**data)
+
+
+def measure(benchmark: Benchmark, min_time: float = 0.2, repeats: int = 5) -> Result:
+    """
+    Time a benchmark, running it as many times per repeat as takes `min_time`
+    seconds, then trace the memory of one more run.
+
+    Memory is what Python and NumPy allocate, which tracemalloc sees. Pillow's
+    image buffers aren't included.
+    """
+    operation = benchmark.setup()
+    # warm up, and find how many operations take long enough to time
+    number = 1
+    while True:
+        elapsed = _time(operation, number)
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+    times = [_time(operation, number) / number for _ in range(repeats)]
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        # kept alive until the snapshot, to count it
+        result = operation()
+        _, peak = tracemalloc.get_traced_memory()
+        # everything traced was allocated by the operation
+        statistics_ = tracemalloc.take_snapshot().statistics("filename")
+    finally:
+        tracemalloc.stop()
+    output_bytes = (
+        None if benchmark.output_size is None else benchmark.output_size(result)
+    )
+    del result
+
+    return Result(
+        name=benchmark.name,
+        group=benchmark.group,
+        params=dict(benchmark.params),
+        number=number,
+        repeats=repeats,
+        min_seconds=min(times),
+        median_seconds=statistics.median(times),
+        mean_seconds=statistics.fmean(times),
+        peak_bytes=peak,
+        allocated_blocks=sum(stat.count for stat in statistics_),
+        allocated_bytes=sum(stat.size for stat in statistics_),
+        output_bytes=output_bytes,
+    )
+
+
+def _time(operation: Callable[[], object], number: int) -> float:
+    # garbage collection pauses would land on whichever run was unlucky
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            operation()
+        return time.perf_counter() - start
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def environment() -> dict[str, Any]:
+    """
+    What the results were measured on, to tell apart results that can't be
+    compared.
+    """
+    try:
+        version = importlib.metadata.version("skinpy")
+    except importlib.metadata.PackageNotFoundError:
+        version = None
+    return {
+        "skinpy": version,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def save_results(path: Path, results: Iterable[Result]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        "schema": SCHEMA_VERSION,
+        "environment": environment(),
+        "results": [asdict(result) for result in results],
+    }
+    path.write_text(json.dumps(data, indent=2) + "\n")
+
+
+def load_results(path: Path) -> list[Result]:
+    data = json.loads(path.read_text())
+    if data.get("schema") != SCHEMA_VERSION:
+        raise ValueError(
+            f"{path} has results of schema {data.get('schema')}, not "
+            f"{SCHEMA_VERSION}. Measure a new baseline."
+        )
+    return [Result.from_json(result) for result in data["results"]]
+
+
+@frozen
+class Comparison:
+    """
+    A result next to the same benchmark's result in the baseline.
+    """
+
+    result: Result
+    baseline: Result
+
+    @property
+    def time_ratio(self) -> float:
+        # the fastest repeat is the least disturbed by whatever else the machine
+        # was doing
+        return self.result.min_seconds / self.baseline.min_seconds
+
+    @property
+    def peak_ratio(self) -> Optional[float]:
+        # None when the difference is too small to mean anything
+        if abs(self.result.peak_bytes - self.baseline.peak_bytes) < MEMORY_NOISE_BYTES:
+            return None
+        return self.result.peak_bytes / max(self.baseline.peak_bytes, 1)
+
+    @property
+    def output_ratio(self) -> Optional[float]:
+        if self.result.output_bytes is None or self.baseline.output_bytes is None:
+            return None
+        return self.result.output_bytes / max(self.baseline.output_bytes, 1)
+
+    def regressions(self, threshold: float) -> list[str]:
+        """
+        Return what got worse by more than `threshold`, as a fraction.
+        """
+        found = []
+        if self.time_ratio > 1 + threshold:
+            found.append("time")
+        peak_ratio = self.peak_ratio
+        if peak_ratio is not None and peak_ratio > 1 + threshold:
+            found.append("peak memory")
+        output_ratio = self.output_ratio
+        if output_ratio is not None and output_ratio > 1 + threshold:
+            found.append("output size")
+        return found
+
+
+def compare(results: Iterable[Result], baseline: Iterable[Result]) -> list[Comparison]:
+    """
+    Pair results with the baseline results of the same benchmarks. Benchmarks
+    that only one of them has are left out.
+    """
+    by_name = {result.name: result for result in baseline}
+    return [
+        Comparison(result=result, baseline=by_name[result.name])
+        for result in results
+        if result.name in by_name
+    ]
+
+
+def format_seconds(seconds: float) -> str:
+    for unit, factor in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= factor:
+            return f"{seconds / factor:7.2f} {unit}"
+    return f"{seconds / 1e-9:7.2f} ns"
+
+
+def format_bytes(count: int) -> str:
+    for unit, factor in (("MiB", 1 << 20), ("KiB", 1 << 10)):
+        if count >= factor:
+            return f"{count / factor:7.1f} {unit}"
+    return f"{count:7d} B  "
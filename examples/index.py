@@ -1,7 +1,10 @@
 from pathlib import Path
+from typing import Iterator
 
-from PIL import Image, ImageOps, ImageDraw, ImageFont
-from skinpy import Skin, Perspective
+import numpy as np
+from PIL import ImageOps, ImageDraw, ImageFont
+from skinpy import IncrementalRenderer, Skin, Perspective
+from skinpy.animation import write_animation
 
 FONT_SIZE = SCALING_FACTOR = 40
 FONT = ImageFont.truetype("courbd.ttf", FONT_SIZE)  # Courier New
@@ -16,9 +19,10 @@ PERSPECTIVE = Perspective.new(
     scaling_factor=SCALING_FACTOR,
 )
 
-if __name__ == "__main__":
-    skin = Skin.from_path(SOURCE_PATH)
-    frames: list[Image.Image] = []
+
+def annotated_frames(skin: Skin) -> Iterator[np.ndarray]:
+    # each frame recolors one texel, so only its pixels need to be redrawn
+    renderer = IncrementalRenderer(skin, PERSPECTIVE, background_color=BACKGROUND_COLOR)
 
     for (x, y, z), body_part_id, face_id, color in skin.enumerate_color():
         # don't highlight pixels we can't see for demo
@@ -33,9 +37,7 @@ if __name__ == "__main__":
         old_color = color.copy()
         old_color_hex = f"#{old_color[0]:02x}{old_color[1]:02x}{old_color[2]:02x}"
         color[:3] = 255 - color[:3]
-        frame = skin.to_isometric_image(
-            perspective=PERSPECTIVE, background_color=BACKGROUND_COLOR
-        )
+        frame = renderer.render()
 
         body_part = skin.get_body_part_for_id(body_part_id)
         body_part_coord = (
@@ -109,16 +111,12 @@ if __name__ == "__main__":
                     outline=(255, 255, 255),
                 )
 
-        frames.append(frame)
+        yield np.array(frame)
         color[:] = old_color
 
-    DEST_PATH.parent.mkdir(exist_ok=True, parents=True)
 
-    frames[0].save(
-        DEST_PATH,
-        save_all=True,
-        append_images=frames[1:],
-        duration=100,
-        include_color_table=True,
-        loop=0,
-    )
+if __name__ == "__main__":
+    skin = Skin.from_path(SOURCE_PATH)
+    DEST_PATH.parent.mkdir(exist_ok=True, parents=True)
+    # frames are encoded as they're made, as the pixels that changed
+    write_animation(annotated_frames(skin), DEST_PATH, duration=100, loop=0)
@@ -4,14 +4,14 @@ Generate some example skins
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Callable, Literal, ClassVar, TypeAlias, cast, Any
+from typing import Callable, Literal, ClassVar, TypeAlias, Any
 
 from attr import frozen
 import numpy as np
 from colorspacious import cspace_convert  # type: ignore
 from matplotlib import colors
 
-from skinpy import Skin, FaceId, RGBA, Perspective
+from skinpy import Skin, FaceId, Perspective, FACE_IDS
 
 SKINS_PATH = Path(__file__).parent / "skins"
 RENDER_PATH = Path(__file__).parent / "render"
@@ -79,39 +79,30 @@ class FencedSpace:
             axis=axis,
         )
 
-    def sample(self, i: int, face_id: FaceId) -> float:
-        face_offset_map = self.FACE_ID_MAP.get(self.axis)
-        base = i * 2 + 1
-        if face_offset_map is not None and face_id in face_offset_map:
-            offset = face_offset_map[face_id]
-            return self.space[base + offset]
-        return self.space[base]
-
-
-def round_and_clip(arr: np.ndarray[Any, Any]) -> tuple[int, int, int]:
-    return cast(
-        tuple[int, int, int],
-        tuple(arr.round().clip(0, 255).astype(np.uint8).tolist()),
-    )
+    def sample(
+        self,
+        i: np.ndarray[tuple[int], np.dtype[np.intp]],
+        face_index: np.ndarray[tuple[int], np.dtype[np.intp]],
+    ) -> np.ndarray[tuple[int], np.dtype[np.float16]]:
+        """Sample the space at arrays of positions and face indices."""
+        offsets = np.zeros(len(FACE_IDS), dtype=np.intp)
+        for face_id, offset in self.FACE_ID_MAP.get(self.axis, {}).items():
+            offsets[FACE_IDS.index(face_id)] = offset
+        return self.space[i * 2 + 1 + offsets[face_index]]
 
 
 def convert(
-    from_color: tuple[float, float, float],
+    from_colors: np.ndarray[Any, Any],
     from_space: str,
     to_space: str,
-) -> RGBA:
-    """Helper for cspace_convert. Also rounds and clips the result."""
-    r, g, b = cast(
-        tuple[int, int, int],
-        round_and_clip(
-            cspace_convert(  # type: ignore
-                from_color,
-                from_space,
-                to_space,
-            )
-        ),
-    )
-    return (r, g, b, 255)
+) -> np.ndarray[Any, Any]:
+    """
+    Helper for cspace_convert on an (n, 3) array of colors. Also rounds and
+    clips the result, and returns (n, 4) RGBA.
+    """
+    rgb = cspace_convert(from_colors, from_space, to_space)  # type: ignore
+    alpha = np.full((len(rgb), 1), 255)
+    return np.hstack((rgb.round().clip(0, 255), alpha)).astype(np.uint8)
 
 
 @collect
@@ -122,24 +113,17 @@ def generate_white():
 
 def generate_gradient(shape_idx: int, axis: Axis, file_name: str):
     skin = Skin.new()
+    table = skin.voxel_table()
     gradient = FencedSpace.new((0, 100), skin.shape[shape_idx] + 1, axis)
-    for (x, y, z), _, face_id, _ in skin.enumerate_color():
-        if axis == "x":
-            sample = gradient.sample(x, face_id)
-        elif axis == "y":
-            sample = gradient.sample(y, face_id)
-        else:
-            sample = gradient.sample(z, face_id)
-
-        # use CIELAB Lightness as the gradient. RGB is not perceptually uniform.
-        lab = (
-            sample,
-            0,  # no chroma
-            0,  # no chroma
-        )
+    coords = (table.x, table.y, table.z)
+    samples = gradient.sample(coords[shape_idx], table.face_index)
+
+    # use CIELAB Lightness as the gradient. RGB is not perceptually uniform.
+    lab = np.zeros((len(table), 3))
+    lab[:, 0] = samples  # no chroma in the other two
 
-        rgba = convert(lab, "CIELab", "sRGB255")
-        skin.set_color(x, y, z, face_id, rgba)
+    rgba = convert(lab, "CIELab", "sRGB255")
+    skin.set_colors(*coords, table.face_index, rgba)
     skin.to_image().save(SKINS_PATH / file_name)
     skin.to_isometric_image(PERSPECTIVE).save(RENDER_PATH / file_name)
 
@@ -167,26 +151,21 @@ def generate_hsv_space():
     center = np.array([x_max / 2, y_max / 2])
     dist_max = max(x_max, y_max) / 2
 
-    for (x, y, z), _, face_id, _ in skin.enumerate_color():
-        hue = (np.arctan2(y - center[1], x - center[0]) + np.pi) / (2 * np.pi)
+    table = skin.voxel_table()
+    x, y, z = table.x, table.y, table.z
 
-        saturation = (
-            np.sqrt((x - center[0]) ** 2 + (y - center[1]) ** 2) / dist_max
-        ).clip(0, 1)
+    hue = (np.arctan2(y - center[1], x - center[0]) + np.pi) / (2 * np.pi)
 
-        value = z / z_max
+    saturation = (
+        np.sqrt((x - center[0]) ** 2 + (y - center[1]) ** 2) / dist_max
+    ).clip(0, 1)
 
-        r, g, b = round_and_clip(
-            colors.hsv_to_rgb(  # type: ignore
-                [
-                    hue,
-                    saturation,
-                    value,
-                ]
-            )
-            * 255
-        )
-        skin.set_color(x, y, z, face_id, (r, g, b, 255))
+    value = z / z_max
+
+    rgb = colors.hsv_to_rgb(np.stack((hue, saturation, value), axis=1)) * 255
+    rgba = np.full((len(table), 4), 255, dtype=np.uint8)
+    rgba[:, :3] = rgb.round().clip(0, 255)
+    skin.set_colors(x, y, z, table.face_index, rgba)
 
     file_name = "hsv_space.png"
     skin.to_image().save(SKINS_PATH / file_name)
@@ -207,15 +186,18 @@ def generate_lab_space():
     a_space = FencedSpace.new((-128, 127), x_max + 1, "x")
     b_space = FencedSpace.new((127, -128), y_max + 1, "y")
 
-    for (x, y, z), _, face_id, _ in skin.enumerate_color():
-        lab = (
-            l_space.sample(z, face_id),
-            a_space.sample(x, face_id),
-            b_space.sample(y, face_id),
-        )
+    table = skin.voxel_table()
+    lab = np.stack(
+        (
+            l_space.sample(table.z, table.face_index),
+            a_space.sample(table.x, table.face_index),
+            b_space.sample(table.y, table.face_index),
+        ),
+        axis=1,
+    )
 
-        rgba = convert(lab, "CIELab", "sRGB255")
-        skin.set_color(x, y, z, face_id, rgba)
+    rgba = convert(lab, "CIELab", "sRGB255")
+    skin.set_colors(table.x, table.y, table.z, table.face_index, rgba)
 
     file_name = "lab_space.png"
     skin.to_image().save(SKINS_PATH / file_name)
@@ -232,15 +214,18 @@ def generate_xyz100_space():
     y_space = FencedSpace.new((0, 100), y_max + 1, "y")
     z_space = FencedSpace.new((0, 100), z_max + 1, "z")
 
-    for (x, y, z), _, face_id, _ in skin.enumerate_color():
-        xyz = (
-            x_space.sample(x, face_id),
-            y_space.sample(y, face_id),
-            z_space.sample(z, face_id),
-        )
+    table = skin.voxel_table()
+    xyz = np.stack(
+        (
+            x_space.sample(table.x, table.face_index),
+            y_space.sample(table.y, table.face_index),
+            z_space.sample(table.z, table.face_index),
+        ),
+        axis=1,
+    )
 
-        rgba = convert(xyz, "XYZ100", "sRGB255")
-        skin.set_color(x, y, z, face_id, rgba)
+    rgba = convert(xyz, "XYZ100", "sRGB255")
+    skin.set_colors(table.x, table.y, table.z, table.face_index, rgba)
 
     file_name = "xyz100_space.png"
     skin.to_image().save(SKINS_PATH / file_name)
@@ -4,27 +4,155 @@
 # > re-export of the symbol.
 # See https://github.com/microsoft/pylance-release/issues/856#issuecomment-763793949
 
-from skinpy.skin import (
-    Skin as Skin,
-    BodyPart as BodyPart,
-    Face as Face,
-    UnmappedVoxelError as UnmappedVoxelError,
-)
-
-from skinpy.render import (
-    Perspective as Perspective,
-)
-
-from skinpy.types import (
-    ImageColor as ImageColor,
-    R3 as R3,
-    R2 as R2,
-    RGBA as RGBA,
-    XFaceId as XFaceId,
-    YFaceId as YFaceId,
-    ZFaceId as ZFaceId,
-    FaceId as FaceId,
-    BodyPartId as BodyPartId,
-    PolygonPoints as PolygonPoints,
-    StrPath as StrPath,
-)
+# importing skinpy is cheap: numpy, Pillow and the renderer are only imported
+# when one of the names below is first used, so that short-lived processes,
+# like `skinpy --help`, don't pay for them
+
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from skinpy.skin import (
+        Skin as Skin,
+        BodyPart as BodyPart,
+        Face as Face,
+        VoxelTable as VoxelTable,
+        UnmappedVoxelError as UnmappedVoxelError,
+        InputImageException as InputImageException,
+    )
+
+    from skinpy.render import (
+        Perspective as Perspective,
+        Camera as Camera,
+        Projection as Projection,
+        ISOMETRIC_PITCH as ISOMETRIC_PITCH,
+    )
+
+    from skinpy.layout import (
+        SkinLayout as SkinLayout,
+        PartLayout as PartLayout,
+        CLASSIC_LAYOUT as CLASSIC_LAYOUT,
+        SLIM_LAYOUT as SLIM_LAYOUT,
+        LEGACY_LAYOUT as LEGACY_LAYOUT,
+        layout_for_size as layout_for_size,
+    )
+
+    from skinpy.stack import (
+        SkinStack as SkinStack,
+    )
+
+    from skinpy.store import (
+        SkinStore as SkinStore,
+        SkinStoreError as SkinStoreError,
+    )
+
+    from skinpy.plan import (
+        RenderPlan as RenderPlan,
+        get_render_plan as get_render_plan,
+    )
+
+    from skinpy.incremental import (
+        IncrementalRenderer as IncrementalRenderer,
+    )
+
+    from skinpy.cache import (
+        RenderCache as RenderCache,
+        CacheStats as CacheStats,
+    )
+
+    from skinpy.flat import (
+        FlatView as FlatView,
+        get_flat_view as get_flat_view,
+    )
+
+    from skinpy.encode import (
+        Encoding as Encoding,
+    )
+
+    from skinpy.types import (
+        ImageColor as ImageColor,
+        R3 as R3,
+        R2 as R2,
+        RGBA as RGBA,
+        XFaceId as XFaceId,
+        YFaceId as YFaceId,
+        ZFaceId as ZFaceId,
+        FaceId as FaceId,
+        Coords as Coords,
+        FaceIds as FaceIds,
+        BodyPartId as BodyPartId,
+        FACE_IDS as FACE_IDS,
+        BODY_PART_IDS as BODY_PART_IDS,
+        PolygonPoints as PolygonPoints,
+        StrPath as StrPath,
+        RenderBackend as RenderBackend,
+        AnimationFormat as AnimationFormat,
+        ImageFormat as ImageFormat,
+        PngStrategy as PngStrategy,
+    )
+
+# the module that defines each public name
+_EXPORTS = {
+    "Skin": "skinpy.skin",
+    "BodyPart": "skinpy.skin",
+    "Face": "skinpy.skin",
+    "VoxelTable": "skinpy.skin",
+    "UnmappedVoxelError": "skinpy.skin",
+    "InputImageException": "skinpy.skin",
+    "Perspective": "skinpy.render",
+    "Camera": "skinpy.render",
+    "Projection": "skinpy.render",
+    "ISOMETRIC_PITCH": "skinpy.render",
+    "SkinLayout": "skinpy.layout",
+    "PartLayout": "skinpy.layout",
+    "CLASSIC_LAYOUT": "skinpy.layout",
+    "SLIM_LAYOUT": "skinpy.layout",
+    "LEGACY_LAYOUT": "skinpy.layout",
+    "layout_for_size": "skinpy.layout",
+    "SkinStack": "skinpy.stack",
+    "SkinStore": "skinpy.store",
+    "SkinStoreError": "skinpy.store",
+    "RenderPlan": "skinpy.plan",
+    "get_render_plan": "skinpy.plan",
+    "IncrementalRenderer": "skinpy.incremental",
+    "RenderCache": "skinpy.cache",
+    "CacheStats": "skinpy.cache",
+    "FlatView": "skinpy.flat",
+    "get_flat_view": "skinpy.flat",
+    "Encoding": "skinpy.encode",
+    "ImageColor": "skinpy.types",
+    "R3": "skinpy.types",
+    "R2": "skinpy.types",
+    "RGBA": "skinpy.types",
+    "XFaceId": "skinpy.types",
+    "YFaceId": "skinpy.types",
+    "ZFaceId": "skinpy.types",
+    "FaceId": "skinpy.types",
+    "Coords": "skinpy.types",
+    "FaceIds": "skinpy.types",
+    "BodyPartId": "skinpy.types",
+    "FACE_IDS": "skinpy.types",
+    "BODY_PART_IDS": "skinpy.types",
+    "PolygonPoints": "skinpy.types",
+    "StrPath": "skinpy.types",
+    "RenderBackend": "skinpy.types",
+    "AnimationFormat": "skinpy.types",
+    "ImageFormat": "skinpy.types",
+    "PngStrategy": "skinpy.types",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module), name)
+    # later lookups find it without coming back here
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -1,71 +1,650 @@
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import time
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Optional
 
 import click
 
-from skinpy import Skin, Perspective, XFaceId, YFaceId, ZFaceId
+# the renderer, numpy and Pillow are imported by the commands that use them, so
+# that `skinpy --help` and `skinpy --version` start quickly
+if TYPE_CHECKING:
+    from skinpy.encode import Encoding
+    from skinpy.types import (
+        AnimationFormat,
+        ImageFormat,
+        PngStrategy,
+        XFaceId,
+        YFaceId,
+        ZFaceId,
+    )
 
 
 @click.group()
+@click.version_option(package_name="skinpy")
 def cli():
     pass
 
 
+def perspective_options(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Add the -x, -y, -z and --scaling-factor options that choose a perspective.
+    """
+    for option in reversed(
+        [
+            click.option(
+                "-x",
+                type=click.Choice(["left", "right"]),
+                default="left",
+                show_default=True,
+                help="Show from the left or right perspective.",
+            ),
+            click.option(
+                "-y",
+                type=click.Choice(["front", "back"]),
+                default="front",
+                show_default=True,
+                help="Show from the front or back perspective.",
+            ),
+            click.option(
+                "-z",
+                type=click.Choice(["up", "down"]),
+                default="up",
+                show_default=True,
+                help="Show from the up or down perspective.",
+            ),
+            click.option(
+                "-s",
+                "--scaling-factor",
+                type=int,
+                default=10,
+                show_default=True,
+                help=(
+                    "Scaling factor for the image, with bigger numbers producing "
+                    "bigger images"
+                ),
+            ),
+        ]
+    ):
+        func = option(func)
+    return func
+
+
+overlay_option = click.option(
+    "--overlay/--no-overlay",
+    default=False,
+    show_default=True,
+    help="Render the overlay layer (hat, jacket, sleeves and pants).",
+)
+
+slim_option = click.option(
+    "--slim",
+    is_flag=True,
+    help=(
+        "Skins have slim (3 pixel wide) arms. Legacy 64x32 and HD skins are "
+        "recognized by their size."
+    ),
+)
+
+cache_dir_option = click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    help=(
+        "Directory to cache renders in. Skins already rendered the same way, by "
+        "any earlier run, are read from it instead of rendered again."
+    ),
+)
+
+cache_size_option = click.option(
+    "--cache-size",
+    type=click.IntRange(min=1),
+    default=1024,
+    show_default=True,
+    help="Most megabytes of renders to keep in --cache-dir.",
+)
+
+
+def encoding_options(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Add the options that choose how images are encoded (see `make_encoding`).
+    """
+    for option in reversed(
+        [
+            click.option(
+                "-f",
+                "--format",
+                "format_",
+                type=click.Choice(["png", "webp", "raw"]),
+                help=(
+                    "Image format. WebP is lossless, and raw is the RGBA bytes of "
+                    "the pixels, row by row.  [default: from the output path's "
+                    "suffix, or png]"
+                ),
+            ),
+            click.option(
+                "--compress-level",
+                type=click.IntRange(0, 9),
+                default=6,
+                show_default=True,
+                help="PNG compression, from 0 (fastest) to 9 (smallest).",
+            ),
+            click.option(
+                "--png-strategy",
+                type=click.Choice(["default", "filtered", "huffman", "rle", "fixed"]),
+                default="default",
+                show_default=True,
+                help="The zlib strategy that PNGs are compressed with.",
+            ),
+            click.option(
+                "--palette",
+                is_flag=True,
+                help=(
+                    "Write an indexed PNG. Renders of at most 256 colors keep "
+                    "them exactly, and others are quantized."
+                ),
+            ),
+            click.option(
+                "--webp-method",
+                type=click.IntRange(0, 6),
+                default=4,
+                show_default=True,
+                help="WebP compression, from 0 (fastest) to 6 (smallest).",
+            ),
+        ]
+    ):
+        func = option(func)
+    return func
+
+
+def make_encoding(
+    output: str,
+    format_: Optional[ImageFormat],
+    compress_level: int,
+    png_strategy: PngStrategy,
+    palette: bool,
+    webp_method: int,
+) -> Encoding:
+    """
+    Return the encoding that the options of `encoding_options` choose for the
+    `output` path, or stdout with "-".
+    """
+    from skinpy.encode import Encoding
+
+    if output == "-" and format_ is None:
+        format_ = "png"
+    try:
+        return Encoding.for_path(
+            output,
+            format_,
+            compress_level=compress_level,
+            strategy=png_strategy,
+            palette=palette,
+            method=webp_method,
+        )
+    except ValueError as e:
+        raise click.UsageError(str(e)) from e
+
+
 @cli.command()
 @click.argument(
     "input-path", type=click.Path(exists=True, dir_okay=False, path_type=Path)
 )
+@perspective_options
+@overlay_option
+@slim_option
+@cache_dir_option
+@cache_size_option
 @click.option(
-    "-x",
-    type=click.Choice(["left", "right"]),
-    default="left",
-    show_default=True,
-    help="Show from the left or right perspective.",
+    "-o",
+    "--output-path",
+    type=click.Path(exists=False, dir_okay=False, allow_dash=True, path_type=Path),
+    required=True,
+    help="Path to write the rendered image to, or - for stdout.",
+)
+@encoding_options
+@click.option(
+    "--profile",
+    is_flag=True,
+    help=(
+        "Print how long each stage of the render took (decode, plan, polygons, "
+        "rasterize and encode) to stderr."
+    ),
+)
+def render(
+    input_path: Path,
+    x: XFaceId,
+    y: YFaceId,
+    z: ZFaceId,
+    scaling_factor: int,
+    overlay: bool,
+    slim: bool,
+    cache_dir: Optional[Path],
+    cache_size: int,
+    output_path: Path,
+    format_: Optional[ImageFormat],
+    compress_level: int,
+    png_strategy: PngStrategy,
+    palette: bool,
+    webp_method: int,
+    profile: bool,
+):
+    """
+    Render the minecraft skin at INPUT_PATH to an isometric image.
+    """
+    from skinpy import SLIM_LAYOUT, Perspective, Skin
+    from skinpy.profile import StageStats, profiling
+
+    to_stdout = str(output_path) == "-"
+    encoding = make_encoding(
+        str(output_path), format_, compress_level, png_strategy, palette, webp_method
+    )
+    cache = None
+    if cache_dir is not None:
+        from skinpy.cache import RenderCache
+
+        cache = RenderCache(directory=cache_dir, max_disk_bytes=cache_size << 20)
+
+    stats = StageStats()
+    start = time.perf_counter()
+    with profiling(*([stats] if profile else [])):
+        perspective = Perspective.new(x=x, y=y, z=z, scaling_factor=scaling_factor)
+        skin = Skin.from_path(input_path, layout=SLIM_LAYOUT if slim else None)
+        image = skin.to_isometric_image(
+            perspective=perspective, overlay=overlay, cache=cache
+        )
+        encoding.save(image, sys.stdout.buffer if to_stdout else output_path)
+    if not to_stdout:
+        print(f"Rendered image to {output_path}")
+
+    if profile:
+        click.echo(stats.report(total=time.perf_counter() - start), err=True)
+
+
+@cli.command("render-batch")
+@click.argument("inputs", nargs=-1)
+@click.option(
+    "-m",
+    "--manifest",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Text file listing more inputs, one per line.",
+)
+@perspective_options
+@overlay_option
+@slim_option
+@cache_dir_option
+@cache_size_option
+@click.option(
+    "-o",
+    "--output-template",
+    required=True,
+    help=(
+        "Template of the path to write each rendered image to, with the fields "
+        "{stem}, {name} and {parent} of the input path, its {index}, and {x}, {y}, "
+        "{z} and {scaling_factor}. For example, renders/{stem}-{x}-{y}-{z}.png"
+    ),
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+    show_default="number of CPUs",
+    help="Number of worker processes.",
+)
+@click.option(
+    "--max-in-flight",
+    type=click.IntRange(min=1),
+    help="Most skins queued for the workers at once.  [default: 4 per job]",
+)
+@encoding_options
+def render_batch(
+    inputs: tuple[str, ...],
+    manifest: Optional[Path],
+    x: XFaceId,
+    y: YFaceId,
+    z: ZFaceId,
+    scaling_factor: int,
+    overlay: bool,
+    slim: bool,
+    cache_dir: Optional[Path],
+    cache_size: int,
+    output_template: str,
+    jobs: int,
+    max_in_flight: Optional[int],
+    format_: Optional[ImageFormat],
+    compress_level: int,
+    png_strategy: PngStrategy,
+    palette: bool,
+    webp_method: int,
+):
+    """
+    Render many minecraft skins to isometric images.
+
+    INPUTS are skin paths, directories (every .png under them is rendered) or
+    glob patterns. Inputs that can't be rendered are logged and skipped, and the
+    command exits with status 1 if there were any.
+    """
+    from skinpy import SLIM_LAYOUT, Perspective
+    from skinpy.batch import collect_inputs, render_batch as run_batch
+
+    logging.basicConfig(format="%(message)s")
+
+    encoding = make_encoding(
+        output_template, format_, compress_level, png_strategy, palette, webp_method
+    )
+    input_paths = collect_inputs(inputs, manifest)
+    perspective = Perspective.new(x=x, y=y, z=z, scaling_factor=scaling_factor)
+    report = run_batch(
+        input_paths,
+        output_template,
+        perspective,
+        overlay=overlay,
+        layout=SLIM_LAYOUT if slim else None,
+        encoding=encoding,
+        jobs=jobs,
+        max_in_flight=max_in_flight,
+        cache_dir=cache_dir,
+        cache_max_bytes=cache_size << 20,
+    )
+
+    print(
+        f"Rendered {report.rendered} of {len(input_paths)} skins in "
+        f"{report.seconds:.2f}s ({report.skins_per_second:.1f} skins/s)"
+    )
+    if report.failures:
+        print(f"{len(report.failures)} failed:", file=sys.stderr)
+        for path, message in report.failures:
+            print(f"  {path}: {message}", file=sys.stderr)
+        sys.exit(1)
+
+
+@cli.command()
+@click.argument(
+    "input-path", type=click.Path(exists=True, dir_okay=False, path_type=Path)
 )
+@perspective_options
+@overlay_option
+@slim_option
 @click.option(
-    "-y",
-    type=click.Choice(["front", "back"]),
-    default="front",
+    "--highlight",
+    is_flag=True,
+    help=(
+        "Highlight each texel that the perspective shows, one per frame, instead "
+        "of turning the model around. -x, -y and -z only matter with this."
+    ),
+)
+@click.option(
+    "-n",
+    "--frames",
+    type=click.IntRange(min=1),
+    default=36,
     show_default=True,
-    help="Show from the front or back perspective.",
+    help="Number of frames of the turntable.",
+)
+@click.option(
+    "--pitch",
+    type=click.FloatRange(-90, 90),
+    show_default="isometric, about 35.26",
+    help="Angle in degrees above the horizon that the turntable is seen from.",
 )
 @click.option(
-    "-z",
-    type=click.Choice(["up", "down"]),
-    default="up",
+    "-d",
+    "--duration",
+    type=click.IntRange(min=1),
+    default=100,
     show_default=True,
-    help="Show from the up or down perspective.",
+    help="Milliseconds that each frame shows for.",
 )
 @click.option(
-    "-s",
-    "--scaling-factor",
-    type=int,
-    default=10,
+    "--loop",
+    type=click.IntRange(min=0),
+    default=0,
     show_default=True,
-    help="Scaling factor for the image, with bigger numbers producing bigger images",
+    help="Number of times the animation plays, or 0 for forever.",
+)
+@click.option(
+    "-f",
+    "--format",
+    "format_",
+    type=click.Choice(["gif", "apng", "webp"]),
+    help="Animation format.  [default: from the output path's suffix]",
 )
 @click.option(
     "-o",
     "--output-path",
     type=click.Path(exists=False, dir_okay=False, path_type=Path),
     required=True,
-    help="Path to write the rendered image to.",
+    help="Path to write the animation to.",
 )
-def render(
+def animate(
     input_path: Path,
     x: XFaceId,
     y: YFaceId,
     z: ZFaceId,
     scaling_factor: int,
+    overlay: bool,
+    slim: bool,
+    highlight: bool,
+    frames: int,
+    pitch: Optional[float],
+    duration: int,
+    loop: int,
+    format_: Optional[AnimationFormat],
     output_path: Path,
 ):
     """
-    Render the minecraft skin at INPUT_PATH to an isometric image.
+    Render the minecraft skin at INPUT_PATH to an animated GIF, APNG or WebP of
+    the model turning around.
     """
-    perspective = Perspective.new(x=x, y=y, z=z, scaling_factor=scaling_factor)
-    skin = Skin.from_path(input_path)
-    image = skin.to_isometric_image(perspective=perspective)
-    image.save(output_path)
-    print(f"Rendered image to {output_path}")
+    from skinpy import ISOMETRIC_PITCH, SLIM_LAYOUT, Perspective, Skin
+    from skinpy.animation import turntable
+
+    skin = Skin.from_path(input_path, layout=SLIM_LAYOUT if slim else None)
+    if highlight:
+        views = Perspective.new(x=x, y=y, z=z, scaling_factor=scaling_factor)
+    else:
+        views = turntable(
+            frames,
+            pitch=ISOMETRIC_PITCH if pitch is None else pitch,
+            scaling_factor=scaling_factor,
+        )
+    try:
+        frame_count = skin.render_animation(
+            output_path,
+            views,
+            highlight=highlight,
+            overlay=overlay,
+            format=format_,
+            duration=duration,
+            loop=loop,
+        )
+    except ValueError as e:
+        raise click.UsageError(str(e)) from e
+    print(f"Rendered {frame_count} frames to {output_path}")
+
+
+@cli.command()
+@click.argument("inputs", nargs=-1)
+@click.option(
+    "-m",
+    "--manifest",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Text file listing more inputs, one per line.",
+)
+@click.option(
+    "-o",
+    "--output-path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    required=True,
+    help="Path of the store to write.",
+)
+@click.option(
+    "--ids/--no-ids",
+    default=True,
+    show_default=True,
+    help="Index the skins by the stem of their file names.",
+)
+@slim_option
+@click.option(
+    "--append",
+    is_flag=True,
+    help=(
+        "Add to the store at the output path instead of replacing it, creating "
+        "it if it doesn't exist."
+    ),
+)
+def pack(
+    inputs: tuple[str, ...],
+    manifest: Optional[Path],
+    output_path: Path,
+    ids: bool,
+    slim: bool,
+    append: bool,
+):
+    """
+    Pack minecraft skins into a memory-mapped skin store.
+
+    INPUTS are skin paths, directories (every .png under them is packed) or glob
+    patterns. Inputs that can't be loaded, and legacy and HD skins, which don't
+    fit a store, are logged and skipped, and the command exits with status 1 if
+    there were any.
+    """
+    from skinpy import SLIM_LAYOUT
+    from skinpy.batch import collect_inputs
+    from skinpy.exception import SkinStoreError
+    from skinpy.store import pack_store
+
+    logging.basicConfig(format="%(message)s")
+
+    input_paths = collect_inputs(inputs, manifest)
+    try:
+        store, failures = pack_store(
+            output_path,
+            input_paths,
+            with_ids=ids,
+            append=append,
+            layout=SLIM_LAYOUT if slim else None,
+        )
+    except SkinStoreError as e:
+        raise click.UsageError(str(e)) from e
+
+    print(f"Packed {len(input_paths) - len(failures)} skins into {output_path}")
+    print(f"The store now holds {len(store)} skins")
+    if failures:
+        print(f"{len(failures)} failed:", file=sys.stderr)
+        for path, message in failures:
+            print(f"  {path}: {message}", file=sys.stderr)
+        sys.exit(1)
+
+
+@cli.command()
+@click.argument(
+    "store-path", type=click.Path(exists=True, dir_okay=False, path_type=Path)
+)
+@click.option(
+    "-d",
+    "--drop-id",
+    "drop_ids",
+    multiple=True,
+    help="Remove the skin with this id. Can be given more than once.",
+)
+def compact(store_path: Path, drop_ids: tuple[str, ...]):
+    """
+    Rewrite the skin store at STORE_PATH without skins shadowed by a later skin
+    with the same id.
+    """
+    from skinpy.store import SkinStore
+
+    before = SkinStore.open(store_path)
+    after = before.compact(drop_ids)
+    print(f"Compacted {store_path} from {len(before)} to {len(after)} skins")
+
+
+@cli.command()
+@click.option(
+    "--host", default="127.0.0.1", show_default=True, help="Address to listen on."
+)
+@click.option(
+    "-p", "--port", type=int, default=8080, show_default=True, help="Port to listen on."
+)
+@click.option(
+    "--skin-dir",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    help="Directory of skins to serve renders of, by path, at /render/PATH.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+    show_default="number of CPUs",
+    help="Number of render workers.",
+)
+@click.option(
+    "--threads",
+    is_flag=True,
+    help="Render in threads instead of worker processes.",
+)
+@click.option(
+    "--max-queue",
+    type=click.IntRange(min=1),
+    help=(
+        "Most renders waiting or in progress at once. Requests beyond that get "
+        "503 Service Unavailable.  [default: 4 per job]"
+    ),
+)
+@click.option(
+    "--max-skin-size",
+    type=click.IntRange(min=64),
+    default=64,
+    show_default=True,
+    help=(
+        "Widest or tallest skin image to render, in pixels. Raise it to render "
+        "HD skins, which take far more time and memory."
+    ),
+)
+@cache_dir_option
+@cache_size_option
+def serve(
+    host: str,
+    port: int,
+    skin_dir: Optional[Path],
+    jobs: int,
+    threads: bool,
+    max_queue: Optional[int],
+    max_skin_size: int,
+    cache_dir: Optional[Path],
+    cache_size: int,
+):
+    """
+    Serve isometric renders and avatars of skins over HTTP.
+
+    POST a skin PNG to /render or /avatar, or GET /render/PATH or /avatar/PATH
+    for a skin in --skin-dir. Renders take the query parameters x, y, z, scale,
+    overlay and slim, and avatars take size, overlay and slim. Metrics are at
+    /metrics.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    from skinpy.serve import run_server
+
+    logging.basicConfig(format="%(message)s")
+
+    executor = (ThreadPoolExecutor if threads else ProcessPoolExecutor)(jobs)
+    run_server(
+        host,
+        port,
+        executor,
+        workers=jobs,
+        skin_dir=skin_dir,
+        max_queue=max_queue or jobs * 4,
+        cache_dir=cache_dir,
+        cache_max_bytes=cache_size << 20,
+        max_skin_size=max_skin_size,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,593 @@
+from __future__ import annotations
+
+import io
+import itertools
+import shutil
+import struct
+import tempfile
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator, Optional, Sequence
+
+import numpy as np
+from attrs import define, field
+from PIL import GifImagePlugin, Image
+
+from skinpy.incremental import IncrementalRenderer, _render_layers
+from skinpy.plan import get_render_plan
+from skinpy.render import ISOMETRIC_PITCH, Camera, pack_colors
+
+if TYPE_CHECKING:
+    from skinpy.render import Projection
+    from skinpy.skin import Skin
+    from skinpy.types import RGBA, AnimationFormat, StrPath
+
+# the animation format of each file suffix
+FORMAT_SUFFIXES: dict[str, AnimationFormat] = {
+    ".gif": "gif",
+    ".png": "apng",
+    ".apng": "apng",
+    ".webp": "webp",
+}
+
+# gif only has fully transparent or opaque pixels. alpha below this is transparent
+GIF_ALPHA_THRESHOLD = 128
+
+
+def turntable(
+    frame_count: int = 36,
+    pitch: float = ISOMETRIC_PITCH,
+    scaling_factor: int = 10,
+    yaw: float = 45.0,
+) -> list[Camera]:
+    """
+    Return `frame_count` cameras evenly spaced around the model, for one turn
+    starting at `yaw`.
+    """
+    if frame_count < 1:
+        raise ValueError("A turntable needs at least 1 frame")
+    return [
+        Camera(
+            yaw=(yaw + 360 * index / frame_count) % 360,
+            pitch=pitch,
+            scaling_factor=scaling_factor,
+        )
+        for index in range(frame_count)
+    ]
+
+
+def view_frames(
+    skin: Skin,
+    views: Sequence[Projection],
+    overlay: bool = False,
+    background_color: Optional[tuple[int, int, int, int]] = None,
+    depth_test: bool = False,
+) -> Iterator[np.ndarray[tuple[int, int, int], np.dtype[np.uint8]]]:
+    """
+    Render the skin from each of `views`, like a turntable (see `turntable`),
+    as (height, width, 4) frames.
+
+    Renders from different views have different sizes, so every frame is the
+    size that fits the model from all of them, with the center of the model in
+    the same place.
+    """
+    layout = skin.layout
+    center = np.array(layout.model_shape) / 2
+    inflation = max(part.overlay_inflation for part in layout.parts) if overlay else 0
+    # the corners of a box around the model, relative to its center
+    box_corners = (
+        np.array(
+            list(
+                itertools.product(
+                    *((-inflation, size + inflation) for size in layout.model_shape)
+                )
+            )
+        )
+        - center
+    )
+    extents = np.array([view.project(box_corners) for view in views])
+    # a pixel of room for the rounding of polygon points
+    low = np.floor(extents.min(axis=(0, 1))).astype(int) - 1
+    high = np.ceil(extents.max(axis=(0, 1))).astype(int) + 1
+    width, height = (high - low).tolist()
+
+    for view in views:
+        plan = get_render_plan(view, overlay=overlay, layout=layout)
+        render = plan.render_array(
+            skin.image_color,
+            background_color=background_color,
+            depth_test=depth_test,
+        )
+        frame = np.zeros((height, width, 4), dtype=np.uint8)
+        if background_color is not None:
+            frame[:] = background_color
+        # move the render so that the center of the model is at -low
+        left, top = np.round(-low - view.project(center) - plan.origin).astype(int)
+        render_height, render_width = render.shape[:2]
+        frame_left, frame_top = max(left, 0), max(top, 0)
+        frame_right = min(left + render_width, width)
+        frame_bottom = min(top + render_height, height)
+        frame[frame_top:frame_bottom, frame_left:frame_right] = render[
+            frame_top - top : frame_bottom - top, frame_left - left : frame_right - left
+        ]
+        yield frame
+
+
+def highlight_frames(
+    skin: Skin,
+    perspective: Projection,
+    texels: Optional[Iterable[tuple[int, int]]] = None,
+    color: Optional[RGBA] = None,
+    overlay: bool = False,
+    background_color: Optional[tuple[int, int, int, int]] = None,
+    depth_test: bool = False,
+) -> Iterator[np.ndarray[tuple[int, int, int], np.dtype[np.uint8]]]:
+    """
+    Render the skin from `perspective` once per texel, with that texel
+    highlighted, as (height, width, 4) frames.
+
+    `texels` are (x, y) coordinates in `image_color`, and default to every
+    texel that the render shows, in the order they're drawn. Highlighted texels
+    are painted `color`, or their inverted color without one, and are restored
+    after their frame.
+
+    Frames are drawn by an `IncrementalRenderer`, so each one only redraws the
+    pixels of two texels.
+    """
+    renderer = IncrementalRenderer(
+        skin,
+        perspective,
+        background_color=background_color,
+        depth_test=depth_test,
+        overlay=overlay,
+    )
+    image_color = skin.image_color
+    if texels is None:
+        texels = _shown_texels(skin, perspective, overlay, depth_test)
+
+    for x, y in texels:
+        old_color = image_color[x, y].copy()
+        if color is None:
+            image_color[x, y, :3] = 255 - old_color[:3]
+        else:
+            image_color[x, y] = color
+        try:
+            yield renderer.render_array()
+        finally:
+            image_color[x, y] = old_color
+
+
+def _shown_texels(
+    skin: Skin, perspective: Projection, overlay: bool, depth_test: bool
+) -> list[tuple[int, int]]:
+    # the texels of the polygons that win a pixel of the render, in draw order,
+    # base then overlay. texels that color many polygons, like those of
+    # mirrored limbs, come once
+    plan = get_render_plan(perspective, overlay=overlay, layout=skin.layout)
+    layers = _render_layers(plan, depth_test)
+    stacks = layers.stacks[:, np.unique(layers.labels)]
+    base = np.unique(stacks[0])
+    polygons = base[base > 0] - 1
+    overlay_polygons = np.unique(stacks[1:])
+    overlay_polygons = overlay_polygons[overlay_polygons > 0] - 1
+    # transparent overlay texels look no different highlighted
+    overlay_polygons = overlay_polygons[
+        skin.image_color[
+            plan.overlay_image_x[overlay_polygons],
+            plan.overlay_image_y[overlay_polygons],
+            3,
+        ]
+        > 0
+    ]
+
+    texels = np.concatenate(
+        (
+            np.stack((plan.image_x[polygons], plan.image_y[polygons]), axis=-1),
+            np.stack(
+                (
+                    plan.overlay_image_x[overlay_polygons],
+                    plan.overlay_image_y[overlay_polygons],
+                ),
+                axis=-1,
+            ),
+        )
+    )
+    _, first = np.unique(texels, axis=0, return_index=True)
+    return [tuple(texel) for texel in texels[np.sort(first)].tolist()]
+
+
+def write_animation(
+    frames: Iterable[np.ndarray[tuple[int, int, int], np.dtype[np.uint8]]],
+    output: StrPath | BinaryIO,
+    format: Optional[AnimationFormat] = None,
+    duration: int = 100,
+    loop: int = 0,
+) -> int:
+    """
+    Encode (height, width, 4) RGBA frames of the same size to an animated GIF,
+    APNG or WebP, and return the number of frames written.
+
+    `output` is a path or a binary file. The format is worked out from the
+    suffix of a path (see `FORMAT_SUFFIXES`), or given by `format`. Every frame
+    shows for `duration` milliseconds, and the animation plays `loop` times, or
+    forever with 0.
+
+    Frames are encoded as they come, and only the box of pixels that changed
+    since the previous frame is encoded, so a frame that changes a few pixels
+    costs a few pixels. Runs of identical frames become one longer frame. Only
+    the previous frame is kept, so memory doesn't grow with the number of
+    frames.
+
+    APNG and WebP files start with sizes that are only known at the end, which
+    are filled in by seeking back. Files that can't seek are written to a
+    temporary file first.
+    """
+    if format is None:
+        if not isinstance(output, (str, Path)):
+            raise ValueError("The format of an animation written to a file is needed")
+        suffix = Path(output).suffix.lower()
+        if suffix not in FORMAT_SUFFIXES:
+            raise ValueError(
+                f"Can't tell the animation format of {output}. Use one of the "
+                f"suffixes {', '.join(FORMAT_SUFFIXES)}, or give a format"
+            )
+        format = FORMAT_SUFFIXES[suffix]
+    if format not in ENCODERS:
+        raise ValueError(
+            f"Animation format must be one of {', '.join(ENCODERS)}, not {format!r}"
+        )
+    if duration < 1:
+        raise ValueError("Frame duration must be at least 1 millisecond")
+    if loop < 0:
+        raise ValueError("Loop count can't be negative")
+
+    encoder_class = ENCODERS[format]
+    frame_iter = iter(frames)
+    first = next(frame_iter, None)
+    if first is None:
+        raise ValueError("An animation needs at least 1 frame")
+    previous = np.array(first, dtype=np.uint8)
+    if previous.ndim != 3 or previous.shape[2] != 4:
+        raise ValueError(f"Frames must be (height, width, 4), not {previous.shape}")
+    height, width = previous.shape[:2]
+
+    with _open_output(output, seek=encoder_class.seeks) as fp:
+        encoder = encoder_class(fp, (width, height), loop)
+        pending = _Frame(previous, (0, 0, width, height), duration)
+        for frame in frame_iter:
+            frame = np.array(frame, dtype=np.uint8)
+            if frame.shape != previous.shape:
+                raise ValueError(
+                    f"Frames must all be {previous.shape}, but got {frame.shape}"
+                )
+            box = _changed_box(previous, frame)
+            if box is None:
+                pending.duration += duration
+                continue
+            box = encoder.delta_box(previous, frame, box, pending)
+            encoder.write(pending)
+            left, top, right, bottom = box
+            pending = _Frame(frame[top:bottom, left:right].copy(), box, duration)
+            previous = frame
+        encoder.write(pending)
+        encoder.finish()
+    return encoder.frame_count
+
+
+@define
+class _Frame:
+    # the pixels of `box`, the (left, upper, right, lower) box of the frame that
+    # changed
+    pixels: np.ndarray
+    box: tuple[int, int, int, int]
+    # in milliseconds
+    duration: int
+    # gif disposal method: 1 leaves the frame for the next to draw over, and 2
+    # clears its box
+    disposal: int = 1
+
+
+def _changed_box(
+    previous: np.ndarray, frame: np.ndarray
+) -> Optional[tuple[int, int, int, int]]:
+    # the (left, upper, right, lower) box of the pixels that differ, or None
+    changed = pack_colors(previous) != pack_colors(frame)
+    rows = np.flatnonzero(changed.any(axis=1))
+    if not len(rows):
+        return None
+    columns = np.flatnonzero(changed.any(axis=0))
+    return (
+        int(columns[0]),
+        int(rows[0]),
+        int(columns[-1]) + 1,
+        int(rows[-1]) + 1,
+    )
+
+
+@contextmanager
+def _open_output(output: StrPath | BinaryIO, seek: bool) -> Iterator[BinaryIO]:
+    if isinstance(output, (str, Path)):
+        with open(output, "wb") as fp:
+            yield fp
+    elif not seek or output.seekable():
+        yield output
+    else:
+        with tempfile.TemporaryFile() as fp:
+            yield fp
+            fp.seek(0)
+            shutil.copyfileobj(fp, output)
+
+
+@define
+class _Encoder:
+    """
+    Writes the frames of an animation to a file, as they come.
+    """
+
+    # whether the encoder seeks back to fill in the header
+    seeks = False
+
+    fp: BinaryIO
+    size: tuple[int, int]
+    loop: int
+    frame_count: int = field(default=0, init=False)
+
+    def __attrs_post_init__(self) -> None:
+        self.start()
+
+    def start(self) -> None:
+        raise NotImplementedError
+
+    def delta_box(
+        self,
+        previous: np.ndarray,
+        frame: np.ndarray,
+        box: tuple[int, int, int, int],
+        pending: _Frame,
+    ) -> tuple[int, int, int, int]:
+        """
+        Return the box of `frame` to encode, given the `box` that changed since
+        `previous`. `pending` is the frame before, which isn't written yet.
+        """
+        return box
+
+    def write(self, frame: _Frame) -> None:
+        raise NotImplementedError
+
+    def finish(self) -> None:
+        raise NotImplementedError
+
+
+@define
+class _GifEncoder(_Encoder):
+    def start(self) -> None:
+        width, height = self.size
+        self.fp.write(
+            b"GIF89a"
+            + struct.pack("<HHBBB", width, height, 0, 0, 0)
+            # the netscape extension, for the loop count
+            + b"!\xff\x0bNETSCAPE2.0\x03\x01"
+            + struct.pack("<H", self.loop)
+            + b"\x00"
+        )
+
+    def delta_box(self, previous, frame, box, pending):
+        # gif frames are drawn over the last, and transparent pixels leave what's
+        # under them. pixels that turn transparent can only be cleared by
+        # clearing the whole box of the frame before, and drawing it again.
+        left, top, right, bottom = box
+        cleared = (frame[top:bottom, left:right, 3] < GIF_ALPHA_THRESHOLD) & (
+            previous[top:bottom, left:right, 3] >= GIF_ALPHA_THRESHOLD
+        )
+        if not cleared.any():
+            return box
+        pending.disposal = 2
+        pending_left, pending_top, pending_right, pending_bottom = pending.box
+        return (
+            min(left, pending_left),
+            min(top, pending_top),
+            max(right, pending_right),
+            max(bottom, pending_bottom),
+        )
+
+    def write(self, frame: _Frame) -> None:
+        pixels = frame.pixels
+        opaque = pixels[..., 3] >= GIF_ALPHA_THRESHOLD
+        rgb = pixels[..., :3].astype(np.uint32)
+        keys = rgb[..., 0] << 16 | rgb[..., 1] << 8 | rgb[..., 2]
+        colors, inverse = np.unique(keys[opaque], return_inverse=True)
+        if len(colors) < 256:
+            # every color fits, with a spare index for transparent pixels
+            transparent = len(colors)
+            indexes = np.full(keys.shape, transparent, dtype=np.uint8)
+            indexes[opaque] = inverse.reshape(-1)
+            palette = np.stack(
+                (colors >> 16, colors >> 8 & 0xFF, colors & 0xFF), axis=-1
+            )
+        else:
+            transparent = 255
+            quantized = Image.fromarray(np.ascontiguousarray(pixels[..., :3])).quantize(
+                255, method=Image.Quantize.MEDIANCUT
+            )
+            indexes = np.array(quantized)
+            indexes[~opaque] = transparent
+            palette = np.array(quantized.getpalette()[: 255 * 3]).reshape(-1, 3)
+        image = Image.fromarray(indexes, "P")
+        image.putpalette(
+            palette.astype(np.uint8).tobytes()
+            + bytes(3 * (transparent + 1 - len(palette)))
+        )
+
+        # the transparent index is also what disposal clears the box to
+        data = GifImagePlugin.getdata(
+            image,
+            frame.box[:2],
+            # in hundredths of a second
+            duration=min(frame.duration, 0xFFFF * 10),
+            disposal=frame.disposal,
+            transparency=transparent,
+            include_color_table=True,
+        )
+        self.fp.write(b"".join(data))
+        self.frame_count += 1
+
+    def finish(self) -> None:
+        self.fp.write(b";")
+
+
+@define
+class _ApngEncoder(_Encoder):
+    seeks = True
+
+    # where the animation control chunk is, to fill in the frame count
+    _actl_position: int = field(default=0, init=False)
+    # every fcTL and fdAT chunk is numbered
+    _sequence: int = field(default=0, init=False)
+
+    def start(self) -> None:
+        width, height = self.size
+        self.fp.write(b"\x89PNG\r\n\x1a\n")
+        # 8-bit RGBA
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        self._actl_position = self.fp.tell()
+        self._chunk(b"acTL", struct.pack(">II", 0, self.loop))
+
+    def write(self, frame: _Frame) -> None:
+        buffer = io.BytesIO()
+        Image.fromarray(frame.pixels, "RGBA").save(buffer, "PNG")
+        left, top, right, bottom = frame.box
+        # delays are a fraction of a second, of 16-bit integers
+        delay = (frame.duration, 1000)
+        if frame.duration > 0xFFFF:
+            delay = (min(round(frame.duration / 1000), 0xFFFF), 1)
+        self._chunk(
+            b"fcTL",
+            struct.pack(
+                ">IIIIIHHBB",
+                self._next_sequence(),
+                right - left,
+                bottom - top,
+                left,
+                top,
+                *delay,
+                # leave the frame for the next, and replace the pixels of the box,
+                # alpha included
+                0,
+                0,
+            ),
+        )
+        for data in _png_chunks(buffer.getvalue(), b"IDAT"):
+            if self.frame_count:
+                self._chunk(b"fdAT", struct.pack(">I", self._next_sequence()) + data)
+            else:
+                # the first frame is the default image, which old decoders show
+                self._chunk(b"IDAT", data)
+        self.frame_count += 1
+
+    def finish(self) -> None:
+        self._chunk(b"IEND", b"")
+        end = self.fp.tell()
+        self.fp.seek(self._actl_position)
+        self._chunk(b"acTL", struct.pack(">II", self.frame_count, self.loop))
+        self.fp.seek(end)
+
+    def _next_sequence(self) -> int:
+        self._sequence += 1
+        return self._sequence - 1
+
+    def _chunk(self, chunk_type: bytes, data: bytes) -> None:
+        self.fp.write(
+            struct.pack(">I", len(data))
+            + chunk_type
+            + data
+            + struct.pack(">I", zlib.crc32(chunk_type + data))
+        )
+
+
+def _png_chunks(png: bytes, chunk_type: bytes) -> Iterator[bytes]:
+    # the data of the chunks of a type, after the 8-byte signature
+    position = 8
+    while position < len(png):
+        (length,) = struct.unpack_from(">I", png, position)
+        if png[position + 4 : position + 8] == chunk_type:
+            yield png[position + 8 : position + 8 + length]
+        position += length + 12
+
+
+@define
+class _WebpEncoder(_Encoder):
+    seeks = True
+
+    # where the RIFF header is, to fill in the size
+    _start: int = field(default=0, init=False)
+
+    def start(self) -> None:
+        width, height = self.size
+        self._start = self.fp.tell()
+        self.fp.write(b"RIFF\x00\x00\x00\x00WEBP")
+        # animated, with alpha
+        self._chunk(
+            b"VP8X",
+            b"\x12\x00\x00\x00" + _uint24(width - 1) + _uint24(height - 1),
+        )
+        # transparent background
+        self._chunk(b"ANIM", struct.pack("<IH", 0, self.loop))
+
+    def delta_box(self, previous, frame, box, pending):
+        # frames can only start at even pixels
+        left, top, right, bottom = box
+        return (left - left % 2, top - top % 2, right, bottom)
+
+    def write(self, frame: _Frame) -> None:
+        buffer = io.BytesIO()
+        Image.fromarray(frame.pixels, "RGBA").save(buffer, "WEBP", lossless=True)
+        left, top, right, bottom = frame.box
+        self._chunk(
+            b"ANMF",
+            _uint24(left // 2)
+            + _uint24(top // 2)
+            + _uint24(right - left - 1)
+            + _uint24(bottom - top - 1)
+            + _uint24(min(frame.duration, 0xFFFFFF))
+            # don't blend: replace the pixels of the box, alpha included
+            + b"\x02" + b"".join(_webp_image_chunks(buffer.getvalue())),
+        )
+        self.frame_count += 1
+
+    def finish(self) -> None:
+        end = self.fp.tell()
+        self.fp.seek(self._start + 4)
+        self.fp.write(struct.pack("<I", end - self._start - 8))
+        self.fp.seek(end)
+
+    def _chunk(self, chunk_type: bytes, data: bytes) -> None:
+        self.fp.write(_riff_chunk(chunk_type, data))
+
+
+def _uint24(value: int) -> bytes:
+    return value.to_bytes(3, "little")
+
+
+def _riff_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    # chunks are padded to an even size
+    return chunk_type + struct.pack("<I", len(data)) + data + b"\x00" * (len(data) % 2)
+
+
+def _webp_image_chunks(webp: bytes) -> Iterator[bytes]:
+    # the chunks of a still webp with the bitstream, leaving out the header and
+    # metadata
+    position = 12
+    while position < len(webp):
+        chunk_type = webp[position : position + 4]
+        (length,) = struct.unpack_from("<I", webp, position + 4)
+        if chunk_type in (b"ALPH", b"VP8 ", b"VP8L"):
+            yield _riff_chunk(chunk_type, webp[position + 8 : position + 8 + length])
+        position += 8 + length + length % 2
+
+
+ENCODERS: dict[AnimationFormat, type[_Encoder]] = {
+    "gif": _GifEncoder,
+    "apng": _ApngEncoder,
+    "webp": _WebpEncoder,
+}
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import glob
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+from attrs import frozen
+
+from skinpy.cache import RenderCache
+from skinpy.encode import Encoding
+from skinpy.render import Perspective
+from skinpy.skin import Skin
+
+if TYPE_CHECKING:
+    from skinpy.layout import SkinLayout
+    from skinpy.types import RenderBackend, StrPath
+
+logger = logging.getLogger(__name__)
+
+GLOB_CHARS = set("*?[")
+
+
+def collect_inputs(
+    inputs: Iterable[StrPath], manifest: StrPath | None = None
+) -> list[Path]:
+    """
+    Expand batch inputs into a list of skin paths, in order:
+
+    - directories contribute every .png file under them, recursively
+    - glob patterns (with *, ? or [) contribute their matches
+    - anything else is taken as a file path
+
+    A manifest is a text file with one input per line, treated the same way.
+    Blank lines and lines starting with # are skipped, and relative paths are
+    relative to the manifest.
+    """
+    entries = [str(i) for i in inputs]
+    if manifest is not None:
+        manifest_dir = Path(manifest).parent
+        for line in Path(manifest).read_text().splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entries.append(str(manifest_dir / line))
+
+    paths: list[Path] = []
+    for entry in entries:
+        path = Path(entry)
+        if path.is_dir():
+            paths.extend(sorted(path.rglob("*.png")))
+        elif GLOB_CHARS & set(entry):
+            paths.extend(sorted(Path(p) for p in glob.glob(entry, recursive=True)))
+        else:
+            paths.append(path)
+    return paths
+
+
+def format_output_path(
+    template: str, input_path: Path, index: int, perspective: Perspective
+) -> Path:
+    """
+    Fill in an output path template. The available fields are {stem}, {name} and
+    {parent} (the name of the input's directory) of the input path, its {index}
+    in the batch, and {x}, {y}, {z} and {scaling_factor} of the perspective.
+    """
+    return Path(
+        template.format(
+            stem=input_path.stem,
+            name=input_path.name,
+            parent=input_path.parent.name,
+            index=index,
+            x=perspective.x,
+            y=perspective.y,
+            z=perspective.z,
+            scaling_factor=perspective.scaling_factor,
+        )
+    )
+
+
+@frozen
+class BatchReport:
+    rendered: int
+    # (input path, error message) for each input that could not be rendered
+    failures: list[tuple[Path, str]]
+    seconds: float
+
+    @property
+    def skins_per_second(self) -> float:
+        return self.rendered / self.seconds if self.seconds > 0 else 0.0
+
+
+@lru_cache(maxsize=None)
+def disk_cache(directory: Path, max_bytes: int) -> RenderCache:
+    """
+    Return this process's cache of renders in `directory`, keeping at most
+    `max_bytes` of them. There is no memory tier, since workers rarely see the
+    same skin twice.
+    """
+    return RenderCache(max_entries=0, directory=directory, max_disk_bytes=max_bytes)
+
+
+def _render_one(
+    input_path: Path,
+    output_path: Path,
+    perspective: Perspective,
+    backend: RenderBackend,
+    overlay: bool,
+    layout: SkinLayout | None,
+    cache_dir: Path | None,
+    cache_max_bytes: int,
+    encoding: Encoding | None,
+) -> None:
+    skin = Skin.from_path(input_path, layout=layout)
+    image = skin.to_isometric_image(
+        perspective=perspective,
+        backend=backend,
+        overlay=overlay,
+        cache=None if cache_dir is None else disk_cache(cache_dir, cache_max_bytes),
+    )
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if encoding is None:
+        encoding = Encoding.for_path(output_path)
+    encoding.save(image, output_path)
+
+
+def render_batch(
+    input_paths: Iterable[Path],
+    output_template: str,
+    perspective: Perspective,
+    backend: RenderBackend = "numpy",
+    overlay: bool = False,
+    layout: SkinLayout | None = None,
+    jobs: int = 1,
+    max_in_flight: int | None = None,
+    cache_dir: StrPath | None = None,
+    cache_max_bytes: int = 1 << 30,
+    encoding: Encoding | None = None,
+) -> BatchReport:
+    """
+    Render every input to an isometric image at its templated output path (see
+    `format_output_path`), with the overlay layer if `overlay` is set. Skins are
+    loaded with `layout` (see `Skin.from_image`).
+
+    With a `cache_dir`, renders are cached on disk there (see
+    `skinpy.cache.RenderCache`), up to `cache_max_bytes`, so skins rendered by an
+    earlier batch aren't rendered again.
+
+    Renders are encoded with `encoding`, or by the suffix of each output path
+    (see `skinpy.encode.Encoding.for_path`).
+
+    With more than one job, skins are rendered across a process pool, with at
+    most `max_in_flight` (by default, 4 per job) submitted at a time so that
+    huge batches don't pile up in memory. Inputs that fail are logged and
+    skipped.
+    """
+    start = time.perf_counter()
+    cache_path = None if cache_dir is None else Path(cache_dir)
+    rendered = 0
+    failures: list[tuple[Path, str]] = []
+
+    def record(input_path: Path, error: BaseException | None) -> None:
+        nonlocal rendered
+        if error is None:
+            rendered += 1
+        else:
+            message = f"{type(error).__name__}: {error}"
+            logger.warning("Skipped %s (%s)", input_path, message)
+            failures.append((input_path, message))
+
+    tasks: Iterator[tuple[Path, Path]] = (
+        (path, format_output_path(output_template, path, index, perspective))
+        for index, path in enumerate(input_paths)
+    )
+
+    if jobs <= 1:
+        for input_path, output_path in tasks:
+            try:
+                _render_one(
+                    input_path,
+                    output_path,
+                    perspective,
+                    backend,
+                    overlay,
+                    layout,
+                    cache_path,
+                    cache_max_bytes,
+                    encoding,
+                )
+            except Exception as e:
+                record(input_path, e)
+            else:
+                record(input_path, None)
+    else:
+        limit = max_in_flight if max_in_flight is not None else jobs * 4
+        in_flight: dict[Future[None], Path] = {}
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+
+            def drain(return_when: str) -> None:
+                done, _ = wait(in_flight, return_when=return_when)
+                for future in done:
+                    record(in_flight.pop(future), future.exception())
+
+            for input_path, output_path in tasks:
+                if len(in_flight) >= limit:
+                    drain(FIRST_COMPLETED)
+                future = executor.submit(
+                    _render_one,
+                    input_path,
+                    output_path,
+                    perspective,
+                    backend,
+                    overlay,
+                    layout,
+                    cache_path,
+                    cache_max_bytes,
+                    encoding,
+                )
+                in_flight[future] = input_path
+            if in_flight:
+                drain("ALL_COMPLETED")
+
+    return BatchReport(
+        rendered=rendered,
+        failures=failures,
+        seconds=time.perf_counter() - start,
+    )
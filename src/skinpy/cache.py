@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Hashable, Optional
+
+import numpy as np
+from attrs import define, field, frozen
+from PIL import Image
+
+from skinpy.render import pack_colors
+
+if TYPE_CHECKING:
+    from skinpy.types import ImageColor, StrPath
+
+logger = logging.getLogger(__name__)
+
+# renders on disk are raw .npy arrays: bigger than PNGs, but loading one is a
+# read instead of a decode
+DISK_SUFFIX = ".npy"
+
+
+def _optional_path(path: StrPath | None) -> Path | None:
+    return None if path is None else Path(path)
+
+
+@frozen
+class CacheStats:
+    """
+    A snapshot of how a `RenderCache` has been doing.
+    """
+
+    # lookups answered from memory
+    memory_hits: int
+    # lookups answered from disk
+    disk_hits: int
+    # lookups that had to render
+    misses: int
+    # renders dropped from memory and from disk to stay within their limits
+    memory_evictions: int
+    disk_evictions: int
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+@define
+class RenderCache:
+    """
+    A cache of rendered images, keyed on the content of the skin and everything
+    that decides what its render looks like (the kind of render, layout,
+    perspective and output options), so the same skin rendered the same way is
+    only rendered once, whichever `Skin` object it comes from.
+
+    Renders are kept in memory, in an LRU of at most `max_entries` renders (or
+    none, with 0), and, if `directory` is given, on disk too, evicting the least
+    recently used files once they take more than `max_disk_bytes`. Many
+    processes can share a directory. Each process only notices the others' files
+    when it looks for them, so the directory can go over its limit by what the
+    other processes write until they evict.
+
+    Pass a cache to the `cache` argument of the rendering methods of `Skin`, or
+    use `get_or_render` directly.
+    """
+
+    max_entries: int = 256
+    directory: Optional[Path] = field(default=None, converter=_optional_path)
+    max_disk_bytes: int = 1 << 30
+
+    _memory: OrderedDict[str, np.ndarray] = field(
+        factory=OrderedDict, init=False, repr=False
+    )
+    # the size of each file on disk, least recently used first, read from the
+    # directory on first use
+    _disk: Optional[OrderedDict[str, int]] = field(default=None, init=False, repr=False)
+    _disk_bytes: int = field(default=0, init=False, repr=False)
+    _memory_hits: int = field(default=0, init=False, repr=False)
+    _disk_hits: int = field(default=0, init=False, repr=False)
+    _misses: int = field(default=0, init=False, repr=False)
+    _memory_evictions: int = field(default=0, init=False, repr=False)
+    _disk_evictions: int = field(default=0, init=False, repr=False)
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            memory_hits=self._memory_hits,
+            disk_hits=self._disk_hits,
+            misses=self._misses,
+            memory_evictions=self._memory_evictions,
+            disk_evictions=self._disk_evictions,
+        )
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def clear(self) -> None:
+        """
+        Empty the memory tier. Files on disk are left alone.
+        """
+        self._memory.clear()
+
+    def get_or_render(
+        self,
+        image_color: ImageColor,
+        options: Hashable,
+        render: Callable[[], Image.Image],
+    ) -> Image.Image:
+        """
+        Return the cached render of `image_color` with `options`, or call
+        `render` and cache what it returns. `options` must describe everything
+        that `render` depends on besides the skin's colors, and have a `repr`
+        that's the same in every process, like tuples of attrs classes and
+        strings do.
+        """
+        key = render_key(image_color, options)
+
+        array = self._memory.get(key)
+        if array is not None:
+            self._memory.move_to_end(key)
+            self._memory_hits += 1
+            return Image.fromarray(array)
+
+        array = self._load(key)
+        if array is not None:
+            self._disk_hits += 1
+        else:
+            self._misses += 1
+            array = np.asarray(render())
+            self._save(key, array)
+
+        array.flags.writeable = False
+        if self.max_entries > 0:
+            self._memory[key] = array
+            if len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._memory_evictions += 1
+        return Image.fromarray(array)
+
+    def _disk_index(self) -> OrderedDict[str, int]:
+        if self._disk is None:
+            assert self.directory is not None
+            self.directory.mkdir(parents=True, exist_ok=True)
+            entries = []
+            for path in self.directory.glob(f"*{DISK_SUFFIX}"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, path.stem, stat.st_size))
+            self._disk = OrderedDict((key, size) for _, key, size in sorted(entries))
+            self._disk_bytes = sum(self._disk.values())
+        return self._disk
+
+    def _path(self, key: str) -> Path:
+        assert self.directory is not None
+        return self.directory / f"{key}{DISK_SUFFIX}"
+
+    def _load(self, key: str) -> Optional[np.ndarray]:
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            array = np.load(path)
+            # files are evicted least recently used first, across processes
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable cached render %s (%s)", path, e)
+            return None
+
+        index = self._disk_index()
+        if key not in index:
+            # written by another process
+            index[key] = array.nbytes
+            self._disk_bytes += array.nbytes
+        index.move_to_end(key)
+        return array
+
+    def _save(self, key: str, array: np.ndarray) -> None:
+        if self.directory is None:
+            return
+        index = self._disk_index()
+
+        # written whole and then moved into place, so other processes never
+        # read half a file
+        fd, temp_name = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                np.save(file, array)
+            os.replace(temp_name, self._path(key))
+        except BaseException:
+            os.unlink(temp_name)
+            raise
+
+        size = self._path(key).stat().st_size
+        self._disk_bytes += size - index.pop(key, 0)
+        index[key] = size
+        # the newest render stays, even if it's over the limit on its own
+        while self._disk_bytes > self.max_disk_bytes and len(index) > 1:
+            old_key, size = index.popitem(last=False)
+            self._disk_bytes -= size
+            self._disk_evictions += 1
+            try:
+                self._path(old_key).unlink()
+            except FileNotFoundError:
+                pass
+
+
+def render_key(image_color: ImageColor, options: Hashable) -> str:
+    """
+    Return the cache key of a render of `image_color` with `options`: a hash of
+    the colors, laid out the same way whether the skin wraps a row-major or
+    column-major buffer, and of the options.
+    """
+    digest = hashlib.sha256(_options_digest(options))
+    digest.update(str(image_color.shape).encode())
+    digest.update(np.ascontiguousarray(pack_colors(image_color)))
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=256)
+def _options_digest(options: Hashable) -> bytes:
+    # reprs of layouts are long, so they're only hashed once
+    return hashlib.sha256(repr(options).encode()).digest()
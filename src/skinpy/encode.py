@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import zlib
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, Optional
+
+import numpy as np
+from attrs import frozen
+from PIL import Image
+
+from skinpy.profile import span
+from skinpy.render import pack_colors
+
+if TYPE_CHECKING:
+    from skinpy.types import ImageFormat, PngStrategy, StrPath
+
+FORMAT_SUFFIXES: dict[str, ImageFormat] = {
+    ".png": "png",
+    ".webp": "webp",
+    ".rgba": "raw",
+    ".raw": "raw",
+}
+
+# Pillow's png "compress_type" is the strategy zlib compresses the filtered rows
+# with. "filtered" and "rle" suit images of flat colors, like renders
+PNG_STRATEGIES: dict[PngStrategy, int] = {
+    "default": zlib.Z_DEFAULT_STRATEGY,
+    "filtered": zlib.Z_FILTERED,
+    "huffman": zlib.Z_HUFFMAN_ONLY,
+    "rle": zlib.Z_RLE,
+    "fixed": zlib.Z_FIXED,
+}
+
+# the most colors an indexed png can have
+PALETTE_SIZE = 256
+
+
+@frozen
+class Encoding:
+    """
+    How to encode an image:
+
+    - "png", at a zlib `compress_level` from 0 (fastest and biggest) to 9
+      (slowest and smallest), with a zlib `strategy` (see `PNG_STRATEGIES`). With
+      `palette`, the png is indexed: images of at most 256 colors, like most
+      renders, keep their colors exactly, and others are quantized to 256.
+    - "webp", losslessly, with a `method` from 0 (fastest and biggest) to 6
+      (slowest and smallest). Fully transparent pixels may lose their color.
+    - "raw", the RGBA bytes of the pixels, row by row, with no header.
+    """
+
+    format: ImageFormat = "png"
+    compress_level: int = 6
+    strategy: PngStrategy = "default"
+    palette: bool = False
+    method: int = 4
+
+    def __attrs_post_init__(self) -> None:
+        if self.format not in ("png", "webp", "raw"):
+            raise ValueError(
+                f"Image format must be one of png, webp or raw, not {self.format!r}"
+            )
+        if not 0 <= self.compress_level <= 9:
+            raise ValueError("PNG compress level must be from 0 to 9")
+        if self.strategy not in PNG_STRATEGIES:
+            raise ValueError(
+                f"PNG strategy must be one of {', '.join(PNG_STRATEGIES)}, not "
+                f"{self.strategy!r}"
+            )
+        if self.palette and self.format != "png":
+            raise ValueError("Only PNGs can have a palette")
+        if not 0 <= self.method <= 6:
+            raise ValueError("WebP method must be from 0 to 6")
+
+    @classmethod
+    def for_path(
+        cls, path: StrPath, format: Optional[ImageFormat] = None, **kwargs: Any
+    ) -> Encoding:
+        """
+        Return the encoding for `path`, in `format` or by the path's suffix (see
+        `FORMAT_SUFFIXES`). The other options are passed on.
+        """
+        if format is None:
+            suffix = Path(path).suffix.lower()
+            if suffix not in FORMAT_SUFFIXES:
+                raise ValueError(
+                    f"Can't tell the image format of {path}. Use one of the "
+                    f"suffixes {', '.join(FORMAT_SUFFIXES)}, or give a format"
+                )
+            format = FORMAT_SUFFIXES[suffix]
+        return cls(format=format, **kwargs)
+
+    def encode(self, image: Image.Image) -> bytes:
+        """
+        Return the encoded bytes of `image`.
+        """
+        with span("encode"):
+            if self.format == "raw":
+                return _rgba(image).tobytes()
+
+            options: dict[str, object]
+            if self.format == "webp":
+                options = {"lossless": True, "method": self.method}
+            else:
+                if self.palette:
+                    image = to_palette(image)
+                options = {
+                    "compress_level": self.compress_level,
+                    "compress_type": PNG_STRATEGIES[self.strategy],
+                }
+            out = BytesIO()
+            image.save(out, format=self.format.upper(), **options)
+            return out.getvalue()
+
+    def save(self, image: Image.Image, output: StrPath | BinaryIO) -> None:
+        """
+        Encode `image` to a file path or a binary file object, like
+        `sys.stdout.buffer`.
+        """
+        data = self.encode(image)
+        if isinstance(output, (str, Path)):
+            Path(output).write_bytes(data)
+        else:
+            output.write(data)
+
+
+def to_palette(image: Image.Image) -> Image.Image:
+    """
+    Return `image` as a "P" image with an RGBA palette. Images of at most 256
+    colors keep them exactly, and others are quantized.
+    """
+    image = _rgba(image)
+    pixels = pack_colors(np.asarray(image))
+    colors, indexes = np.unique(pixels, return_inverse=True)
+    if len(colors) > PALETTE_SIZE:
+        return image.quantize(PALETTE_SIZE, method=Image.Quantize.FASTOCTREE)
+
+    paletted = Image.fromarray(indexes.reshape(pixels.shape).astype(np.uint8))
+    paletted.putpalette(colors.view(np.uint8).tobytes(), "RGBA")
+    return paletted
+
+
+def _rgba(image: Image.Image) -> Image.Image:
+    # convert copies, even to the same mode
+    return image if image.mode == "RGBA" else image.convert("RGBA")
@@ -13,3 +13,10 @@ class InputImageException(McSkinException):
     """
     Raised when there's something wrong with the input image.
     """
+
+
+class SkinStoreError(McSkinException):
+    """
+    Raised when a skin store file is malformed, or used in a way it doesn't
+    support.
+    """
@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, Optional
+
+import numpy as np
+from attrs import frozen
+from PIL import Image
+
+from skinpy.layout import CLASSIC_LAYOUT, UNMAPPED, compile_layout
+from skinpy.render import (
+    alpha_composite,
+    pack_colors,
+    unpack_colors,
+)
+from skinpy.types import BODY_PART_IDS, FACE_IDS
+
+if TYPE_CHECKING:
+    from skinpy.layout import SkinLayout
+    from skinpy.types import BodyPartId, FaceId, ImageColor, R2
+
+# how many compiled flat views to keep around. there are 6 faces and a few
+# common selections of body parts per layout.
+FLAT_VIEW_CACHE_SIZE = 64
+
+# how many label images resized to sizes that aren't whole multiples of a view to
+# keep around, across all views. avatars can be asked for at any size.
+RESIZED_LABELS_CACHE_SIZE = 16
+
+
+@frozen(eq=False)
+class FlatView:
+    """
+    The compiled geometry of a flat (orthographic) view of a skin from one side,
+    like a front view of the whole body or of just the head for an avatar.
+
+    A flat view shows one face of every body part, seen straight on, so every
+    pixel of it is one texel of the skin: the texel of the nearest body part
+    there. That never changes between skins of a layout, so a view stores it as a
+    label image, and rendering a skin is one gather of its texels and one lookup
+    per output pixel, with no polygons at all.
+
+    Views should be obtained with `get_flat_view`, which caches them.
+    """
+
+    face_id: FaceId
+
+    # the layout of the skins that the view renders
+    layout: SkinLayout
+
+    # the body parts in the view
+    body_part_ids: tuple[BodyPartId, ...]
+
+    # the image coordinates of each texel shown, in label order
+    image_x: np.ndarray[tuple[int], np.dtype[np.intp]]
+    image_y: np.ndarray[tuple[int], np.dtype[np.intp]]
+
+    # (height, width) 1 + the index of the texel at each pixel, or 0 for none
+    labels: np.ndarray[tuple[int, int], np.dtype[np.int32]]
+
+    # the texels whose body part has an overlay, and the image coordinates of the
+    # overlay texel in front of each
+    overlay_texels: np.ndarray[tuple[int], np.dtype[np.intp]]
+    overlay_image_x: np.ndarray[tuple[int], np.dtype[np.intp]]
+    overlay_image_y: np.ndarray[tuple[int], np.dtype[np.intp]]
+
+    @classmethod
+    def compile(
+        cls,
+        face_id: FaceId,
+        layout: SkinLayout = CLASSIC_LAYOUT,
+        body_part_ids: Optional[Iterable[BodyPartId]] = None,
+    ) -> FlatView:
+        """
+        Compile the view of the `face_id` side of a layout's skins, showing only
+        the body parts with `body_part_ids` if given. The view is just big enough
+        to contain those body parts.
+        """
+        if face_id not in FACE_IDS:
+            raise ValueError(f"Unknown face id {face_id!r}")
+        if body_part_ids is None:
+            body_part_ids = tuple(part.id_ for part in layout.parts)
+        else:
+            body_part_ids = tuple(
+                layout.part(body_part_id).id_ for body_part_id in body_part_ids
+            )
+            if not body_part_ids:
+                raise ValueError("A flat view needs at least one body part")
+
+        compiled = compile_layout(layout)
+        x, y, z, body_part_index, face_index, image_x, image_y = compiled.columns
+        keep = (face_index == FACE_IDS.index(face_id)) & np.isin(
+            body_part_index, [BODY_PART_IDS.index(id_) for id_ in body_part_ids]
+        )
+        x, y, z, image_x, image_y = (
+            column[keep] for column in (x, y, z, image_x, image_y)
+        )
+
+        column, row, depth = _project(face_id, layout.model_shape, x, y, z)
+        # the projection can be x, y or z themselves, so these aren't in place
+        column = column - column.min()
+        row = row - row.min()
+        width = int(column.max()) + 1
+        height = int(row.max()) + 1
+
+        # the nearest texel wins each pixel: sort by pixel, then depth, and take
+        # the first of each pixel
+        pixel = row * width + column
+        order = np.lexsort((depth, pixel))
+        first = np.ones(len(order), dtype=np.bool_)
+        first[1:] = pixel[order][1:] != pixel[order][:-1]
+        shown = order[first]
+
+        labels = np.zeros(height * width, dtype=np.int32)
+        labels[pixel[shown]] = np.arange(1, len(shown) + 1)
+
+        # the overlay texel in front of each shown texel, if its body part has
+        # an overlay. body parts don't overlap on the model, so each voxel face
+        # has at most one.
+        ox, oy, oz, _, oface, overlay_x, overlay_y = compiled.overlay_columns
+        overlay_index = np.full(
+            (*layout.model_shape, len(FACE_IDS), 2), UNMAPPED, dtype=np.intp
+        )
+        overlay_index[ox, oy, oz, oface] = np.stack((overlay_x, overlay_y), axis=1)
+        overlay_xy = overlay_index[
+            x[shown], y[shown], z[shown], FACE_IDS.index(face_id)
+        ]
+        (overlay_texels,) = np.nonzero(overlay_xy[:, 0] != UNMAPPED)
+
+        return cls(
+            face_id=face_id,
+            layout=layout,
+            body_part_ids=body_part_ids,
+            image_x=_read_only(image_x[shown]),
+            image_y=_read_only(image_y[shown]),
+            labels=_read_only(labels.reshape(height, width)),
+            overlay_texels=_read_only(overlay_texels),
+            overlay_image_x=_read_only(overlay_xy[overlay_texels, 0]),
+            overlay_image_y=_read_only(overlay_xy[overlay_texels, 1]),
+        )
+
+    @property
+    def size(self) -> R2:
+        """
+        The (width, height) of the view at scale 1, one pixel per texel.
+        """
+        height, width = self.labels.shape
+        return (width, height)
+
+    def colors(
+        self, image_color: ImageColor, overlay: bool = True
+    ) -> np.ndarray[tuple[int, ...], np.dtype[np.uint8]]:
+        """
+        Return the color of each texel shown, in label order, with shape
+        (..., texels, 4). With `overlay`, the overlay is alpha-composited over
+        them.
+
+        `image_color` can have leading batch dimensions, (..., width, height, 4).
+        """
+        return unpack_colors(self._pixels(image_color, overlay))
+
+    def _pixels(
+        self, image_color: ImageColor, overlay: bool
+    ) -> np.ndarray[tuple[int, ...], np.dtype[np.uint32]]:
+        # like `colors`, as whole 32-bit pixels, which are much faster to move
+        # around than 4-byte rows
+        image_pixels = pack_colors(image_color)
+        pixels = image_pixels[..., self.image_x, self.image_y]
+        if not overlay or not len(self.overlay_texels):
+            return pixels
+
+        base = pixels[..., self.overlay_texels]
+        src = image_pixels[..., self.overlay_image_x, self.overlay_image_y]
+        alpha = unpack_colors(src)[..., 3]
+        # opaque texels replace what's under them and transparent ones leave it,
+        # so only translucent ones need the arithmetic
+        composited = np.where(alpha == 255, src, base)
+        translucent = np.nonzero((alpha > 0) & (alpha < 255))
+        if len(translucent[0]):
+            composited[translucent] = pack_colors(
+                alpha_composite(
+                    unpack_colors(base[translucent]), unpack_colors(src[translucent])
+                )
+            )
+        pixels[..., self.overlay_texels] = composited
+        return pixels
+
+    def labels_for_size(
+        self, size: R2
+    ) -> np.ndarray[tuple[int, int], np.dtype[np.int32]]:
+        """
+        Return the label image resized to a (width, height) size with
+        nearest-neighbor sampling. Resized label images are kept in a bounded
+        LRU cache.
+        """
+        out_width, out_height = size
+        if out_width < 1 or out_height < 1:
+            raise ValueError(f"Flat views can't be {out_width}x{out_height}")
+        return _resized_labels(self, (out_width, out_height))
+
+    def render_array(
+        self,
+        image_color: ImageColor,
+        size: Optional[R2] = None,
+        overlay: bool = True,
+        background_color: tuple[int, int, int, int] | None = None,
+    ) -> np.ndarray[tuple[int, ...], np.dtype[np.uint8]]:
+        """
+        Render straight to a (height, width, 4) array, `size` pixels big, or one
+        pixel per texel by default. Texels are upscaled with nearest-neighbor
+        sampling.
+
+        `image_color` can have leading batch dimensions, (..., width, height, 4),
+        to render many skins at once. The result then has shape
+        (..., height, width, 4).
+        """
+        pixels = self._pixels(image_color, overlay)
+        palette = np.empty(pixels.shape[:-1] + (pixels.shape[-1] + 1,), np.uint32)
+        palette[..., 0] = pack_colors(
+            np.array(background_color or (0, 0, 0, 0), dtype=np.uint8)
+        )
+        palette[..., 1:] = pixels
+
+        scale = 1 if size is None else _whole_scale(self.size, size)
+        if scale is None:
+            labels = self.labels_for_size(size)  # type: ignore
+            return unpack_colors(np.take(palette, labels, axis=-1))
+
+        image = np.take(palette, self.labels, axis=-1)
+        if scale > 1:
+            # repeating whole pixels is much cheaper than looking up a label for
+            # every output pixel
+            image = np.repeat(np.repeat(image, scale, axis=-2), scale, axis=-1)
+        return unpack_colors(image)
+
+    def render(
+        self,
+        image_color: ImageColor,
+        size: Optional[R2] = None,
+        overlay: bool = True,
+        background_color: tuple[int, int, int, int] | None = None,
+    ) -> Image.Image:
+        """
+        Like `render_array`, but returns an image.
+        """
+        return Image.fromarray(
+            self.render_array(image_color, size, overlay, background_color)
+        )
+
+
+def _project(
+    face_id: FaceId, model_shape: tuple[int, int, int], x, y, z
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return the view column, row and depth of voxels seen from the `face_id` side
+    of the model. Smaller depths are nearer the viewer.
+
+    Every side is seen the way its faces are drawn on the skin image, so the
+    texture of each face appears in the view as it is on the image.
+    """
+    x_shape, y_shape, z_shape = model_shape
+    if face_id == "front":
+        return x, z_shape - 1 - z, y
+    elif face_id == "back":
+        return x_shape - 1 - x, z_shape - 1 - z, -y
+    elif face_id == "left":
+        return y_shape - 1 - y, z_shape - 1 - z, x
+    elif face_id == "right":
+        return y, z_shape - 1 - z, -x
+    elif face_id == "up":
+        return x, y_shape - 1 - y, -z
+    else:  # down
+        return x, y_shape - 1 - y, z
+
+
+def _whole_scale(view_size: R2, size: R2) -> Optional[int]:
+    # the scale that makes a view `size` pixels big, if it's a whole number
+    width, height = view_size
+    scale = size[0] // width
+    if scale >= 1 and tuple(size) == (width * scale, height * scale):
+        return scale
+    return None
+
+
+def _body_part_order(body_part_id: BodyPartId) -> int:
+    # unknown ids sort last, and are reported when the view is compiled
+    try:
+        return BODY_PART_IDS.index(body_part_id)
+    except ValueError:
+        return len(BODY_PART_IDS)
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    # views are shared through the cache, so their arrays must not be modified
+    array.flags.writeable = False
+    return array
+
+
+@lru_cache(maxsize=RESIZED_LABELS_CACHE_SIZE)
+def _resized_labels(
+    view: FlatView, size: R2
+) -> np.ndarray[tuple[int, int], np.dtype[np.int32]]:
+    out_width, out_height = size
+    width, height = view.size
+    rows = np.arange(out_height) * height // out_height
+    columns = np.arange(out_width) * width // out_width
+    return _read_only(view.labels[rows[:, np.newaxis], columns])
+
+
+@lru_cache(maxsize=FLAT_VIEW_CACHE_SIZE)
+def _cached_flat_view(
+    face_id: FaceId,
+    layout: SkinLayout,
+    body_part_ids: Optional[tuple[BodyPartId, ...]],
+) -> FlatView:
+    return FlatView.compile(face_id, layout, body_part_ids)
+
+
+def get_flat_view(
+    face_id: FaceId,
+    layout: SkinLayout = CLASSIC_LAYOUT,
+    body_part_ids: Optional[Iterable[BodyPartId]] = None,
+) -> FlatView:
+    """
+    Return the flat view of the `face_id` side of a layout's skins, showing only
+    the body parts with `body_part_ids` if given, compiling it on first use.
+    Views are kept in a bounded LRU cache.
+    """
+    if body_part_ids is not None:
+        # in a canonical order, so that every selection is cached once
+        body_part_ids = tuple(sorted(set(body_part_ids), key=_body_part_order))
+    return _cached_flat_view(face_id, layout, body_part_ids)
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+from attrs import define, field
+from PIL import Image
+
+from skinpy.layout import CLASSIC_LAYOUT
+from skinpy.plan import OverlayLayers, get_render_plan
+from skinpy.render import color_palette, pack_colors, unpack_colors
+
+if TYPE_CHECKING:
+    from skinpy.layout import SkinLayout
+    from skinpy.plan import RenderPlan
+    from skinpy.render import Projection
+    from skinpy.skin import Skin
+
+# how many pixel indexes to keep around, like plans
+PIXEL_INDEX_CACHE_SIZE = 16
+
+# past this fraction of the image, redrawing all of it is cheaper than
+# redrawing pixels one by one
+FULL_REDRAW_FRACTION = 0.25
+
+
+@define
+class IncrementalRenderer:
+    """
+    An isometric render of a skin that is kept up to date as the skin is edited,
+    redrawing only the pixels that edits affect.
+
+    Edits are found by comparing the texels that the render shows with what they
+    were at the last update, so any way of editing the skin counts: `set_color`
+    on the skin, its body parts or faces, or writing to `image_color` directly.
+    A one-texel edit redraws just the few pixels of that texel, instead of the
+    whole image.
+
+    Renders are the same as `Skin.to_isometric_image` with the "numpy" backend.
+    """
+
+    skin: Skin
+    perspective: Projection
+    background_color: Optional[tuple[int, int, int, int]] = None
+    depth_test: bool = False
+    overlay: bool = False
+
+    _plan: RenderPlan = field(init=False, repr=False)
+    # the overlay layers of the render, or one stack per polygon without overlay
+    _layers: OverlayLayers = field(init=False, repr=False)
+    # the texels the render shows, as 32-bit pixels: base polygons, then overlay
+    # polygons
+    _texels: np.ndarray = field(init=False, repr=False)
+    # the 32-bit color of each stack
+    _stack_colors: np.ndarray = field(init=False, repr=False)
+    # (height, width) 32-bit pixels of the render
+    _pixels: np.ndarray = field(init=False, repr=False)
+    # see `_pixel_index`
+    _pixel_order: np.ndarray = field(init=False, repr=False)
+    _pixel_offsets: np.ndarray = field(init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        self._plan = get_render_plan(
+            self.perspective, overlay=self.overlay, layout=self.skin.layout
+        )
+        self._layers = _render_layers(self._plan, self.depth_test)
+        self._texels = self._current_texels()
+        self._stack_colors = self._composite(self._layers.stacks)
+        self._pixels = np.take(self._stack_colors, self._layers.labels)
+        self._pixel_order, self._pixel_offsets = _pixel_index(
+            self.perspective, self.overlay, self.skin.layout, self.depth_test
+        )
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """
+        The (width, height) of the render.
+        """
+        return self._plan.size
+
+    def update(self) -> Optional[tuple[int, int, int, int]]:
+        """
+        Redraw whatever the skin's edits since the last update changed. Returns
+        the (left, upper, right, lower) box of the pixels redrawn, or None if
+        nothing changed.
+        """
+        texels = self._current_texels()
+        (changed,) = np.nonzero(texels != self._texels)
+        if not len(changed):
+            return None
+        self._texels = texels
+
+        stacks = self._layers.stacks
+        if len(stacks) == 1:
+            # without overlay, each polygon is its own stack, labeled 1 + its
+            # index, and keeps its texel's color
+            affected_stacks = changed + 1
+            self._stack_colors[affected_stacks] = texels[changed]
+        else:
+            # the stacks of polygons that any changed texel is in. labels are
+            # 1 + the polygon index in each row of the stacks.
+            polygon_count = len(self._plan.image_x)
+            changed_labels = np.zeros(len(texels) + 1, dtype=np.bool_)
+            changed_labels[changed + 1] = True
+            overlay_changed = np.concatenate(
+                ([False], changed_labels[polygon_count + 1 :])
+            )
+            affected = changed_labels[stacks[0]]
+            affected |= overlay_changed[stacks[1:]].any(axis=0)
+            (affected_stacks,) = np.nonzero(affected)
+            self._stack_colors[affected_stacks] = self._composite(
+                stacks[:, affected_stacks]
+            )
+
+        starts = self._pixel_offsets[affected_stacks]
+        counts = self._pixel_offsets[affected_stacks + 1] - starts
+        total = int(counts.sum())
+        if total > self._pixels.size * FULL_REDRAW_FRACTION:
+            np.take(self._stack_colors, self._layers.labels, out=self._pixels)
+            width, height = self.size
+            return (0, 0, width, height)
+        if not total:
+            return None
+
+        # the pixels of every affected stack, which are runs of `_pixel_order`
+        run_starts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        pixels = self._pixel_order[run_starts + np.arange(total)]
+        flat = self._pixels.reshape(-1)
+        flat[pixels] = np.take(
+            self._stack_colors, self._layers.labels.reshape(-1)[pixels]
+        )
+
+        width = self._pixels.shape[1]
+        rows = pixels // width
+        columns = pixels % width
+        return (
+            int(columns.min()),
+            int(rows.min()),
+            int(columns.max()) + 1,
+            int(rows.max()) + 1,
+        )
+
+    def render_array(self) -> np.ndarray[tuple[int, int, int], np.dtype[np.uint8]]:
+        """
+        Update, then return a (height, width, 4) copy of the render.
+        """
+        self.update()
+        return unpack_colors(self._pixels.copy())
+
+    def render(self) -> Image.Image:
+        """
+        Update, then return the render as an image.
+        """
+        return Image.fromarray(self.render_array())
+
+    def _current_texels(self) -> np.ndarray:
+        plan = self._plan
+        image_pixels = pack_colors(self.skin.image_color)
+        return np.concatenate(
+            (
+                image_pixels[plan.image_x, plan.image_y],
+                image_pixels[plan.overlay_image_x, plan.overlay_image_y],
+            )
+        )
+
+    def _composite(self, stacks: np.ndarray) -> np.ndarray:
+        # the 32-bit color of each of the stacks
+        polygon_count = len(self._plan.image_x)
+        colors = unpack_colors(self._texels)
+        palette = color_palette(colors[:polygon_count], self.background_color)
+        if len(stacks) == 1:
+            return np.take(pack_colors(palette), stacks[0])
+        layers = OverlayLayers(stacks=stacks, labels=self._layers.labels)
+        return layers.composite_pixels(
+            pack_colors(palette), self._texels[polygon_count:]
+        )
+
+
+def _render_layers(plan: RenderPlan, depth_test: bool) -> OverlayLayers:
+    # the overlay layers of a plan, or, without overlay, layers with a stack of
+    # just the polygon for every label
+    layers = plan.overlay_depth_layers if depth_test else plan.overlay_layers
+    if layers is not None:
+        return layers
+    labels = plan.depth_labels if depth_test else plan.labels
+    stacks = np.arange(len(plan.image_x) + 1, dtype=np.int32).reshape(1, -1)
+    return OverlayLayers(stacks=stacks, labels=labels)
+
+
+@lru_cache(maxsize=PIXEL_INDEX_CACHE_SIZE)
+def _pixel_index(
+    perspective: Projection,
+    overlay: bool,
+    layout: SkinLayout = CLASSIC_LAYOUT,
+    depth_test: bool = False,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the pixels of each stack of a render: the flat index of every pixel,
+    sorted by stack, and the offset in that of the first pixel of each stack,
+    then the pixel count.
+    """
+    plan = get_render_plan(perspective, overlay=overlay, layout=layout)
+    layers = _render_layers(plan, depth_test)
+    labels = layers.labels.reshape(-1)
+    order = np.argsort(labels, kind="stable")
+    offsets = np.searchsorted(labels[order], np.arange(layers.stacks.shape[1] + 1))
+    order.flags.writeable = False
+    offsets.flags.writeable = False
+    return order, offsets
@@ -0,0 +1,524 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, TypeVar
+
+import numpy as np
+from attrs import evolve, frozen
+from numpy import s_
+
+from skinpy.render import face_corner_array
+from skinpy.types import BODY_PART_IDS, FACE_IDS
+
+if TYPE_CHECKING:
+    from skinpy.types import R2, R3, BodyPartId, FaceId
+
+_T = TypeVar("_T", int, np.ndarray)
+
+# marks voxel faces that have no pixel on the skin in lookup tables
+UNMAPPED = -1
+
+# the biggest HD skins are 8 times the size of a classic or legacy skin (512
+# pixels wide). their lookup tables grow with the cube of the factor
+MAX_HD_FACTOR = 8
+
+# compiled layouts hold tables of every voxel of the model, so only a few are
+# kept. most processes only ever see classic and slim skins
+LAYOUT_CACHE_SIZE = 8
+FACE_LAYOUT_CACHE_SIZE = 256
+
+FORWARD_SLICE = s_[:]
+REVERSE_SLICE = s_[::-1]
+
+
+@frozen
+class _FaceNet:
+    """
+    Where a face sits in the net of its body part's image, in terms of the body
+    part's (x, y, z) shape.
+    """
+
+    # the image (x, y) origin of the face is the dot product of these with the
+    # shape
+    origin: tuple[R3, R3]
+    # the axes of the shape that span the face's image (x, y)
+    axes: R2
+    # whether the face's u runs right to left on the image
+    flip_u: bool
+
+
+# Each body part's faces are laid out on the image as follows:
+#
+# +---+---+---+---+
+# | - | U | D | - |
+# +---+---+---+---+
+# | L | F | R | B |
+# +---+---+---+---+
+#
+# with the origin at the top left corner of that diagram.
+FACE_NET: dict[FaceId, _FaceNet] = {
+    "up": _FaceNet(origin=((0, 1, 0), (0, 0, 0)), axes=(0, 1), flip_u=False),
+    "down": _FaceNet(origin=((1, 1, 0), (0, 0, 0)), axes=(0, 1), flip_u=False),
+    "left": _FaceNet(origin=((0, 0, 0), (0, 1, 0)), axes=(1, 2), flip_u=True),
+    "right": _FaceNet(origin=((1, 1, 0), (0, 1, 0)), axes=(1, 2), flip_u=False),
+    "front": _FaceNet(origin=((0, 1, 0), (0, 1, 0)), axes=(0, 2), flip_u=False),
+    "back": _FaceNet(origin=((1, 2, 0), (0, 1, 0)), axes=(0, 2), flip_u=True),
+}
+
+
+@frozen
+class PartLayout:
+    """
+    Where a body part is on the model and on the skin image.
+    """
+
+    id_: BodyPartId
+    # x, y, z
+    shape: R3
+    # the front left down corner of the cuboid relative to the entire skin
+    model_origin: R3
+    # the top left corner of the body part's net on the image
+    image_origin: R2
+    # mirrored body parts are textured like the body part on the other side of
+    # the model: left to right, like the left limbs of legacy skins
+    mirrored: bool = False
+    # the top left corner of the overlay's net, or None if it has no overlay
+    overlay_image_origin: Optional[R2] = None
+    # how far the overlay's shell is inflated around the body part, in texels
+    overlay_inflation: float = 0.0
+
+    @property
+    def image_shape(self) -> R2:
+        x_shape, y_shape, z_shape = self.shape
+        return (x_shape * 2 + y_shape * 2, y_shape + z_shape)
+
+    @property
+    def has_overlay(self) -> bool:
+        return self.overlay_image_origin is not None
+
+
+# layouts are cache keys, for compiled tables and render plans
+@frozen(cache_hash=True)
+class SkinLayout:
+    """
+    How a kind of skin maps its image onto the model: the size of the image and
+    model, and the `PartLayout` of each body part.
+
+    Layouts are plain data. Everything derived from them, like which pixel colors
+    each voxel face, is compiled once per layout by `compile_layout`.
+    """
+
+    name: str
+    # (width, height) of the skin image
+    image_size: R2
+    # (x, y, z) of the whole model
+    model_shape: R3
+    # in the order of `Skin.body_parts`
+    parts: tuple[PartLayout, ...]
+
+    def part(self, body_part_id: BodyPartId) -> PartLayout:
+        for part in self.parts:
+            if part.id_ == body_part_id:
+                return part
+        raise ValueError(f"Unknown body part id {body_part_id!r}")
+
+    def fit(self, size: R2) -> SkinLayout:
+        """
+        Return this layout, or its HD version (see `scaled`), for skin images of
+        a (width, height) size. Raises ValueError if neither fits, or if the
+        size is more than MAX_HD_FACTOR times this layout's.
+        """
+        width, height = self.image_size
+        factor = size[0] // width
+        if factor < 1 or tuple(size) != (width * factor, height * factor):
+            raise ValueError(
+                f"A {self.name} skin can't be {size[0]}x{size[1]} pixels, only "
+                f"{width}x{height} or a multiple of that"
+            )
+        if factor > MAX_HD_FACTOR:
+            raise ValueError(
+                f"HD skins can be at most {MAX_HD_FACTOR} times the size of a "
+                f"{self.name} skin, but {size[0]}x{size[1]} is {factor} times"
+            )
+        return self.scaled(factor)
+
+    def scaled(self, factor: int) -> SkinLayout:
+        """
+        Return the HD version of this layout, with `factor` times the pixels
+        along each side of the image. Every texel is still one voxel, so the model
+        is `factor` times bigger too.
+        """
+        if factor < 1:
+            raise ValueError(f"Scale factor must be at least 1, but got {factor}")
+        if factor == 1:
+            return self
+
+        def scale(values: tuple[int, ...]) -> tuple[int, ...]:
+            return tuple(value * factor for value in values)
+
+        return SkinLayout(
+            name=f"{self.name}@{factor}x",
+            image_size=scale(self.image_size),  # type: ignore
+            model_shape=scale(self.model_shape),  # type: ignore
+            parts=tuple(
+                evolve(
+                    part,
+                    shape=scale(part.shape),
+                    model_origin=scale(part.model_origin),
+                    image_origin=scale(part.image_origin),
+                    overlay_image_origin=(
+                        None
+                        if part.overlay_image_origin is None
+                        else scale(part.overlay_image_origin)
+                    ),
+                    overlay_inflation=part.overlay_inflation * factor,
+                )
+                for part in self.parts
+            ),
+        )
+
+
+CLASSIC_LAYOUT = SkinLayout(
+    name="classic",
+    image_size=(64, 64),
+    model_shape=(16, 8, 32),
+    parts=(
+        PartLayout(
+            id_="left_leg",
+            shape=(4, 4, 12),
+            model_origin=(4, 2, 0),
+            image_origin=(0, 16),
+            overlay_image_origin=(0, 32),
+            overlay_inflation=0.25,
+        ),
+        PartLayout(
+            id_="right_leg",
+            shape=(4, 4, 12),
+            model_origin=(8, 2, 0),
+            image_origin=(16, 48),
+            overlay_image_origin=(0, 48),
+            overlay_inflation=0.25,
+        ),
+        PartLayout(
+            id_="left_arm",
+            shape=(4, 4, 12),
+            model_origin=(0, 2, 12),
+            image_origin=(40, 16),
+            overlay_image_origin=(40, 32),
+            overlay_inflation=0.25,
+        ),
+        PartLayout(
+            id_="torso",
+            shape=(8, 4, 12),
+            model_origin=(4, 2, 12),
+            image_origin=(16, 16),
+            overlay_image_origin=(16, 32),
+            overlay_inflation=0.25,
+        ),
+        PartLayout(
+            id_="right_arm",
+            shape=(4, 4, 12),
+            model_origin=(12, 2, 12),
+            image_origin=(32, 48),
+            overlay_image_origin=(48, 48),
+            overlay_inflation=0.25,
+        ),
+        PartLayout(
+            id_="head",
+            shape=(8, 8, 8),
+            model_origin=(4, 0, 24),
+            image_origin=(0, 0),
+            overlay_image_origin=(32, 0),
+            overlay_inflation=0.5,
+        ),
+    ),
+)
+
+# like classic, but with arms 3 texels wide
+SLIM_LAYOUT = SkinLayout(
+    name="slim",
+    image_size=(64, 64),
+    model_shape=(16, 8, 32),
+    parts=(
+        PartLayout(
+            id_="left_leg",
+            shape=(4, 4, 12),
+            model_origin=(4, 2, 0),
+            image_origin=(0, 16),
+            overlay_image_origin=(0, 32),
+            overlay_inflation=0.25,
+        ),
+        PartLayout(
+            id_="right_leg",
+            shape=(4, 4, 12),
+            model_origin=(8, 2, 0),
+            image_origin=(16, 48),
+            overlay_image_origin=(0, 48),
+            overlay_inflation=0.25,
+        ),
+        PartLayout(
+            id_="left_arm",
+            shape=(3, 4, 12),
+            model_origin=(1, 2, 12),
+            image_origin=(40, 16),
+            overlay_image_origin=(40, 32),
+            overlay_inflation=0.25,
+        ),
+        PartLayout(
+            id_="torso",
+            shape=(8, 4, 12),
+            model_origin=(4, 2, 12),
+            image_origin=(16, 16),
+            overlay_image_origin=(16, 32),
+            overlay_inflation=0.25,
+        ),
+        PartLayout(
+            id_="right_arm",
+            shape=(3, 4, 12),
+            model_origin=(12, 2, 12),
+            image_origin=(32, 48),
+            overlay_image_origin=(48, 48),
+            overlay_inflation=0.25,
+        ),
+        PartLayout(
+            id_="head",
+            shape=(8, 8, 8),
+            model_origin=(4, 0, 24),
+            image_origin=(0, 0),
+            overlay_image_origin=(32, 0),
+            overlay_inflation=0.5,
+        ),
+    ),
+)
+
+# 64x32 skins from before 1.8: the right limbs are mirrors of the left ones, and
+# only the head has an overlay
+LEGACY_LAYOUT = SkinLayout(
+    name="legacy",
+    image_size=(64, 32),
+    model_shape=(16, 8, 32),
+    parts=(
+        PartLayout(
+            id_="left_leg",
+            shape=(4, 4, 12),
+            model_origin=(4, 2, 0),
+            image_origin=(0, 16),
+        ),
+        PartLayout(
+            id_="right_leg",
+            shape=(4, 4, 12),
+            model_origin=(8, 2, 0),
+            image_origin=(0, 16),
+            mirrored=True,
+        ),
+        PartLayout(
+            id_="left_arm",
+            shape=(4, 4, 12),
+            model_origin=(0, 2, 12),
+            image_origin=(40, 16),
+        ),
+        PartLayout(
+            id_="torso",
+            shape=(8, 4, 12),
+            model_origin=(4, 2, 12),
+            image_origin=(16, 16),
+        ),
+        PartLayout(
+            id_="right_arm",
+            shape=(4, 4, 12),
+            model_origin=(12, 2, 12),
+            image_origin=(40, 16),
+            mirrored=True,
+        ),
+        PartLayout(
+            id_="head",
+            shape=(8, 8, 8),
+            model_origin=(4, 0, 24),
+            image_origin=(0, 0),
+            overlay_image_origin=(32, 0),
+            overlay_inflation=0.5,
+        ),
+    ),
+)
+
+LAYOUTS: dict[str, SkinLayout] = {
+    layout.name: layout for layout in (CLASSIC_LAYOUT, SLIM_LAYOUT, LEGACY_LAYOUT)
+}
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def layout_for_size(size: R2) -> SkinLayout:
+    """
+    Return the layout of skin images of a (width, height) size: classic for
+    64x64, legacy for 64x32, and HD versions of those for multiples of them, up
+    to MAX_HD_FACTOR times. Slim skins are the same size as classic ones, so
+    they're never picked.
+
+    Raises ValueError for any other size.
+    """
+    width, height = size
+    max_width = CLASSIC_LAYOUT.image_size[0] * MAX_HD_FACTOR
+    if width > max_width:
+        raise ValueError(
+            f"Skins can be at most {max_width} pixels wide, not {width}x{height}"
+        )
+    for layout in (CLASSIC_LAYOUT, LEGACY_LAYOUT):
+        try:
+            return layout.fit(size)
+        except ValueError:
+            pass
+    raise ValueError(f"No skin layout is {width}x{height} pixels")
+
+
+@frozen
+class FaceLayout:
+    """
+    Where a face is on its body part's image, and how it's oriented. These only
+    depend on the face id and body part shape, so they're shared by every skin.
+    """
+
+    image_origin: R2
+    image_shape: R2
+    order: tuple[slice, slice]
+
+
+@lru_cache(maxsize=FACE_LAYOUT_CACHE_SIZE)
+def face_layout(id_: FaceId, part_shape: R3, mirrored: bool = False) -> FaceLayout:
+    try:
+        net = FACE_NET[id_]
+    except KeyError:
+        raise ValueError(f"Unknown face id {id_!r}") from None
+
+    flip_u = net.flip_u
+    if mirrored:
+        # the left and right faces trade places, which flips them left to right,
+        # and every other face is flipped in place
+        if id_ in ("left", "right"):
+            net = FACE_NET["right" if id_ == "left" else "left"]
+            flip_u = net.flip_u
+        else:
+            flip_u = not flip_u
+
+    origin_x, origin_y = (
+        sum(coefficient * size for coefficient, size in zip(coefficients, part_shape))
+        for coefficients in net.origin
+    )
+    u_axis, v_axis = net.axes
+    return FaceLayout(
+        image_origin=(origin_x, origin_y),
+        image_shape=(part_shape[u_axis], part_shape[v_axis]),
+        # v always runs bottom to top, and images run top to bottom
+        order=(REVERSE_SLICE if flip_u else FORWARD_SLICE, REVERSE_SLICE),
+    )
+
+
+def face_to_model(face_id: FaceId, part_shape: R3, u: _T, v: _T) -> tuple[_T, _T, _T]:
+    """
+    Convert (u, v) coordinates on a face to (x, y, z) coordinates on its body
+    part. Works on ints and arrays alike.
+    """
+    x_shape, y_shape, z_shape = part_shape
+    if face_id in ("up", "down"):
+        z = 0 if face_id == "down" else z_shape - 1
+        return u, v, u * 0 + z
+    elif face_id in ("left", "right"):
+        x = 0 if face_id == "left" else x_shape - 1
+        return u * 0 + x, u, v
+    else:  # front or back
+        y = 0 if face_id == "front" else y_shape - 1
+        return u, u * 0 + y, v
+
+
+@frozen(eq=False)
+class CompiledLayout:
+    """
+    The lookup tables of a layout, as read-only arrays. Get them with
+    `compile_layout`, which keeps those of the last few layouts it built.
+
+    The voxel columns describe every mapped voxel face, one per row (see
+    `skinpy.skin.VoxelTable`): x, y, z, body part index, face index, image x and
+    image y. The overlay columns are the same for the overlay of every body part
+    that has one, where x, y and z are those of the voxel face it covers.
+    """
+
+    layout: SkinLayout
+    columns: tuple[np.ndarray, ...]
+    overlay_columns: tuple[np.ndarray, ...]
+
+    # (*model_shape, 6 faces, 2) image (x, y) of each voxel face, or UNMAPPED for
+    # voxel faces that aren't on the skin. Faces are indexed in FACE_IDS order.
+    voxel_index: np.ndarray[tuple[int, int, int, int, int], np.dtype[np.intp]]
+
+    # (rows, 4, 3) model coordinates of the corners of the voxel face of each row
+    # of the voxel and overlay columns, so that renders can project all of them
+    # at once
+    corners: np.ndarray[tuple[int, int, int], np.dtype[np.int_]]
+    overlay_corners: np.ndarray[tuple[int, int, int], np.dtype[np.int_]]
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def compile_layout(layout: SkinLayout) -> CompiledLayout:
+    """
+    Build the lookup tables of a layout.
+    """
+    columns = _voxel_columns(layout, overlay=False)
+    x, y, z, _, face, image_x, image_y = columns
+    voxel_index = np.full(
+        (*layout.model_shape, len(FACE_IDS), 2), UNMAPPED, dtype=np.intp
+    )
+    voxel_index[x, y, z, face] = np.stack((image_x, image_y), axis=1)
+    voxel_index.flags.writeable = False
+
+    overlay_columns = _voxel_columns(layout, overlay=True)
+    corners, overlay_corners = (
+        face_corner_array(*table[:3], table[4]) for table in (columns, overlay_columns)
+    )
+    corners.flags.writeable = False
+    overlay_corners.flags.writeable = False
+
+    return CompiledLayout(
+        layout=layout,
+        columns=columns,
+        overlay_columns=overlay_columns,
+        voxel_index=voxel_index,
+        corners=corners,
+        overlay_corners=overlay_corners,
+    )
+
+
+def _voxel_columns(layout: SkinLayout, overlay: bool) -> tuple[np.ndarray, ...]:
+    columns: list[list[np.ndarray]] = [[] for _ in range(7)]
+    for part in layout.parts:
+        if overlay and not part.has_overlay:
+            continue
+        part_origin = part.overlay_image_origin if overlay else part.image_origin
+        assert part_origin is not None
+        for face_id in FACE_IDS:
+            face = face_layout(face_id, part.shape, part.mirrored)
+            # the image coordinates of each pixel of the face, oriented so that
+            # [u, v] is the pixel at (u, v) on the face
+            image_xy = np.indices(face.image_shape).transpose(1, 2, 0)
+            oriented = (image_xy + np.add(part_origin, face.image_origin))[face.order]
+            u, v = np.indices(oriented.shape[:2]).reshape(2, -1)
+            fx, fy, fz = face_to_model(face_id, part.shape, u, v)
+            for column, values in zip(
+                columns,
+                (
+                    fx + part.model_origin[0],
+                    fy + part.model_origin[1],
+                    fz + part.model_origin[2],
+                    np.full(len(u), BODY_PART_IDS.index(part.id_)),
+                    np.full(len(u), FACE_IDS.index(face_id)),
+                    oriented[..., 0].reshape(-1),
+                    oriented[..., 1].reshape(-1),
+                ),
+            ):
+                column.append(values)
+
+    arrays = tuple(
+        (np.concatenate(column) if column else np.zeros(0)).astype(np.intp)
+        for column in columns
+    )
+    for array in arrays:
+        array.flags.writeable = False
+    return arrays
@@ -0,0 +1,904 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable
+
+import numpy as np
+from attrs import Factory, field, frozen
+from PIL import Image, ImageDraw
+
+from skinpy.render import (
+    ALPHA_MASK,
+    Polygon,
+    color_palette,
+    composite_pixels,
+    fill_labels,
+    gather_colors,
+    pack_colors,
+    rasterize_fragments,
+    rasterize_labels,
+    unpack_colors,
+)
+from skinpy.layout import CLASSIC_LAYOUT, compile_layout
+from skinpy.profile import span
+from skinpy.types import BODY_PART_IDS, FACE_IDS
+
+if TYPE_CHECKING:
+    from skinpy.layout import PartLayout, SkinLayout
+    from skinpy.render import Projection
+    from skinpy.skin import BodyPart, Skin
+    from skinpy.types import ImageColor, RenderBackend, R3, BodyPartId, FaceId
+
+# how many compiled plans to keep around. there are only 8 axis-sign
+# perspectives, so this leaves plenty of room for different scaling factors.
+PLAN_CACHE_SIZE = 64
+
+
+@frozen
+class OverlayLayers:
+    """
+    How the overlay is composited over the base layer of a render.
+
+    Every pixel is covered by a stack of polygons, back to front: a base polygon
+    (or none, for the background), then up to `depth` overlay polygons in front
+    of it. There are only a few thousand distinct stacks, however big the image,
+    so a render composites each stack once and then fills in the image from
+    them, like a label image.
+    """
+
+    # (depth + 1, stacks). row 0 holds base labels, like `RenderPlan.labels`, and
+    # the rest hold 1 + the index of an overlay polygon, or 0 for none
+    stacks: np.ndarray[tuple[int, int], np.dtype[np.int32]]
+
+    # (height, width) index of the stack of each pixel
+    labels: np.ndarray[tuple[int, int], np.dtype[np.int32]]
+
+    # for each overlay layer, the stacks that have a polygon in it and the index
+    # of that polygon. most stacks only have one, so deeper layers are short.
+    _entries: tuple[tuple[np.ndarray, np.ndarray], ...] = field(
+        init=False,
+        repr=False,
+        eq=False,
+        default=Factory(lambda self: _layer_entries(self.stacks), takes_self=True),
+    )
+
+    # (depth, stacks) overlay rows of `stacks`, with the layer in the high 32
+    # bits, so the largest key of a stack is its front polygon
+    _keys: np.ndarray[tuple[int, int], np.dtype[np.int64]] = field(
+        init=False,
+        repr=False,
+        eq=False,
+        default=Factory(lambda self: _layer_keys(self.stacks), takes_self=True),
+    )
+
+    @property
+    def depth(self) -> int:
+        return len(self.stacks) - 1
+
+    def composite(
+        self,
+        palette: np.ndarray[tuple[int, ...], np.dtype[np.uint8]],
+        overlay_colors: np.ndarray[tuple[int, ...], np.dtype[np.uint8]],
+    ) -> np.ndarray[tuple[int, ...], np.dtype[np.uint8]]:
+        """
+        Return the color of every stack, with shape (..., stacks, 4), given the
+        (..., base polygons + 1, 4) palette of base colors, whose first entry is
+        the background, and the (..., overlay polygons, 4) overlay colors.
+        """
+        return unpack_colors(
+            self.composite_pixels(pack_colors(palette), pack_colors(overlay_colors))
+        )
+
+    def composite_pixels(
+        self,
+        palette: np.ndarray[tuple[int, ...], np.dtype[np.uint32]],
+        overlay_pixels: np.ndarray[tuple[int, ...], np.dtype[np.uint32]],
+    ) -> np.ndarray[tuple[int, ...], np.dtype[np.uint32]]:
+        """
+        Like `composite`, but with 32-bit pixels (see `skinpy.render.pack_colors`)
+        in and out, which are much faster to move around than 4-byte rows.
+
+        Only translucent overlay texels need compositing arithmetic, one layer
+        after another, so they're what makes overlay renders slower.
+        """
+        colors = np.take(palette, self.stacks[0], axis=-1)
+        alpha = overlay_pixels & ALPHA_MASK
+        if not alpha.any():
+            # nothing to composite, like for skins that leave the overlay empty
+            return colors
+
+        # opaque texels replace what's under them and transparent ones leave it
+        opaque = alpha == ALPHA_MASK
+        if np.array_equal(opaque, alpha.astype(np.bool_)):
+            return self._replace(colors, overlay_pixels, opaque)
+
+        translucent = alpha.astype(np.bool_) & ~opaque
+        for rows, polygons in self._entries:
+            src = np.take(overlay_pixels, polygons, axis=-1)
+            dst = np.take(colors, rows, axis=-1)
+            if np.take(translucent, polygons, axis=-1).any():
+                colors[..., rows] = composite_pixels(dst, src)
+            else:
+                colors[..., rows] = np.where(
+                    np.take(opaque, polygons, axis=-1), src, dst
+                )
+        return colors
+
+    def _replace(
+        self,
+        colors: np.ndarray[tuple[int, ...], np.dtype[np.uint32]],
+        overlay_pixels: np.ndarray[tuple[int, ...], np.dtype[np.uint32]],
+        opaque: np.ndarray[tuple[int, ...], np.dtype[np.bool_]],
+    ) -> np.ndarray[tuple[int, ...], np.dtype[np.uint32]]:
+        # without translucent texels, each stack is the color of its front
+        # opaque overlay texel, or its base color if it has none, which takes
+        # all the layers at once instead of one after another
+        hit = _hits(opaque, self.stacks[1:])
+        front = np.where(hit, self._keys, 0).max(axis=-2) & _KEY_POLYGON
+        src = np.take_along_axis(overlay_pixels, np.maximum(front - 1, 0), axis=-1)
+        return np.where(front > 0, src, colors)
+
+
+@frozen
+class RenderPlan:
+    """
+    The compiled geometry of an isometric skin render.
+
+    Every skin of a layout has the same body parts in the same place, so for a
+    given perspective, the polygons, their draw order and the size of the output image
+    never change -- only the colors do. A plan stores that geometry as arrays so
+    that rendering a skin is just a matter of gathering the colors of its texels
+    and rasterizing.
+
+    Plans should be obtained with `get_render_plan`, which caches them.
+    """
+
+    perspective: Projection
+
+    # the layout of the skins that the plan renders
+    layout: SkinLayout
+
+    # the image coordinates of the texel that colors each polygon, in draw order
+    image_x: np.ndarray[tuple[int], np.dtype[np.intp]]
+    image_y: np.ndarray[tuple[int], np.dtype[np.intp]]
+
+    # the body part and face of each polygon, as indices into BODY_PART_IDS and
+    # FACE_IDS
+    body_part_index: np.ndarray[tuple[int], np.dtype[np.intp]]
+    face_index: np.ndarray[tuple[int], np.dtype[np.intp]]
+
+    # the polygon points in output image coordinates, in draw order, with shape
+    # (polygons, 4, 2)
+    points: np.ndarray[tuple[int, int, int], np.dtype[np.int_]]
+
+    # (width, height) of the output image
+    size: tuple[int, int]
+
+    # the output image coordinates of the model origin, (0, 0, 0)
+    origin: tuple[int, int]
+
+    # the label image of the polygons (see `skinpy.render.rasterize_labels`)
+    labels: np.ndarray[tuple[int, int], np.dtype[np.int32]]
+
+    # like labels, but where the polygon nearest the viewer wins each pixel
+    # instead of the one drawn last
+    depth_labels: np.ndarray[tuple[int, int], np.dtype[np.int32]]
+
+    # the overlay (second layer) polygons, like the fields above. these are empty
+    # unless the plan was compiled with overlay.
+    overlay_image_x: np.ndarray[tuple[int], np.dtype[np.intp]]
+    overlay_image_y: np.ndarray[tuple[int], np.dtype[np.intp]]
+    overlay_points: np.ndarray[tuple[int, int, int], np.dtype[np.int_]]
+
+    # the overlay polygons to composite over each pixel, without and with depth
+    # testing, or None without overlay
+    overlay_layers: OverlayLayers | None
+    overlay_depth_layers: OverlayLayers | None
+
+    @classmethod
+    def compile(
+        cls,
+        perspective: Projection,
+        overlay: bool = False,
+        layout: SkinLayout = CLASSIC_LAYOUT,
+    ) -> RenderPlan:
+        """
+        Build the plan for a perspective. Prefer `get_render_plan`, which caches
+        the result.
+
+        Polygons that never reach the output image are culled: faces that are
+        covered by other body parts (like the tops of the legs, under the torso)
+        and faces that are always painted over. The visible faces of the
+        perspective are the only candidates to begin with.
+
+        With `overlay`, the plan also covers the overlay (second layer) of every
+        body part, as a shell around it.
+
+        Everything about the skins comes from the compiled tables of `layout`.
+        """
+        points, corners, image_x, image_y, body_part_index, face_index = (
+            _trace_polygons(perspective, layout)
+        )
+        if overlay:
+            (
+                overlay_points,
+                overlay_corners,
+                overlay_image_x,
+                overlay_image_y,
+                overlay_body_part_index,
+                overlay_face_index,
+            ) = _trace_overlay_polygons(perspective, layout)
+            all_points = np.concatenate((points, overlay_points))
+        else:
+            overlay_points = np.zeros((0, 4, 2), dtype=np.int_)
+            overlay_image_x = overlay_image_y = np.zeros(0, dtype=np.intp)
+            all_points = points
+
+        min_xy = all_points.min(axis=(0, 1))
+        max_xy = all_points.max(axis=(0, 1))
+        size = tuple((max_xy - min_xy).tolist())
+        points -= min_xy
+        overlay_points -= min_xy
+
+        labels = rasterize_labels(points, size)
+        depth_labels = _depth_labels(
+            perspective,
+            points,
+            corners,
+            image_x,
+            image_y,
+            min_xy,
+            size,
+        )
+
+        # keep only the polygons that win a pixel, with or without depth testing.
+        # dropping the others doesn't change any pixel: painting is last writer
+        # wins, and these are never the last writer anywhere.
+        keep = _shown(len(points), (labels, depth_labels))
+        relabel = _relabeling(keep)
+
+        overlay_layers = overlay_depth_layers = None
+        if overlay:
+            overlay_layers, overlay_depth_layers = _overlay_layers(
+                perspective,
+                points,
+                corners,
+                image_x,
+                image_y,
+                body_part_index,
+                overlay_points,
+                overlay_corners,
+                overlay_image_x,
+                overlay_image_y,
+                overlay_body_part_index,
+                overlay_face_index,
+                labels,
+                depth_labels,
+                min_xy,
+                size,
+            )
+            # overlay polygons only matter where they're in front of the base
+            overlay_keep = _shown(
+                len(overlay_points),
+                (overlay_layers[1:], overlay_depth_layers[1:]),
+            )
+            overlay_relabel = _relabeling(overlay_keep)
+            overlay_layers, overlay_depth_layers = (
+                _stack_layers(
+                    np.concatenate(
+                        (relabel[layers[:1]], overlay_relabel[layers[1:]])
+                    ),
+                    labels.shape,
+                )
+                for layers in (overlay_layers, overlay_depth_layers)
+            )
+            overlay_points = overlay_points[overlay_keep]
+            overlay_image_x = overlay_image_x[overlay_keep]
+            overlay_image_y = overlay_image_y[overlay_keep]
+
+        return cls(
+            perspective=perspective,
+            layout=layout,
+            image_x=image_x[keep],
+            image_y=image_y[keep],
+            body_part_index=body_part_index[keep],
+            face_index=face_index[keep],
+            points=points[keep],
+            size=size,  # type: ignore
+            origin=tuple((-min_xy).tolist()),  # type: ignore
+            labels=_read_only(relabel[labels]),
+            depth_labels=_read_only(relabel[depth_labels]),
+            overlay_image_x=overlay_image_x,
+            overlay_image_y=overlay_image_y,
+            overlay_points=overlay_points,
+            overlay_layers=overlay_layers,
+            overlay_depth_layers=overlay_depth_layers,
+        )
+
+    @property
+    def overlay(self) -> bool:
+        return self.overlay_layers is not None
+
+    @property
+    def polygon_count(self) -> int:
+        return len(self.points)
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        """
+        The (height, width, 4) shape of rendered arrays.
+        """
+        width, height = self.size
+        return (height, width, 4)
+
+    def reachable_faces(self) -> set[tuple[BodyPartId, FaceId]]:
+        """
+        Return the (body part, face) pairs that can show up in renders from this
+        perspective.
+        """
+        return {
+            (BODY_PART_IDS[part], FACE_IDS[face])
+            for part, face in zip(
+                self.body_part_index.tolist(), self.face_index.tolist()
+            )
+        }
+
+    def colors(
+        self, image_color: ImageColor
+    ) -> np.ndarray[tuple[int, int], np.dtype[np.uint8]]:
+        """
+        Return the color of each polygon, in draw order, with shape (polygons, 4).
+
+        `image_color` can have leading batch dimensions, (..., width, height, 4),
+        in which case the result has shape (..., polygons, 4).
+        """
+        return image_color[..., self.image_x, self.image_y, :]
+
+    def render_array(
+        self,
+        image_color: ImageColor,
+        background_color: tuple[int, int, int, int] | None = None,
+        depth_test: bool = False,
+        out: np.ndarray[tuple[int, ...], np.dtype[np.uint8]] | None = None,
+    ) -> np.ndarray[tuple[int, ...], np.dtype[np.uint8]]:
+        """
+        Render with the numpy backend straight to a (height, width, 4) array.
+
+        `image_color` can have leading batch dimensions, (..., width, height, 4),
+        to render many skins at once. The result then has shape
+        (..., height, width, 4).
+
+        With `out`, a uint8 array of the result's shape, like a slice of a
+        preallocated batch, the render is written into it instead, and it's
+        returned.
+        """
+        labels = self.depth_labels if depth_test else self.labels
+        layers = self.overlay_depth_layers if depth_test else self.overlay_layers
+        with span("polygons"):
+            colors = self.colors(image_color)
+        if layers is None:
+            with span("rasterize"):
+                return fill_labels(labels, colors, background_color, out=out)
+
+        with span("polygons"):
+            palette = pack_colors(color_palette(colors, background_color))
+            overlay_pixels = pack_colors(image_color)[
+                ..., self.overlay_image_x, self.overlay_image_y
+            ]
+        with span("rasterize"):
+            stack_colors = layers.composite_pixels(palette, overlay_pixels)
+            return gather_colors(unpack_colors(stack_colors), layers.labels, out=out)
+
+    def polygons(
+        self, image_color: ImageColor, cull_transparent: bool = False
+    ) -> list[Polygon]:
+        """
+        Return the polygons of the render, in draw order and in output image
+        coordinates.
+
+        With `cull_transparent`, polygons of fully transparent texels (alpha 0)
+        are left out, so whatever is behind them shows through. The plan culled
+        the polygons hidden behind opaque skins, so these come from every
+        polygon facing the viewer instead.
+        """
+        if cull_transparent:
+            points, image_x, image_y = _traced_polygons(self.perspective, self.layout)
+            points = points + np.array(self.origin)
+            colors = image_color[..., image_x, image_y, :]
+            opaque = colors[:, 3] > 0
+            colors = colors[opaque]
+            points = points[opaque]
+        else:
+            colors = self.colors(image_color)
+            points = self.points
+
+        return [
+            Polygon(
+                tuple(tuple(point) for point in poly_points),  # type: ignore
+                tuple(color),  # type: ignore
+            )
+            for poly_points, color in zip(points.tolist(), colors.tolist())
+        ]
+
+    def render(
+        self,
+        image_color: ImageColor,
+        background_color: tuple[int, int, int, int] | None = None,
+        backend: RenderBackend = "imagedraw",
+        depth_test: bool = False,
+    ) -> Image.Image:
+        """
+        Render a skin's image colors with this plan. See
+        `skinpy.render.render_isometric` for the backends.
+
+        By default, polygons are painted furthest body part first. With
+        `depth_test`, the surface nearest the viewer wins each pixel instead,
+        regardless of draw order. Depth testing needs the "numpy" backend.
+        """
+        if depth_test and backend != "numpy":
+            raise ValueError("Depth testing requires the numpy backend")
+
+        # compositing the overlay needs label images, which the numpy backend
+        # fills identically to ImageDraw
+        if backend == "numpy" or self.overlay:
+            return Image.fromarray(
+                self.render_array(image_color, background_color, depth_test)
+            )
+
+        with span("polygons"):
+            # flat [x0, y0, x1, y1, ...] lists are the cheapest form for Pillow
+            flat_points = self.points.reshape(len(self.points), -1).tolist()
+            colors = self.colors(image_color).tolist()
+
+        with span("rasterize"):
+            img = Image.new(
+                "RGBA",
+                self.size,
+                color=background_color,  # type: ignore
+            )
+            draw = ImageDraw.Draw(img)
+            for xy, color in zip(flat_points, colors):
+                draw.polygon(xy, fill=tuple(color))
+
+        return img
+
+
+def _trace_polygons(
+    perspective: Projection, layout: SkinLayout = CLASSIC_LAYOUT
+) -> tuple[np.ndarray, ...]:
+    """
+    Walk every texel of a skin that faces the viewer, in painter's order.
+
+    Returns arrays of the polygon points (relative to the model origin), model
+    corners, image x, image y, body part index and face index of each.
+    """
+    compiled = compile_layout(layout)
+    _, _, _, body_part_index, face_index, image_x, image_y = compiled.columns
+    visible = np.isin(
+        face_index,
+        [FACE_IDS.index(face_id) for face_id in perspective.visible_faces],
+    )
+
+    rows: list[np.ndarray] = []
+    origins: list[R3] = []
+    for part in layout_painter_order(layout, perspective):
+        part_rows = np.flatnonzero(
+            visible & (body_part_index == BODY_PART_IDS.index(part.id_))
+        )
+        rows.append(part_rows)
+        origins.append(part.model_origin)
+
+    row_order = np.concatenate(rows)
+    corners = compiled.corners[row_order]
+    origin = np.repeat(np.array(origins), [len(part_rows) for part_rows in rows], 0)
+    # polygons are made relative to the body part, then offset, because that's
+    # how the rounding has always been done
+    points = perspective.project(
+        corners - origin[:, np.newaxis]
+    ).round() + perspective.project(origin).round()[:, np.newaxis]
+    return (
+        points.astype(np.int_).reshape(-1, 4, 2),
+        corners.astype(np.float64),
+        image_x[row_order],
+        image_y[row_order],
+        body_part_index[row_order],
+        face_index[row_order],
+    )
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _traced_polygons(
+    perspective: Projection, layout: SkinLayout
+) -> tuple[np.ndarray, ...]:
+    """
+    Return the points, image x and image y of `_trace_polygons`, before any
+    culling.
+    """
+    points, _, image_x, image_y, _, _ = _trace_polygons(perspective, layout)
+    return _read_only(points), _read_only(image_x), _read_only(image_y)
+
+
+def _trace_overlay_polygons(
+    perspective: Projection, layout: SkinLayout = CLASSIC_LAYOUT
+) -> tuple[np.ndarray, ...]:
+    """
+    Like `_trace_polygons`, but for the overlay of every body part that has one.
+    Each texel of the overlay covers a texel of its body part, on a shell that is
+    inflated around the body part.
+
+    Returns arrays of the polygon points, model corners, image x, image y, body
+    part index and face index of each.
+    """
+    compiled = compile_layout(layout)
+    _, _, _, body_part_index, face_index, image_x, image_y = (
+        compiled.overlay_columns
+    )
+    visible = np.isin(
+        face_index,
+        [FACE_IDS.index(face_id) for face_id in perspective.visible_faces],
+    )
+
+    corners: list[np.ndarray] = [np.zeros((0, 4, 3))]
+    rows: list[np.ndarray] = [np.zeros(0, dtype=np.intp)]
+    for part in layout_painter_order(layout, perspective):
+        if not part.has_overlay:
+            continue
+        part_rows = np.flatnonzero(
+            visible & (body_part_index == BODY_PART_IDS.index(part.id_))
+        )
+        origin = np.array(part.model_origin)
+        shape = np.array(part.shape)
+        inflation = part.overlay_inflation
+
+        part_corners = compiled.overlay_corners[part_rows]
+        # stretch the body part's box out by the inflation on every side
+        scale = (shape + 2 * inflation) / shape
+        corners.append(origin - inflation + (part_corners - origin) * scale)
+        rows.append(part_rows)
+
+    row_order = np.concatenate(rows)
+    all_corners = np.concatenate(corners)
+    return (
+        perspective.project(all_corners).round().astype(np.int_).reshape(-1, 4, 2),
+        all_corners,
+        image_x[row_order],
+        image_y[row_order],
+        body_part_index[row_order],
+        face_index[row_order],
+    )
+
+
+def _overlay_layers(
+    perspective: Projection,
+    points: np.ndarray,
+    corners: np.ndarray,
+    image_x: np.ndarray,
+    image_y: np.ndarray,
+    body_part_index: np.ndarray,
+    overlay_points: np.ndarray,
+    overlay_corners: np.ndarray,
+    overlay_image_x: np.ndarray,
+    overlay_image_y: np.ndarray,
+    overlay_body_part_index: np.ndarray,
+    overlay_face_index: np.ndarray,
+    labels: np.ndarray,
+    depth_labels: np.ndarray,
+    min_xy: np.ndarray,
+    size: tuple[int, int],
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Work out which overlay polygons are in front of the base layer at each
+    pixel, in painter's order and in depth order.
+
+    Returns a (depth + 1, pixels) array for each: the base labels of every
+    pixel, then its overlay labels as returned by `_chain_layers`.
+
+    In painter's order, each body part's overlay is drawn right after the body
+    part itself, so nearer body parts hide the overlays of further ones.
+
+    Neighboring texels of the same overlay face overlap along their shared
+    edges. Those are one surface, so only the last of them is composited, like
+    in the base layer.
+    """
+    width, _ = size
+    base_count = len(points)
+    pixels, polygons = rasterize_fragments(
+        np.concatenate((points, overlay_points)), size
+    )
+    is_overlay = polygons >= base_count
+
+    # painter's order: by body part (they're traced in painter's order, so the
+    # first polygon of each has the lowest index), then base before overlay, then
+    # drawing order
+    all_parts = np.concatenate((body_part_index, overlay_body_part_index))
+    part_rank = np.zeros(len(BODY_PART_IDS), dtype=np.intp)
+    first_polygons = np.unique(body_part_index, return_index=True)
+    part_rank[first_polygons[0]] = np.argsort(np.argsort(first_polygons[1]))
+    painter = np.lexsort((polygons, is_overlay, part_rank[all_parts[polygons]], pixels))
+
+    # depth order: furthest first, with ties broken by texel like _depth_labels
+    all_corners = np.concatenate((corners, overlay_corners))
+    all_image_x = np.concatenate((image_x, overlay_image_x))
+    all_image_y = np.concatenate((image_y, overlay_image_y))
+    fragment_depth = _fragment_depth(
+        perspective, all_corners, pixels, polygons, min_xy, width
+    )
+    depth = np.lexsort(
+        (
+            -all_image_y[polygons],
+            -all_image_x[polygons],
+            -fragment_depth,
+            pixels,
+        )
+    )
+
+    # one surface per face of each body part's overlay, and one per base polygon
+    surfaces = np.concatenate(
+        (
+            -1 - np.arange(base_count),
+            overlay_body_part_index * len(FACE_IDS) + overlay_face_index,
+        )
+    )
+    return tuple(  # type: ignore
+        np.concatenate(
+            (
+                base_labels.reshape(1, -1),
+                _chain_layers(
+                    pixels[order], polygons[order], surfaces, base_count, size
+                ),
+            )
+        )
+        for order, base_labels in ((painter, labels), (depth, depth_labels))
+    )
+
+
+def _chain_layers(
+    pixels: np.ndarray[tuple[int], np.dtype[np.intp]],
+    polygons: np.ndarray[tuple[int], np.dtype[np.intp]],
+    surfaces: np.ndarray[tuple[int], np.dtype[np.intp]],
+    base_count: int,
+    size: tuple[int, int],
+) -> np.ndarray[tuple[int, int], np.dtype[np.int32]]:
+    """
+    Work out the overlay polygons to composite over each pixel, from fragments
+    sorted by pixel, then back to front. Polygons from `base_count` on are
+    overlay polygons.
+
+    At each pixel, the overlay fragments after the last base fragment are the
+    ones that get composited, in order, except that of a run of fragments from
+    the same surface only the last counts.
+
+    Returns a (depth, pixels) array where row k holds 1 + the index of the k-th
+    overlay polygon over each pixel, or 0 if there are fewer.
+    """
+    new_pixel = np.ones(len(pixels), dtype=np.bool_)
+    new_pixel[1:] = pixels[1:] != pixels[:-1]
+
+    # drop fragments that are painted over by the next one on the same surface
+    fragment_surfaces = surfaces[polygons]
+    last_of_run = np.ones(len(pixels), dtype=np.bool_)
+    last_of_run[:-1] = new_pixel[1:] | (fragment_surfaces[1:] != fragment_surfaces[:-1])
+    pixels = pixels[last_of_run]
+    polygons = polygons[last_of_run]
+    new_pixel = np.ones(len(pixels), dtype=np.bool_)
+    new_pixel[1:] = pixels[1:] != pixels[:-1]
+
+    starts = np.flatnonzero(new_pixel)
+    group = np.cumsum(new_pixel) - 1
+
+    # the position of the last base fragment of each pixel, or just before the
+    # pixel's first fragment if it has none
+    positions = np.arange(len(pixels))
+    base_positions = np.where(polygons < base_count, positions, -1)
+    floor = np.maximum(np.maximum.reduceat(base_positions, starts), starts - 1)
+
+    in_chain = positions > floor[group]
+    rank = (positions - floor[group] - 1)[in_chain]
+
+    width, height = size
+    depth = int(rank.max()) + 1 if len(rank) else 0
+    layers = np.zeros((depth, width * height), dtype=np.int32)
+    layers[rank, pixels[in_chain]] = polygons[in_chain] - base_count + 1
+    return layers
+
+
+def _stack_layers(
+    layers: np.ndarray[tuple[int, int], np.dtype[np.int32]], shape: tuple[int, int]
+) -> OverlayLayers:
+    """
+    Build the overlay layers of a render from (depth + 1, pixels) arrays of the
+    base label and overlay labels of every pixel.
+    """
+    # like np.unique(layers, axis=1), which sorts whole columns as bytes and is
+    # far slower: fold the rows into one key at a time, numbering the distinct
+    # prefixes as it goes, in the same order
+    inverse = np.zeros(layers.shape[1], dtype=np.int64)
+    for row in layers:
+        keys = inverse * (int(row.max()) + 1) + row
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    stacks = layers[:, first]
+    return OverlayLayers(
+        stacks=_read_only(stacks.astype(np.int32)),
+        labels=_read_only(inverse.astype(np.int32).reshape(shape)),
+    )
+
+
+def _layer_entries(
+    stacks: np.ndarray[tuple[int, int], np.dtype[np.int32]],
+) -> tuple[tuple[np.ndarray, np.ndarray], ...]:
+    """
+    Return the `OverlayLayers._entries` of (depth + 1, stacks) stacks.
+    """
+    entries = []
+    for labels in stacks[1:]:
+        rows = np.flatnonzero(labels)
+        entries.append((_read_only(rows), _read_only(labels[rows] - 1)))
+    return tuple(entries)
+
+
+# the bits of an `OverlayLayers._keys` key that hold its overlay row
+_KEY_POLYGON = (1 << 32) - 1
+
+
+def _hits(
+    texels: np.ndarray[tuple[int, ...], np.dtype[np.bool_]],
+    layers: np.ndarray[tuple[int, int], np.dtype[np.int32]],
+) -> np.ndarray[tuple[int, ...], np.dtype[np.bool_]]:
+    """
+    Return whether the overlay polygon of each entry of (depth, stacks) overlay
+    layers has one of the (..., overlay polygons) `texels`.
+    """
+    no_polygon = np.zeros_like(texels[..., :1])
+    return np.take(np.concatenate((no_polygon, texels), axis=-1), layers, axis=-1)
+
+
+def _layer_keys(
+    stacks: np.ndarray[tuple[int, int], np.dtype[np.int32]],
+) -> np.ndarray[tuple[int, int], np.dtype[np.int64]]:
+    """
+    Return the `OverlayLayers._keys` of (depth + 1, stacks) stacks.
+    """
+    layers = np.arange(len(stacks) - 1, dtype=np.int64)[:, np.newaxis]
+    return _read_only((layers << 32) | stacks[1:])
+
+
+def _depth_labels(
+    perspective: Projection,
+    points: np.ndarray[tuple[int, int, int], np.dtype[np.int_]],
+    corners: np.ndarray[tuple[int, int, int], np.dtype[np.float64]],
+    image_x: np.ndarray[tuple[int], np.dtype[np.intp]],
+    image_y: np.ndarray[tuple[int], np.dtype[np.intp]],
+    min_xy: np.ndarray[tuple[int], np.dtype[np.int_]],
+    size: tuple[int, int],
+) -> np.ndarray[tuple[int, int], np.dtype[np.int32]]:
+    """
+    Build a label image where each pixel belongs to the polygon nearest the
+    viewer at that pixel, i.e. a z-buffer.
+    """
+    width, height = size
+    pixels, polygons = rasterize_fragments(points, size)
+    fragment_depth = _fragment_depth(
+        perspective, corners, pixels, polygons, min_xy, width
+    )
+
+    # nearest fragment first for each pixel. ties (like the shared edge of two
+    # neighboring texels) are broken by texel, so draw order never matters.
+    order = np.lexsort(
+        (image_y[polygons], image_x[polygons], fragment_depth, pixels)
+    )
+    pixels = pixels[order]
+    polygons = polygons[order]
+    nearest = np.ones(len(pixels), dtype=np.bool_)
+    nearest[1:] = pixels[1:] != pixels[:-1]
+
+    labels = np.zeros(width * height, dtype=np.int32)
+    labels[pixels[nearest]] = polygons[nearest] + 1
+    return labels.reshape(height, width)
+
+
+def _fragment_depth(
+    perspective: Projection,
+    corners: np.ndarray[tuple[int, int, int], np.dtype[np.float64]],
+    pixels: np.ndarray[tuple[int], np.dtype[np.intp]],
+    polygons: np.ndarray[tuple[int], np.dtype[np.intp]],
+    min_xy: np.ndarray[tuple[int], np.dtype[np.int_]],
+    width: int,
+) -> np.ndarray[tuple[int], np.dtype[np.float64]]:
+    """
+    Return the depth of each fragment from `rasterize_fragments`.
+
+    Each polygon is a flat face, so its depth is a plane over the output image.
+    We fit that plane from its model corners and evaluate it at every pixel the
+    polygon covers.
+    """
+    # solve depth = a * x + b * y + c for each polygon from 3 of its corners
+    screen = perspective.project(corners[:, (0, 1, 3)]) - min_xy
+    plane_inputs = np.concatenate((screen, np.ones((len(screen), 3, 1))), axis=2)
+    planes = np.linalg.solve(
+        plane_inputs, perspective.depth(corners[:, (0, 1, 3)])[..., np.newaxis]
+    )[..., 0]
+
+    # rounded so that neighboring texels of the same face tie exactly, instead of
+    # by floating point noise
+    return np.round(
+        planes[polygons, 0] * (pixels % width)
+        + planes[polygons, 1] * (pixels // width)
+        + planes[polygons, 2],
+        6,
+    )
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    # plans are shared through the cache, so their arrays must not be modified
+    array.flags.writeable = False
+    return array
+
+
+def _shown(count: int, label_arrays: Iterable[np.ndarray]) -> np.ndarray:
+    """
+    Return which of `count` polygons appear in any of the label arrays.
+    """
+    shown = np.zeros(count + 1, dtype=np.bool_)
+    for labels in label_arrays:
+        shown[labels] = True
+    return shown[1:]
+
+
+def _relabeling(keep: np.ndarray) -> np.ndarray:
+    """
+    Return a mapping from old labels to new labels once only the polygons in
+    `keep` are kept. 0 (no polygon) maps to itself.
+    """
+    relabel = np.zeros(len(keep) + 1, dtype=np.int32)
+    relabel[1:][keep] = np.arange(1, np.count_nonzero(keep) + 1)
+    return relabel
+
+
+def painter_order(skin: Skin, perspective: Projection) -> list[BodyPart]:
+    """
+    Return the body parts of the skin sorted by distance to the corner of the
+    model nearest the viewer, furthest first.
+
+    This is the painter's algorithm: draw the furthest away first, then one
+    closer, and so on, until the closest is drawn last.
+    """
+    return [
+        skin.get_body_part_for_id(part.id_)
+        for part in layout_painter_order(skin.layout, perspective)
+    ]
+
+
+def layout_painter_order(
+    layout: SkinLayout, perspective: Projection
+) -> list[PartLayout]:
+    """
+    Like `painter_order`, but for the body parts of a layout.
+    """
+    origin = perspective.nearest_corner(layout.model_shape)
+
+    def dist_to_origin(part: PartLayout) -> float:
+        return float(np.linalg.norm(np.array(part.model_origin) - np.array(origin)))
+
+    return sorted(layout.parts, key=dist_to_origin, reverse=True)
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _cached_render_plan(
+    perspective: Projection, overlay: bool, layout: SkinLayout
+) -> RenderPlan:
+    with span("plan"):
+        return RenderPlan.compile(perspective, overlay, layout)
+
+
+def get_render_plan(
+    perspective: Projection,
+    overlay: bool = False,
+    layout: SkinLayout = CLASSIC_LAYOUT,
+) -> RenderPlan:
+    """
+    Return the render plan for a perspective and skin layout, with or without
+    the overlay, compiling it on first use. Plans are kept in a bounded LRU
+    cache.
+    """
+    # positionally, so that every spelling of the same arguments is cached once
+    return _cached_render_plan(perspective, overlay, layout)
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from attrs import define, field
+
+logger = logging.getLogger(__name__)
+
+# a sink is called with the stage and duration, in seconds, of every span
+Sink = Callable[[str, float], None]
+
+# request duration buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# stages of a render can take well under a millisecond
+STAGE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005) + LATENCY_BUCKETS
+
+# the installed sinks. a tuple, so that spans can loop over it while sinks are
+# added or removed on other threads
+_sinks: tuple[Sink, ...] = ()
+_sinks_lock = threading.Lock()
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self) -> _Span:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        seconds = time.perf_counter() - self.start
+        for sink in _sinks:
+            sink(self.stage, seconds)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> _NullSpan:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage: str) -> _Span | _NullSpan:
+    """
+    Time a stage of work, like decoding or rasterizing, for the installed sinks:
+
+        with span("decode"):
+            ...
+
+    Without sinks, the span is a shared object that does nothing, so spans cost
+    next to nothing unless something is profiling.
+    """
+    if not _sinks:
+        return _NULL_SPAN
+    return _Span(stage)
+
+
+def add_sink(sink: Sink) -> None:
+    """
+    Send the stage and duration of every span to `sink`, from any thread.
+    """
+    global _sinks
+    with _sinks_lock:
+        _sinks = (*_sinks, sink)
+
+
+def remove_sink(sink: Sink) -> None:
+    global _sinks
+    with _sinks_lock:
+        sinks = list(_sinks)
+        sinks.remove(sink)
+        _sinks = tuple(sinks)
+
+
+@contextmanager
+def profiling(*sinks: Sink) -> Iterator[None]:
+    """
+    Add sinks for the duration of a with block.
+    """
+    for sink in sinks:
+        add_sink(sink)
+    try:
+        yield
+    finally:
+        for sink in sinks:
+            remove_sink(sink)
+
+
+@define
+class Histogram:
+    """
+    A Prometheus-style histogram of durations.
+    """
+
+    buckets: tuple[float, ...] = LATENCY_BUCKETS
+    counts: list[int] = field()
+    total: float = 0.0
+    count: int = 0
+
+    @counts.default
+    def _counts_default(self) -> list[int]:
+        return [0] * len(self.buckets)
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> list[str]:
+        prefix = f"{labels}," if labels else ""
+        lines = [
+            f'{name}_bucket{{{prefix}le="{bound}"}} {count}'
+            for bound, count in zip(self.buckets, self.counts)
+        ]
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.total}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+@define
+class StageStats:
+    """
+    A sink that counts the spans of each stage, and keeps a histogram of their
+    durations.
+    """
+
+    stages: dict[str, Histogram] = field(factory=dict)
+    _lock: threading.Lock = field(factory=threading.Lock, repr=False, eq=False)
+
+    def __call__(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram(buckets=STAGE_BUCKETS)
+            histogram.observe(seconds)
+
+    def report(self, total: Optional[float] = None) -> str:
+        """
+        Return a table of the calls and time of each stage, in the order they
+        first ran. With the `total` seconds of the work that was profiled, the
+        share of it that each stage took, and the time outside of any stage, are
+        included too.
+        """
+        lines = [f"{'stage':<12} {'calls':>6} {'total':>12} {'mean':>12} {'share':>6}"]
+
+        def line(stage: str, calls: str, seconds: float, mean: str) -> str:
+            share = f"{seconds / total:6.1%}" if total else ""
+            milliseconds = f"{seconds * 1000:.3f} ms"
+            return f"{stage:<12} {calls:>6} {milliseconds:>12} {mean:>12} {share:>6}"
+
+        for stage, histogram in self.stages.items():
+            mean = f"{histogram.total / histogram.count * 1000:.3f} ms"
+            lines.append(line(stage, str(histogram.count), histogram.total, mean))
+        if total is not None:
+            staged = sum(histogram.total for histogram in self.stages.values())
+            lines.append(line("(other)", "", max(total - staged, 0.0), ""))
+            lines.append(line("total", "", total, ""))
+        return "\n".join(lines)
+
+
+@define
+class LoggingSink:
+    """
+    A sink that logs every span.
+    """
+
+    logger: logging.Logger = logger
+    level: int = logging.DEBUG
+
+    def __call__(self, stage: str, seconds: float) -> None:
+        self.logger.log(self.level, "%s took %.3f ms", stage, seconds * 1000)
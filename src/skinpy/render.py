@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import sys
+from functools import lru_cache
 from typing import TYPE_CHECKING, Iterable, Sequence
 
 from PIL import ImageDraw, Image
 import numpy as np
 from attrs import frozen
 
+from skinpy.profile import span
+from skinpy.types import FACE_IDS
 
 if TYPE_CHECKING:
     from skinpy.types import (
@@ -17,8 +21,15 @@ if TYPE_CHECKING:
         R3,
         PolygonPoints,
         ImageColor,
+        RenderBackend,
     )
 
+# how many label images rasterized by render_isometric to keep around
+LABEL_CACHE_SIZE = 32
+
+# roughly the size in pixels of the tiles that rasterize_fragments draws in
+FRAGMENT_TILE_SIZE = 512
+
 
 @frozen
 class Polygon:
@@ -62,9 +73,196 @@ class Polygon:
 
 COS_30 = np.cos(np.pi / 6)
 
+# the pitch of the isometric projection of `Perspective`: the elevation of a line
+# of sight along the diagonal of a cube, atan(1 / sqrt(2)), about 35.26 degrees
+ISOMETRIC_PITCH = float(np.degrees(np.arctan(1 / np.sqrt(2))))
+
+# faces at less than this (the cosine of the angle between their normal and the
+# line of sight) are edge-on, and never drawn
+EDGE_ON = 1e-9
+
+
+def face_corners(x: int, y: int, z: int, face_id: FaceId) -> tuple[R3, R3, R3, R3]:
+    """
+    Return the model coordinates of the 4 corners of the given face of the
+    voxel at (x, y, z), going around the face.
+    """
+    if face_id in ("front", "back"):
+        if face_id == "front":
+            y_offset = y
+        else:
+            y_offset = y + 1
+        return (
+            (x, y_offset, z),
+            (x + 1, y_offset, z),
+            (x + 1, y_offset, z + 1),
+            (x, y_offset, z + 1),
+        )
+    elif face_id in ("left", "right"):
+        if face_id == "left":
+            x_offset = x
+        else:
+            x_offset = x + 1
+        return (
+            (x_offset, y, z),
+            (x_offset, y + 1, z),
+            (x_offset, y + 1, z + 1),
+            (x_offset, y, z + 1),
+        )
+    else:
+        if face_id == "down":
+            z_offset = z
+        else:  # up
+            z_offset = z + 1
+        return (
+            (x, y, z_offset),
+            (x + 1, y, z_offset),
+            (x + 1, y + 1, z_offset),
+            (x, y + 1, z_offset),
+        )
+
+
+# (6, 4, 3) corners of each face of the voxel at the origin, in FACE_IDS order
+FACE_CORNER_OFFSETS = np.array(
+    [face_corners(0, 0, 0, face_id) for face_id in FACE_IDS], dtype=np.int_
+)
+
+# (6, 3) outward normal of each face, in FACE_IDS order
+FACE_NORMALS = np.array(
+    ((0, 0, 1), (0, 0, -1), (-1, 0, 0), (1, 0, 0), (0, -1, 0), (0, 1, 0)),
+    dtype=np.float64,
+)
+
+
+def face_corner_array(
+    x: np.ndarray, y: np.ndarray, z: np.ndarray, face_index: np.ndarray
+) -> np.ndarray[tuple[int, int, int], np.dtype[np.int_]]:
+    """
+    Like `face_corners`, but for arrays of voxel faces at once, with faces as
+    indices into FACE_IDS. Returns an array of shape (faces, 4, 3).
+    """
+    voxels = np.stack((x, y, z), axis=-1).astype(np.int_)
+    return voxels[:, np.newaxis, :] + FACE_CORNER_OFFSETS[face_index]
+
+
+class Projection:
+    """
+    An orthographic projection of the model onto a render, described by a
+    matrix (see `matrix`). `Perspective` and `Camera` are projections, and
+    anything that renders takes either.
+    """
+
+    scaling_factor: int
+
+    @property
+    def matrix(self) -> np.ndarray[tuple[int, int], np.dtype[np.float64]]:
+        """
+        The (3, 3) matrix that takes model points to (image x, image y, depth).
+        Image y goes down, and bigger depths are further from the viewer.
+        """
+        raise NotImplementedError
+
+    def project(
+        self, points: np.ndarray[tuple[int, ...], np.dtype[np.float64]]
+    ) -> np.ndarray[tuple[int, ...], np.dtype[np.float64]]:
+        """
+        Project an array of (..., 3) model points to (..., 2) image points,
+        without rounding.
+        """
+        return np.asarray(points, dtype=np.float64) @ self.matrix[:2].T
+
+    def depth(
+        self, points: np.ndarray[tuple[int, ...], np.dtype[np.float64]]
+    ) -> np.ndarray[tuple[int, ...], np.dtype[np.float64]]:
+        """
+        Return the distance of an array of (..., 3) model points from the viewer,
+        up to a constant. Bigger numbers are further away.
+
+        The projection is orthographic, so points along the same line of sight
+        only differ in depth.
+        """
+        return np.asarray(points, dtype=np.float64) @ self.matrix[2]
+
+    def map_iso(self, x: int, y: int, z: int) -> tuple[int, int]:
+        """
+        Project a model point to the nearest image point.
+        """
+        iso_x, iso_y = self.project(np.array((x, y, z))).round().astype(int).tolist()
+        return (iso_x, iso_y)
+
+    def make_polygon(
+        self,
+        x: int,
+        y: int,
+        z: int,
+        face_id: FaceId,
+        color: RGBA,
+    ) -> Polygon:
+        c0, c1, c2, c3 = face_corners(x, y, z, face_id)
+        points = (
+            self.map_iso(*c0),
+            self.map_iso(*c1),
+            self.map_iso(*c2),
+            self.map_iso(*c3),
+        )
+
+        return Polygon(
+            points,
+            color,
+        )
+
+    @property
+    def visible_faces(self) -> tuple[FaceId, ...]:
+        """
+        The faces that face the viewer, from their normals. Faces seen edge-on
+        aren't visible.
+        """
+        depth = self.matrix[2]
+        facing = FACE_NORMALS @ (depth / np.linalg.norm(depth)) < -EDGE_ON
+        return tuple(face_id for face_id, visible in zip(FACE_IDS, facing) if visible)
+
+    def nearest_corner(self, model_shape: R3) -> tuple[float, float, float]:
+        """
+        Return the corner of a model of `model_shape` voxels nearest the viewer,
+        as voxel coordinates. Along axes that are square to the line of sight,
+        the corner is halfway along.
+        """
+        depth = self.matrix[2]
+        depth = depth / np.linalg.norm(depth)
+        return tuple(  # type: ignore
+            0 if slope > EDGE_ON else size - 1 if slope < -EDGE_ON else (size - 1) / 2
+            for slope, size in zip(depth.tolist(), model_shape)
+        )
+
+
+# the coefficients of the isometric projection of `Perspective`
+_EXACT_COEFFICIENTS = np.array((0.0, 0.5, 1.0, COS_30))
+
+
+def _snap(matrix: np.ndarray) -> np.ndarray:
+    # matrices computed with trigonometry are off by floating point noise, like
+    # sin(180) not being 0. coefficients within noise of the isometric ones are
+    # made exact, so that pixels on half-pixel ties round like Perspective's.
+    magnitude = np.abs(matrix)
+    nearest = np.abs(magnitude[..., np.newaxis] - _EXACT_COEFFICIENTS).argmin(-1)
+    exact = _EXACT_COEFFICIENTS[nearest]
+    return np.where(
+        np.abs(magnitude - exact) < 1e-12, np.copysign(exact, matrix), matrix
+    )
+
 
 @frozen(kw_only=True)
-class Perspective:
+class Perspective(Projection):
+    """
+    One of the 8 isometric views of the model, from a corner shared by the x, y
+    and z faces that it's named for.
+
+    The views are the isometric view from the left, front and up, with the model
+    mirrored along the other axes, so the views from the right or the back, but
+    not both, and from below are mirror images. Use a `Camera` for views from
+    any direction that aren't mirrored.
+    """
+
     x: XFaceId
     y: YFaceId
     z: ZFaceId
@@ -98,75 +296,117 @@ class Perspective:
     def z_dir(self) -> int:
         return 1 if self.z == "up" else -1
 
-    def map_iso(self, x: int, y: int, z: int) -> tuple[int, int]:
-        # "p" for projected, i guess
-        xp = x * self.x_dir * self.scaling_factor
-        yp = y * self.y_dir * self.scaling_factor
-        zp = z * self.z_dir * self.scaling_factor
+    @property
+    def matrix(self) -> np.ndarray[tuple[int, int], np.dtype[np.float64]]:
+        return _perspective_matrix(
+            self.x_dir, self.y_dir, self.z_dir, self.scaling_factor
+        )
 
-        iso_x = (xp - yp) * COS_30
-        iso_y = -(((xp + yp) / 2) + zp)
+    @property
+    def visible_faces(self) -> tuple[FaceId, FaceId, FaceId]:
+        return (self.x, self.y, self.z)
 
-        points = tuple(np.array((iso_x, iso_y)).round().astype(int).tolist())
 
-        return (points[0], points[1])
+@lru_cache(maxsize=None)
+def _perspective_matrix(
+    x_dir: int, y_dir: int, z_dir: int, scaling_factor: int
+) -> np.ndarray[tuple[int, int], np.dtype[np.float64]]:
+    # the isometric view from the left, front and up, mirrored along the axes
+    # whose direction is -1
+    isometric = np.array(
+        (
+            (COS_30, -COS_30, 0.0),
+            (-0.5, -0.5, -1.0),
+            (1.0, 1.0, -1.0),
+        )
+    )
+    matrix = isometric * (np.array((x_dir, y_dir, z_dir)) * scaling_factor)
+    matrix.flags.writeable = False
+    return matrix
 
-    def make_polygon(
-        self,
-        x: int,
-        y: int,
-        z: int,
-        face_id: FaceId,
-        color: RGBA,
-    ) -> Polygon:
-        if face_id in ("front", "back"):
-            if face_id == "front":
-                y_offset = y
-            else:
-                y_offset = y + 1
-            points = (
-                self.map_iso(x, y_offset, z),
-                self.map_iso(x + 1, y_offset, z),
-                self.map_iso(x + 1, y_offset, z + 1),
-                self.map_iso(x, y_offset, z + 1),
-            )
-        elif face_id in ("left", "right"):
-            if face_id == "left":
-                x_offset = x
-            else:
-                x_offset = x + 1
-            points = (
-                self.map_iso(x_offset, y, z),
-                self.map_iso(x_offset, y + 1, z),
-                self.map_iso(x_offset, y + 1, z + 1),
-                self.map_iso(x_offset, y, z + 1),
-            )
-        else:
-            if face_id == "down":
-                z_offset = z
-            else:  # down
-                z_offset = z + 1
-            points = (
-                self.map_iso(x, y, z_offset),
-                self.map_iso(x + 1, y, z_offset),
-                self.map_iso(x + 1, y + 1, z_offset),
-                self.map_iso(x, y + 1, z_offset),
-            )
 
-        return Polygon(
-            points,
-            color,
-        )
+@frozen(kw_only=True)
+class Camera(Projection):
+    """
+    An orthographic camera that looks at the model from any direction.
+
+    - `yaw` is the angle in degrees around the vertical axis, from looking at
+      the front of the model (0) toward its left side (90), its back (180) and
+      its right side (270 or -90).
+    - `pitch` is the angle in degrees above the horizon, from looking straight
+      down (90) to looking straight up from below (-90). The default is the
+      pitch of an isometric view.
+    - `scaling_factor` is like that of `Perspective`: texels at the isometric
+      pitch are as big as in a `Perspective` render.
+
+    `Camera(yaw=45)` is the same view as
+    `Perspective(x="left", y="front", z="up")`, and `Camera(yaw=-135)` is the
+    same as `Perspective(x="right", y="back", z="up")`, pixel for pixel.
+    """
+
+    yaw: float = 45.0
+    pitch: float = ISOMETRIC_PITCH
+    scaling_factor: int = 10
+
+    def __attrs_post_init__(self) -> None:
+        if not -90 <= self.pitch <= 90:
+            raise ValueError(f"Pitch must be between -90 and 90, not {self.pitch}")
+        if self.scaling_factor < 1:
+            raise ValueError("Scaling factor must be at least 1")
+
+    @classmethod
+    def new(
+        cls,
+        *,
+        yaw: float = 45.0,
+        pitch: float = ISOMETRIC_PITCH,
+        scaling_factor: int = 10,
+    ) -> Camera:
+        return cls(yaw=yaw, pitch=pitch, scaling_factor=scaling_factor)
 
     @property
-    def visible_faces(self) -> tuple[FaceId, FaceId, FaceId]:
-        return (self.x, self.y, self.z)
+    def matrix(self) -> np.ndarray[tuple[int, int], np.dtype[np.float64]]:
+        return _camera_matrix(self.yaw, self.pitch, self.scaling_factor)
+
+
+@lru_cache(maxsize=256)
+def _camera_matrix(
+    yaw: float, pitch: float, scaling_factor: int
+) -> np.ndarray[tuple[int, int], np.dtype[np.float64]]:
+    sin_yaw, cos_yaw = np.sin(np.radians(yaw)), np.cos(np.radians(yaw))
+    sin_pitch, cos_pitch = np.sin(np.radians(pitch)), np.cos(np.radians(pitch))
+    # the image's right and up, and the direction toward the camera, in model
+    # coordinates
+    right = (cos_yaw, -sin_yaw, 0.0)
+    up = (sin_pitch * sin_yaw, sin_pitch * cos_yaw, cos_pitch)
+    toward = (-cos_pitch * sin_yaw, -cos_pitch * cos_yaw, sin_pitch)
+    # scaled like Perspective, whose image axes are sqrt(3 / 2) times longer
+    # than the model's, and whose depths are sqrt(3) times longer
+    unit = _snap(
+        np.array(
+            (
+                np.multiply(right, np.sqrt(1.5)),
+                np.multiply(up, -np.sqrt(1.5)),
+                np.multiply(toward, -np.sqrt(3)),
+            )
+        )
+    )
+    matrix = unit * scaling_factor
+    matrix.flags.writeable = False
+    return matrix
 
 
 def get_iso_polys(
     enumerator: Iterable[tuple[R3, FaceId, ImageColor]],
-    perspective: Perspective | None = None,
+    perspective: Projection | None = None,
+    cull_transparent: bool = False,
 ) -> Iterable[Polygon]:
+    """
+    Yield a polygon for each texel that faces the viewer.
+
+    With `cull_transparent`, fully transparent texels (alpha 0) are skipped, so
+    whatever is behind them shows through instead of being painted over.
+    """
     if perspective is None:
         perspective = Perspective.new(
             x="left",
@@ -178,6 +418,8 @@ def get_iso_polys(
     # Collect the polygons for each face
     for (x, y, z), face_id, color in enumerator:
         if face_id in perspective.visible_faces:
+            if cull_transparent and color[3] == 0:
+                continue
             color_t = (
                 color[0],
                 color[1],
@@ -194,27 +436,347 @@ def get_iso_polys(
             yield poly
 
 
+def rasterize_labels(
+    points: np.ndarray[tuple[int, int, int], np.dtype[np.int_]],
+    size: tuple[int, int],
+) -> np.ndarray[tuple[int, int], np.dtype[np.int32]]:
+    """
+    Rasterize polygons into a label image of the given (width, height).
+
+    The result is a (height, width) array where each pixel holds 1 + the index
+    of the last polygon drawn over it, or 0 if no polygon covers it. Polygons are
+    drawn in order, so later polygons paint over earlier ones.
+
+    Coverage is computed by Pillow, so filling a label image gives exactly the
+    same pixels as drawing the polygons with ImageDraw.
+    """
+    img = Image.new("I", size, 0)
+    draw = ImageDraw.Draw(img)
+    flat_points = points.reshape(len(points), -1).tolist()
+    for label, xy in enumerate(flat_points, start=1):
+        draw.polygon(xy, fill=label)
+    labels = np.asarray(img)
+    labels.flags.writeable = False
+    return labels
+
+
+def rasterize_fragments(
+    points: np.ndarray[tuple[int, int, int], np.dtype[np.int_]],
+    size: tuple[int, int],
+) -> tuple[
+    np.ndarray[tuple[int], np.dtype[np.intp]],
+    np.ndarray[tuple[int], np.dtype[np.intp]],
+]:
+    """
+    Rasterize each polygon on its own into an image of the given (width, height).
+
+    Returns two flat arrays describing every pixel covered by every polygon (a
+    "fragment"): the pixel's index into the (height, width) image in row-major
+    order, and the index of the polygon covering it. Unlike `rasterize_labels`,
+    polygons don't hide each other, so a pixel can appear many times.
+
+    Polygons are drawn into one label image per layer of polygons whose bounding
+    boxes don't overlap (see `_fragment_layers`), so each pixel of a layer's
+    labels is covered by its polygon alone.
+
+    Coverage is computed by Pillow, so it matches `rasterize_labels` exactly.
+    """
+    width, height = size
+    pixel_chunks = []
+    polygon_chunks = []
+
+    mins = points.min(axis=1)
+    maxs = points.max(axis=1)
+    layers = _fragment_layers(mins, maxs)
+    order = np.argsort(layers, kind="stable")
+    starts = np.flatnonzero(np.diff(layers[order])) + 1
+    for indices in np.split(order, starts):
+        # draw the layer in an image just big enough for it
+        min_x, min_y = mins[indices].min(axis=0).tolist()
+        max_x, max_y = maxs[indices].max(axis=0).tolist()
+        img = Image.new("I", (max_x - min_x + 1, max_y - min_y + 1), 0)
+        draw = ImageDraw.Draw(img)
+        flat_points = (points[indices] - (min_x, min_y)).reshape(len(indices), -1)
+        for label, xy in zip((indices + 1).tolist(), flat_points.tolist()):
+            draw.polygon(xy, fill=label)
+
+        labels = np.asarray(img).reshape(-1)
+        covered = np.flatnonzero(labels)
+        polygons = labels[covered] - 1
+        ys, xs = np.divmod(covered, max_x - min_x + 1)
+        xs += min_x
+        ys += min_y
+        inside = (xs < width) & (ys < height)
+        pixel_chunks.append(ys[inside] * width + xs[inside])
+        polygon_chunks.append(polygons[inside])
+
+    return (
+        np.concatenate(pixel_chunks).astype(np.intp),
+        np.concatenate(polygon_chunks).astype(np.intp),
+    )
+
+
+def _fragment_layers(
+    mins: np.ndarray[tuple[int, int], np.dtype[np.int_]],
+    maxs: np.ndarray[tuple[int, int], np.dtype[np.int_]],
+) -> np.ndarray[tuple[int], np.dtype[np.intp]]:
+    """
+    Split polygons into layers, given the (x, y) corners of their bounding
+    boxes, so that the boxes of a layer don't overlap.
+
+    The image is cut into cells at least as big as every box, and each polygon
+    goes in the cell of its top left corner. Boxes in two cells that aren't next
+    to each other can't overlap, so a layer takes at most one polygon from each
+    cell of every other column and row: the k-th polygon of each, for a given k
+    and parity of the column and row. Layers are also kept to one tile of
+    cells, so that their images stay small where few polygons overlap.
+    """
+    cell_size = (maxs - mins).max(axis=0) + 1
+    cells = (mins - mins.min(axis=0)) // cell_size
+    tile_cells = max(FRAGMENT_TILE_SIZE // int(cell_size.max()) // 2 * 2, 4)
+    tiles = cells // tile_cells
+    parity = (cells[:, 0] % 2) * 2 + cells[:, 1] % 2
+
+    # the rank of each polygon in its cell
+    cell_index = cells[:, 1] * (int(cells[:, 0].max()) + 1) + cells[:, 0]
+    order = np.argsort(cell_index, kind="stable")
+    sorted_index = cell_index[order]
+    new_cell = np.ones(len(order), dtype=np.bool_)
+    new_cell[1:] = sorted_index[1:] != sorted_index[:-1]
+    starts = np.flatnonzero(new_cell)
+    rank = np.empty(len(order), dtype=np.intp)
+    rank[order] = np.arange(len(order)) - np.repeat(
+        starts, np.diff(starts, append=len(order))
+    )
+
+    tile_index = tiles[:, 1] * (int(tiles[:, 0].max()) + 1) + tiles[:, 0]
+    return (tile_index * (int(rank.max()) + 1) + rank) * 4 + parity
+
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def _cached_labels(
+    points_bytes: bytes, size: tuple[int, int]
+) -> np.ndarray[tuple[int, int], np.dtype[np.int32]]:
+    points = np.frombuffer(points_bytes, dtype=np.int_).reshape(-1, 4, 2)
+    return rasterize_labels(points, size)
+
+
+def fill_labels(
+    labels: np.ndarray[tuple[int, int], np.dtype[np.int32]],
+    colors: np.ndarray[tuple[int, ...], np.dtype[np.uint8]],
+    background_color: tuple[int, int, int, int] | None = None,
+    out: np.ndarray[tuple[int, ...], np.dtype[np.uint8]] | None = None,
+) -> np.ndarray[tuple[int, ...], np.dtype[np.uint8]]:
+    """
+    Color a label image from `rasterize_labels` with one RGBA color per polygon,
+    returning a (height, width, 4) array.
+
+    `colors` can have leading batch dimensions, (..., polygons, 4), to color
+    many images at once. The result then has shape (..., height, width, 4).
+
+    See `gather_colors` for `out`.
+    """
+    return gather_colors(color_palette(colors, background_color), labels, out=out)
+
+
+def color_palette(
+    colors: np.ndarray[tuple[int, ...], np.dtype[np.uint8]],
+    background_color: tuple[int, int, int, int] | None = None,
+) -> np.ndarray[tuple[int, ...], np.dtype[np.uint8]]:
+    """
+    Return the (..., polygons + 1, 4) palette for a label image: the background
+    color (transparent by default), then the color of each polygon.
+    """
+    batch_shape = colors.shape[:-2]
+    palette = np.empty(batch_shape + (colors.shape[-2] + 1, 4), dtype=np.uint8)
+    palette[..., 0, :] = (
+        (0, 0, 0, 0) if background_color is None else background_color
+    )
+    palette[..., 1:, :] = colors
+    return palette
+
+
+def gather_colors(
+    palette: np.ndarray[tuple[int, ...], np.dtype[np.uint8]],
+    labels: np.ndarray[tuple[int, ...], np.dtype[np.int32]],
+    out: np.ndarray[tuple[int, ...], np.dtype[np.uint8]] | None = None,
+) -> np.ndarray[tuple[int, ...], np.dtype[np.uint8]]:
+    """
+    Look up the color of every label in a (..., entries, 4) palette, returning
+    an array of shape (..., *labels.shape, 4).
+
+    With `out`, a uint8 array of that shape, like a slice of a bigger batch, the
+    colors are written into it instead, and it's returned.
+    """
+    # gathering whole 32-bit pixels is much faster than gathering 4-byte rows
+    pixels = pack_colors(palette)
+    if out is None:
+        return unpack_colors(np.take(pixels, labels, axis=-1))
+    out_pixels = pixel_view(out, pixels.shape[:-1] + labels.shape + (4,))
+    # labels are always in range, and "raise" would buffer the output
+    np.take(pixels, labels, axis=-1, out=out_pixels, mode="clip")
+    return out
+
+
+def pack_colors(
+    colors: np.ndarray[tuple[int, ...], np.dtype[np.uint8]],
+) -> np.ndarray[tuple[int, ...], np.dtype[np.uint32]]:
+    """
+    View (..., 4) RGBA colors as (...) 32-bit pixels. The 4 bytes of each color
+    must be next to each other, so they're copied into a contiguous array if they
+    aren't, but transposed arrays, like the `image_color` of skins that wrap
+    row-major buffers, are viewed as they are.
+    """
+    if colors.strides[-1] != 1:
+        colors = np.ascontiguousarray(colors)
+    return colors.view(np.uint32)[..., 0]
+
+
+def pixel_view(
+    out: np.ndarray[tuple[int, ...], np.dtype[np.uint8]], shape: tuple[int, ...]
+) -> np.ndarray[tuple[int, ...], np.dtype[np.uint32]]:
+    """
+    Check that `out` is a uint8 array of RGBA colors of `shape`, and view it as
+    32-bit pixels (see `pack_colors`), to be written to.
+    """
+    if out.dtype != np.uint8 or out.shape != shape:
+        raise ValueError(
+            f"Output array must be uint8 with shape {shape}, but got {out.dtype} "
+            f"with shape {out.shape}"
+        )
+    if out.strides[-1] != 1:
+        raise ValueError(
+            "The 4 bytes of each color in the output array must be next to each "
+            "other"
+        )
+    return out.view(np.uint32)[..., 0]
+
+
+def unpack_colors(
+    pixels: np.ndarray[tuple[int, ...], np.dtype[np.uint32]],
+) -> np.ndarray[tuple[int, ...], np.dtype[np.uint8]]:
+    """
+    The reverse of `pack_colors`.
+    """
+    return np.ascontiguousarray(pixels).view(np.uint8).reshape(*pixels.shape, 4)
+
+
 def render_isometric(
     polys: Sequence[Polygon],
     background_color: tuple[int, int, int, int] | None = None,
+    backend: RenderBackend = "imagedraw",
 ) -> Image.Image:
-    # get bounding box
-    min_x = min(poly.min_x for poly in polys)
-    max_x = max(poly.max_x for poly in polys)
-    min_y = min(poly.min_y for poly in polys)
-    max_y = max(poly.max_y for poly in polys)
-    img_width = max_x - min_x
-    img_height = max_y - min_y
-
-    img = Image.new(
-        "RGBA",
-        (img_width, img_height),
-        color=background_color,  # type: ignore
-    )
-    draw = ImageDraw.Draw(img)
+    """
+    Render polygons to an image just big enough to contain them.
+
+    The "imagedraw" backend draws each polygon with Pillow. The "numpy" backend
+    fills all of them at once from a label image, which is rasterized once per
+    distinct geometry and cached. Both give identical pixels.
+    """
+    with span("bounds"):
+        min_x = min(poly.min_x for poly in polys)
+        max_x = max(poly.max_x for poly in polys)
+        min_y = min(poly.min_y for poly in polys)
+        max_y = max(poly.max_y for poly in polys)
+        img_width = max_x - min_x
+        img_height = max_y - min_y
+
+    with span("rasterize"):
+        if backend == "numpy":
+            points = np.array([poly.points for poly in polys], dtype=np.int_)
+            points -= (min_x, min_y)
+            labels = _cached_labels(points.tobytes(), (img_width, img_height))
+            colors = np.array([poly.color for poly in polys], dtype=np.uint8)
+            return Image.fromarray(fill_labels(labels, colors, background_color))
+
+        img = Image.new(
+            "RGBA",
+            (img_width, img_height),
+            color=background_color,  # type: ignore
+        )
+        draw = ImageDraw.Draw(img)
 
-    for poly in polys:
-        offset_poly = poly.with_offset((-min_x, -min_y))
-        offset_poly.draw(draw)
+        for poly in polys:
+            offset_poly = poly.with_offset((-min_x, -min_y))
+            offset_poly.draw(draw)
 
     return img
+
+
+def alpha_composite(
+    dst: np.ndarray[tuple[int, ...], np.dtype[np.uint8]],
+    src: np.ndarray[tuple[int, ...], np.dtype[np.uint8]],
+) -> np.ndarray[tuple[int, ...], np.dtype[np.uint8]]:
+    """
+    Composite arrays of (..., 4) RGBA colors `src` over `dst`, returning a new
+    array.
+
+    This is the same integer arithmetic as Pillow's `Image.alpha_composite`, so
+    the results are identical.
+    """
+    return unpack_colors(composite_pixels(pack_colors(dst), pack_colors(src)))
+
+
+def composite_pixels(
+    dst: np.ndarray[tuple[int, ...], np.dtype[np.uint32]],
+    src: np.ndarray[tuple[int, ...], np.dtype[np.uint32]],
+) -> np.ndarray[tuple[int, ...], np.dtype[np.uint32]]:
+    """
+    Like `alpha_composite`, but for 32-bit pixels (see `pack_colors`).
+
+    Transparent sources leave the destination as it is and opaque ones replace
+    it, exactly, so there's no need to pick out the translucent ones first.
+    """
+    src_coefs, out_alphas = _composite_tables()
+    shifts = _CHANNEL_SHIFTS.reshape((4,) + (1,) * np.ndim(src))
+    # the weight of the source and the output alpha only depend on the two alphas
+    alpha_pair = (((src >> shifts[3]) & _BYTE) << _BYTE_BITS) | (
+        (dst >> shifts[3]) & _BYTE
+    )
+    src_coef = src_coefs[alpha_pair]
+
+    # 32 bits are enough for all the intermediate values, like in Pillow
+    rgb = ((src >> shifts[:3]) & _BYTE) * src_coef
+    rgb += ((dst >> shifts[:3]) & _BYTE) * (_COEF_ONE - src_coef)
+    rgb += _COEF_HALF
+    # a fast approximation of / 255, like Pillow's SHIFTFORDIV255, then dropping
+    # the 7 bits of extra precision of the weights
+    rgb += rgb >> _BYTE_BITS
+    rgb >>= _BYTE_BITS + _COEF_BITS
+    rgb <<= shifts[:3]
+    return rgb[0] | rgb[1] | rgb[2] | out_alphas[alpha_pair] << shifts[3]
+
+
+# the bit offset of each channel of a 32-bit pixel, which depends on byte order
+_CHANNEL_SHIFTS = np.array(
+    (0, 8, 16, 24) if sys.byteorder == "little" else (24, 16, 8, 0), dtype=np.uint32
+)
+# numpy scalars, so that numpy doesn't convert Python ints on every call
+_BYTE = np.uint32(0xFF)
+# the alpha bits of a 32-bit pixel: pixels with none are transparent, and those
+# with all of them opaque
+ALPHA_MASK = _BYTE << _CHANNEL_SHIFTS[3]
+_BYTE_BITS = np.uint32(8)
+_COEF_BITS = np.uint32(7)
+_COEF_ONE = np.uint32(255 << 7)
+_COEF_HALF = np.uint32(0x80 << 7)
+
+
+@lru_cache(maxsize=1)
+def _composite_tables() -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the weight of the source color, with 7 bits of extra precision, and
+    the output alpha of compositing, for every (source alpha << 8 | destination
+    alpha).
+    """
+    src_a = np.arange(256, dtype=np.uint32)[:, np.newaxis]
+    dst_a = np.arange(256, dtype=np.uint32)
+    out_a255 = src_a * 255 + dst_a * (255 - src_a)
+    src_coef = src_a * (255 * 255 * 128) // np.maximum(out_a255, 1)
+    out_a = _div255(out_a255 + 0x80)
+    return src_coef.ravel(), out_a.ravel()
+
+
+def _div255(values: np.ndarray) -> np.ndarray:
+    # a fast approximation of values / 255, like Pillow's SHIFTFORDIV255
+    return ((values >> 8) + values) >> 8
@@ -0,0 +1,488 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import logging
+import time
+from concurrent.futures import Executor
+from http import HTTPStatus
+from pathlib import Path
+from typing import TYPE_CHECKING, Mapping, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from attrs import define, field, frozen
+from PIL import Image, UnidentifiedImageError
+
+from skinpy.batch import disk_cache
+from skinpy.exception import InputImageException, McSkinException
+from skinpy.encode import Encoding
+from skinpy.layout import SLIM_LAYOUT
+from skinpy.profile import Histogram
+from skinpy.render import Perspective
+from skinpy.skin import Skin
+
+if TYPE_CHECKING:
+    from skinpy.types import StrPath
+
+logger = logging.getLogger(__name__)
+
+# the biggest renders a request can ask for, so that one request can't take
+# all the memory
+MAX_SCALING_FACTOR = 64
+MAX_AVATAR_SIZE = 1024
+# the biggest skins, by width and height, that can be rendered. HD skins
+# compress so well that the request body limit doesn't bound their size, and
+# their layouts and renders grow with the cube of their scale
+MAX_SKIN_SIZE = 64
+
+# how long an idle keep-alive connection, or a slow request, is waited on
+IDLE_TIMEOUT = 15.0
+MAX_HEADERS = 100
+
+# renders are immutable: the same skin and parameters give the same image
+RENDER_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# skins in the skin directory can change, so their renders are revalidated
+PATH_CACHE_CONTROL = "no-cache"
+
+
+class _HttpError(Exception):
+    def __init__(self, status: HTTPStatus, message: str | None = None):
+        super().__init__(message or status.phrase)
+        self.status = status
+
+
+@frozen
+class RenderRequest:
+    """
+    What to render from a skin: an isometric render, or a head avatar.
+    """
+
+    kind: str
+    overlay: bool = True
+    slim: bool = False
+    # isometric renders
+    perspective: Optional[Perspective] = None
+    # avatars
+    size: int = 64
+
+    @classmethod
+    def from_query(cls, kind: str, query: Mapping[str, list[str]]) -> RenderRequest:
+        """
+        Read a request from query parameters: `x`, `y`, `z` and `scale` for
+        isometric renders, `size` for avatars, and `overlay` and `slim` for both.
+        Raises ValueError for bad parameters.
+        """
+        overlay = _bool_param(query, "overlay", True)
+        slim = _bool_param(query, "slim", False)
+        if kind == "avatar":
+            return cls(
+                kind=kind,
+                overlay=overlay,
+                slim=slim,
+                size=_int_param(query, "size", 64, MAX_AVATAR_SIZE),
+            )
+
+        perspective = Perspective.new(
+            x=_choice_param(query, "x", ("left", "right")),  # type: ignore
+            y=_choice_param(query, "y", ("front", "back")),  # type: ignore
+            z=_choice_param(query, "z", ("up", "down")),  # type: ignore
+            scaling_factor=_int_param(query, "scale", 10, MAX_SCALING_FACTOR),
+        )
+        return cls(kind=kind, overlay=overlay, slim=slim, perspective=perspective)
+
+
+def _param(query: Mapping[str, list[str]], name: str) -> str | None:
+    values = query.get(name)
+    return values[-1] if values else None
+
+
+def _choice_param(
+    query: Mapping[str, list[str]], name: str, choices: tuple[str, ...]
+) -> str:
+    value = _param(query, name) or choices[0]
+    if value not in choices:
+        raise ValueError(f"{name} must be one of {', '.join(choices)}")
+    return value
+
+
+def _int_param(
+    query: Mapping[str, list[str]], name: str, default: int, maximum: int
+) -> int:
+    value = _param(query, name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer") from None
+    if not 1 <= number <= maximum:
+        raise ValueError(f"{name} must be between 1 and {maximum}")
+    return number
+
+
+def _bool_param(query: Mapping[str, list[str]], name: str, default: bool) -> bool:
+    value = _param(query, name)
+    if value is None:
+        return default
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"{name} must be true or false")
+
+
+def render_png(
+    data: bytes,
+    request: RenderRequest,
+    cache_dir: Path | None = None,
+    cache_max_bytes: int = 1 << 30,
+    max_skin_size: int = MAX_SKIN_SIZE,
+) -> bytes:
+    """
+    Render the skin in the encoded image `data` and return the render as PNG
+    bytes, caching renders in `cache_dir`, up to `cache_max_bytes`, if given.
+    This runs in the server's worker pool.
+
+    Images wider or taller than `max_skin_size` raise an InputImageException
+    before they're decoded.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+        if max(width, height) > max_skin_size:
+            raise InputImageException(
+                f"Skins can be at most {max_skin_size}x{max_skin_size} pixels, "
+                f"not {width}x{height}"
+            )
+        skin = Skin.from_image(image, layout=SLIM_LAYOUT if request.slim else None)
+    cache = None if cache_dir is None else disk_cache(cache_dir, cache_max_bytes)
+    if request.kind == "avatar":
+        image = skin.to_head_avatar(request.size, overlay=request.overlay, cache=cache)
+    else:
+        assert request.perspective is not None
+        image = skin.to_isometric_image(
+            request.perspective, backend="numpy", overlay=request.overlay, cache=cache
+        )
+    return Encoding().encode(image)
+
+
+@frozen
+class _Response:
+    status: HTTPStatus
+    body: bytes = b""
+    content_type: str = "text/plain; charset=utf-8"
+    headers: Mapping[str, str] = field(factory=dict)
+
+
+@define
+class RenderServer:
+    """
+    An HTTP server that renders skins.
+
+    - `POST /render` and `POST /avatar` render the skin PNG in the request body
+    - `GET /render/NAME` and `GET /avatar/NAME` render the skin at NAME in
+      `skin_dir`
+    - `GET /metrics` reports request counts and latencies, render latencies and
+      the render queue, in the Prometheus text format
+
+    See `RenderRequest.from_query` for the query parameters.
+
+    Renders run on `executor`, which runs `workers` of them at a time, and at
+    most `max_queue` of them are in progress at once, counting those waiting for
+    a worker. Requests beyond that are turned away with 503
+    Service Unavailable, so a burst of requests can't pile up unbounded work.
+    Skins wider or taller than `max_skin_size`, like HD skins by default, get
+    400 Bad Request, since their renders take far more time and memory.
+
+    Every render gets an ETag from the skin's bytes and the parameters, and
+    requests that already have it (If-None-Match) get 304 Not Modified without
+    rendering anything.
+    """
+
+    executor: Executor
+    # how many renders `executor` runs at a time
+    workers: int = 1
+    skin_dir: Optional[Path] = field(default=None)
+    max_queue: int = 64
+    max_body_bytes: int = 1 << 20
+    # where workers cache renders on disk, if anywhere
+    cache_dir: Optional[Path] = None
+    cache_max_bytes: int = 1 << 30
+    # the widest or tallest skin image that's rendered
+    max_skin_size: int = MAX_SKIN_SIZE
+
+    # renders submitted to the executor and not finished
+    pending: int = field(default=0, init=False)
+    rejected: int = field(default=0, init=False)
+    requests: dict[tuple[str, int], int] = field(factory=dict, init=False)
+    request_latency: dict[str, Histogram] = field(factory=dict, init=False)
+    render_latency: Histogram = field(factory=Histogram, init=False)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> asyncio.Server:
+        """
+        Start serving on `host` and `port`, or an unused port with 0. Returns
+        the asyncio server, whose sockets give the address.
+        """
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            keep_alive = True
+            while keep_alive:
+                keep_alive = await self._handle_request(reader, writer)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _handle_request(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> bool:
+        """
+        Read and answer one request. Returns whether the connection stays open.
+        """
+        request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+        if not request_line:
+            return False
+        start = time.perf_counter()
+        endpoint = "unknown"
+        keep_alive = False
+        try:
+            try:
+                method, target, version = request_line.decode("latin-1").split()
+            except ValueError:
+                raise _HttpError(HTTPStatus.BAD_REQUEST, "Bad request line") from None
+            headers = await self._read_headers(reader)
+            keep_alive = version == "HTTP/1.1" and (
+                headers.get("connection", "").lower() != "close"
+            )
+
+            url = urlsplit(target)
+            parts = [unquote(part) for part in url.path.split("/") if part]
+            endpoint = parts[0] if parts else ""
+            query = parse_qs(url.query)
+
+            if method == "POST" and len(parts) == 1:
+                body = await self._read_body(reader, writer, headers)
+                response = await self._render(
+                    endpoint, query, headers, body, RENDER_CACHE_CONTROL
+                )
+            elif method == "GET" and endpoint == "metrics" and len(parts) == 1:
+                response = _Response(
+                    HTTPStatus.OK,
+                    self.metrics().encode(),
+                    content_type="text/plain; version=0.0.4; charset=utf-8",
+                )
+            elif method == "GET" and len(parts) > 1:
+                body = await self._read_skin(parts[1:])
+                response = await self._render(
+                    endpoint, query, headers, body, PATH_CACHE_CONTROL
+                )
+            elif method in ("GET", "POST"):
+                raise _HttpError(HTTPStatus.NOT_FOUND)
+            else:
+                raise _HttpError(HTTPStatus.METHOD_NOT_ALLOWED)
+        except _HttpError as e:
+            # the rest of the request may not have been read
+            keep_alive = keep_alive and e.status < 500 and e.status != 413
+            response = _Response(e.status, f"{e}\n".encode())
+
+        await self._write(writer, response, keep_alive)
+        self._record(endpoint, response.status, time.perf_counter() - start)
+        return keep_alive
+
+    async def _read_headers(self, reader: asyncio.StreamReader) -> dict[str, str]:
+        headers: dict[str, str] = {}
+        for _ in range(MAX_HEADERS):
+            line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        raise _HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+
+    async def _read_body(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        headers: Mapping[str, str],
+    ) -> bytes:
+        if "transfer-encoding" in headers:
+            raise _HttpError(HTTPStatus.LENGTH_REQUIRED)
+        try:
+            length = int(headers["content-length"])
+        except (KeyError, ValueError):
+            raise _HttpError(HTTPStatus.LENGTH_REQUIRED) from None
+        if length > self.max_body_bytes:
+            raise _HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        if headers.get("expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        return await asyncio.wait_for(reader.readexactly(length), IDLE_TIMEOUT)
+
+    async def _read_skin(self, parts: list[str]) -> bytes:
+        if self.skin_dir is None:
+            raise _HttpError(HTTPStatus.NOT_FOUND, "No skin directory is configured")
+        root = self.skin_dir.resolve()
+        path = root.joinpath(*parts).resolve()
+        # nothing outside the skin directory, like ../../etc/passwd
+        if root not in path.parents:
+            raise _HttpError(HTTPStatus.NOT_FOUND)
+        try:
+            return path.read_bytes()
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            raise _HttpError(HTTPStatus.NOT_FOUND) from None
+
+    async def _render(
+        self,
+        endpoint: str,
+        query: Mapping[str, list[str]],
+        headers: Mapping[str, str],
+        data: bytes,
+        cache_control: str,
+    ) -> _Response:
+        if endpoint not in ("render", "avatar"):
+            raise _HttpError(HTTPStatus.NOT_FOUND)
+        try:
+            request = RenderRequest.from_query(endpoint, query)
+        except ValueError as e:
+            raise _HttpError(HTTPStatus.BAD_REQUEST, str(e)) from None
+
+        digest = hashlib.sha256(repr(request).encode())
+        digest.update(data)
+        etag = f'"{digest.hexdigest()[:32]}"'
+        cache_headers = {"ETag": etag, "Cache-Control": cache_control}
+        if etag in (tag.strip() for tag in headers.get("if-none-match", "").split(",")):
+            return _Response(HTTPStatus.NOT_MODIFIED, headers=cache_headers)
+
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise _HttpError(HTTPStatus.SERVICE_UNAVAILABLE, "Render queue is full")
+
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            png = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                render_png,
+                data,
+                request,
+                self.cache_dir,
+                self.cache_max_bytes,
+                self.max_skin_size,
+            )
+        except (McSkinException, UnidentifiedImageError) as e:
+            raise _HttpError(HTTPStatus.BAD_REQUEST, f"Bad skin: {e}") from None
+        except Exception:
+            logger.exception("Failed to render a skin")
+            raise _HttpError(HTTPStatus.INTERNAL_SERVER_ERROR) from None
+        finally:
+            self.pending -= 1
+            self.render_latency.observe(time.perf_counter() - start)
+
+        return _Response(
+            HTTPStatus.OK, png, content_type="image/png", headers=cache_headers
+        )
+
+    async def _write(
+        self, writer: asyncio.StreamWriter, response: _Response, keep_alive: bool
+    ) -> None:
+        lines = [
+            f"HTTP/1.1 {response.status.value} {response.status.phrase}",
+            f"Content-Length: {len(response.body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if response.body:
+            lines.append(f"Content-Type: {response.content_type}")
+        if response.status == HTTPStatus.SERVICE_UNAVAILABLE:
+            lines.append("Retry-After: 1")
+        lines.extend(f"{name}: {value}" for name, value in response.headers.items())
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        writer.write(head + response.body)
+        await writer.drain()
+
+    def _record(self, endpoint: str, status: HTTPStatus, seconds: float) -> None:
+        if endpoint not in ("render", "avatar", "metrics"):
+            # so that clients can't make up label values
+            endpoint = "other"
+        key = (endpoint, status.value)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        self.request_latency.setdefault(endpoint, Histogram()).observe(seconds)
+
+    def metrics(self) -> str:
+        """
+        Return the server's metrics in the Prometheus text format.
+        """
+        lines = [
+            "# TYPE skinpy_requests_total counter",
+            *(
+                f'skinpy_requests_total{{endpoint="{endpoint}",status="{status}"}} '
+                f"{count}"
+                for (endpoint, status), count in sorted(self.requests.items())
+            ),
+            "# TYPE skinpy_request_duration_seconds histogram",
+        ]
+        for endpoint, histogram in sorted(self.request_latency.items()):
+            lines.extend(
+                histogram.lines(
+                    "skinpy_request_duration_seconds", f'endpoint="{endpoint}"'
+                )
+            )
+        lines.extend(
+            [
+                "# TYPE skinpy_render_duration_seconds histogram",
+                *self.render_latency.lines("skinpy_render_duration_seconds", ""),
+                "# TYPE skinpy_render_queue_depth gauge",
+                f"skinpy_render_queue_depth {max(self.pending - self.workers, 0)}",
+                "# TYPE skinpy_renders_in_progress gauge",
+                f"skinpy_renders_in_progress {min(self.pending, self.workers)}",
+                "# TYPE skinpy_render_queue_capacity gauge",
+                f"skinpy_render_queue_capacity {self.max_queue}",
+                "# TYPE skinpy_rejected_requests_total counter",
+                f"skinpy_rejected_requests_total {self.rejected}",
+            ]
+        )
+        return "\n".join(lines) + "\n"
+
+
+def run_server(
+    host: str,
+    port: int,
+    executor: Executor,
+    workers: int = 1,
+    skin_dir: StrPath | None = None,
+    max_queue: int = 64,
+    cache_dir: StrPath | None = None,
+    cache_max_bytes: int = 1 << 30,
+    max_skin_size: int = MAX_SKIN_SIZE,
+) -> None:
+    """
+    Serve renders until interrupted.
+    """
+    server = RenderServer(
+        executor=executor,
+        workers=workers,
+        skin_dir=None if skin_dir is None else Path(skin_dir),
+        max_queue=max_queue,
+        cache_dir=None if cache_dir is None else Path(cache_dir),
+        cache_max_bytes=cache_max_bytes,
+        max_skin_size=max_skin_size,
+    )
+
+    async def main() -> None:
+        async with await server.start(host, port) as listener:
+            for sock in listener.sockets:
+                address = sock.getsockname()
+                print(f"Serving on http://{address[0]}:{address[1]}")
+            await listener.serve_forever()
+
+    with executor:
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            pass
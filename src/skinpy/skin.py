@@ -1,21 +1,35 @@
 from __future__ import annotations
 
-from typing import Iterable, TYPE_CHECKING
+import io
+from typing import BinaryIO, Callable, Iterable, Sequence, TYPE_CHECKING
 
 import numpy as np
-from numpy import s_
-from attrs import frozen
+from attrs import field, frozen
 from PIL import Image
 
 from skinpy.render import (
     Polygon,
     get_iso_polys,
-    Perspective,
+    Projection,
     render_isometric,
 )
+from skinpy.plan import get_render_plan
+from skinpy.profile import span
+from skinpy.flat import get_flat_view
 from skinpy.exception import UnmappedVoxelError, InputImageException
+from skinpy.layout import (
+    CLASSIC_LAYOUT,
+    UNMAPPED,
+    SkinLayout,
+    compile_layout,
+    face_layout,
+    face_to_model,
+    layout_for_size,
+)
+from skinpy.types import BODY_PART_IDS, FACE_IDS
 
 if TYPE_CHECKING:
+    from skinpy.cache import RenderCache
     from skinpy.types import (
         ImageColor,
         R3,
@@ -23,11 +37,16 @@ if TYPE_CHECKING:
         RGBA,
         FaceId,
         BodyPartId,
-        StrPath
+        StrPath,
+        RenderBackend,
+        AnimationFormat,
+        Coords,
+        FaceIds,
     )
 
+_FACE_INDEX: dict[FaceId, int] = {face_id: i for i, face_id in enumerate(FACE_IDS)}
+
 # TODO: Fix upside down renders
-# TODO: Second layer
 
 
 def _subarray(*, data: ImageColor, origin: R2, offset: R2) -> ImageColor:
@@ -46,8 +65,76 @@ def _subarray(*, data: ImageColor, origin: R2, offset: R2) -> ImageColor:
     slices = tuple(slice(o, o + s) for o, s in zip(origin, offset))
     return data[slices]
 
-FORWARD_SLICE = s_[:]
-REVERSE_SLICE = s_[::-1]
+
+def _model_to_face(
+    face_id: FaceId, part_shape: R3, x: np.ndarray, y: np.ndarray, z: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The inverse of `face_to_model`, for arrays. Returns whether each (x, y, z)
+    is on the face, and its (u, v) coordinates on the face.
+    """
+    x_shape, y_shape, z_shape = part_shape
+    on_face = (
+        (0 <= x) & (x < x_shape) & (0 <= y) & (y < y_shape) & (0 <= z) & (z < z_shape)
+    )
+    if face_id in ("up", "down"):
+        on_face &= z == (0 if face_id == "down" else z_shape - 1)
+        return on_face, x, y
+    elif face_id in ("left", "right"):
+        on_face &= x == (0 if face_id == "left" else x_shape - 1)
+        return on_face, y, z
+    else:  # front or back
+        on_face &= y == (0 if face_id == "front" else y_shape - 1)
+        return on_face, x, z
+
+
+def _face_indices(face: FaceIds) -> np.ndarray:
+    """
+    Convert face ids, or indices into FACE_IDS, to an array of indices.
+    """
+    face_arr = np.asarray(face)
+    if face_arr.dtype.kind in "iu":
+        return face_arr.astype(np.intp)
+
+    unique, inverse = np.unique(face_arr, return_inverse=True)
+    try:
+        unique_indices = np.array(
+            [_FACE_INDEX[face_id] for face_id in unique.tolist()], dtype=np.intp
+        )
+    except KeyError as e:
+        raise ValueError(f"Unknown face id {e.args[0]!r}") from None
+    return unique_indices[inverse].reshape(face_arr.shape)
+
+
+def _check_mapped(
+    mapped: np.ndarray, coords: tuple[np.ndarray, ...], mask_unmapped: bool
+) -> None:
+    if mask_unmapped or mapped.all():
+        return
+    first = tuple(np.argwhere(~mapped)[0])
+    coord = tuple(c[first].item() for c in coords)
+    if len(coord) == 4:
+        # (x, y, z, face index)
+        face_index = coord[3]
+        if 0 <= face_index < len(FACE_IDS):
+            coord = (*coord[:3], FACE_IDS[face_index])
+    raise UnmappedVoxelError(f"{coord} contains unmapped voxels")
+
+
+def _as_colors(colors: ImageColor | RGBA, shape: tuple[int, ...]) -> np.ndarray:
+    # one color per coordinate, or the same color for all of them
+    return np.broadcast_to(np.asarray(colors, dtype=np.uint8), shape + (4,))
+
+
+def _gathered(
+    colors: np.ndarray, mapped: np.ndarray, mask_unmapped: bool
+) -> np.ndarray:
+    if not mask_unmapped:
+        return colors
+    colors[~mapped] = 0
+    return np.ma.masked_array(
+        colors, mask=np.broadcast_to(~mapped[..., np.newaxis], colors.shape)
+    )
 
 
 @frozen
@@ -62,51 +149,26 @@ class Face:
         part_image_color: ImageColor,
         id_: FaceId,
         part_shape: R3,
+        mirrored: bool = False,
     ) -> Face:
-        x_shape, y_shape, z_shape = part_shape
-        order_x = FORWARD_SLICE
-        order_y = REVERSE_SLICE
-        if id_ in ("up", "down"):
-            image_color_shape = (x_shape, y_shape)
-            if id_ == "up":
-                face_image_origin = (y_shape, 0)
-            else:  # down
-                face_image_origin = (y_shape + x_shape, 0)
-        elif id_ in ("left", "right"):
-            image_color_shape = (y_shape, z_shape)
-            if id_ == "left":
-                face_image_origin = (0, y_shape)
-                order_x = REVERSE_SLICE
-            else:  # right
-                face_image_origin = (y_shape + x_shape, y_shape)
-        else:  # front or back
-            image_color_shape = (x_shape, z_shape)
-            if id_ == "front":
-                face_image_origin = (y_shape, y_shape)
-            else:  # back
-                face_image_origin = (y_shape + x_shape + y_shape, y_shape)
-                order_x = REVERSE_SLICE
-
-        image_color = _subarray(
-            data=part_image_color,
-            origin=face_image_origin,
-            offset=image_color_shape,
-        )
-
+        layout = face_layout(id_, part_shape, mirrored)
         return cls(
-            image_color=image_color,
+            image_color=_subarray(
+                data=part_image_color,
+                origin=layout.image_origin,
+                offset=layout.image_shape,
+            ),
             id_=id_,
-            order=(order_x, order_y),
+            order=layout.order,
         )
 
     def enumerate_color(self) -> Iterable[tuple[R2, ImageColor]]:
         """
         Return an iterator of ((x, y), color) for each pixel of the face.
         """
-        for x, y in np.ndindex(self.image_color.shape[:2]):
-            coord = (x, y)
-            color = self.image_color[self.order][x, y]
-            yield coord, color
+        oriented = self.image_color[self.order]
+        for x, y in np.ndindex(oriented.shape[:2]):
+            yield (x, y), oriented[x, y]
 
     def get_color(self, x: int | slice, y: int | slice) -> ImageColor:
         try:
@@ -118,6 +180,56 @@ class Face:
     def set_color(self, x: int | slice, y: int | slice, color: RGBA):
         self.get_color(x, y)[:] = color
 
+    def get_colors(
+        self, x: Coords, y: Coords, *, mask_unmapped: bool = False
+    ) -> np.ndarray:
+        """
+        Like `get_color`, but for arrays of coordinates, which are broadcast
+        together. Returns a copy of the colors with shape (..., 4).
+
+        Unmapped coordinates raise an UnmappedVoxelError, unless `mask_unmapped`
+        is set, in which case a masked array is returned with them masked out.
+        """
+        x_arr, y_arr, mapped = self._resolve(x, y)
+        _check_mapped(mapped, (x_arr, y_arr), mask_unmapped)
+        colors = self.image_color[self.order][
+            np.where(mapped, x_arr, 0), np.where(mapped, y_arr, 0)
+        ]
+        return _gathered(colors, mapped, mask_unmapped)
+
+    def set_colors(
+        self,
+        x: Coords,
+        y: Coords,
+        colors: ImageColor | RGBA,
+        *,
+        mask_unmapped: bool = False,
+    ):
+        """
+        Like `set_color`, but for arrays of coordinates, which are broadcast
+        together. `colors` is either one color per coordinate or a single color.
+
+        Unmapped coordinates raise an UnmappedVoxelError before anything is
+        written, unless `mask_unmapped` is set, in which case they're skipped.
+        """
+        x_arr, y_arr, mapped = self._resolve(x, y)
+        _check_mapped(mapped, (x_arr, y_arr), mask_unmapped)
+        colors_arr = _as_colors(colors, x_arr.shape)
+        oriented = self.image_color[self.order]
+        oriented[x_arr[mapped], y_arr[mapped]] = colors_arr[mapped]
+
+    def _resolve(
+        self, x: Coords, y: Coords
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        x_arr, y_arr = np.broadcast_arrays(
+            np.asarray(x, dtype=np.intp), np.asarray(y, dtype=np.intp)
+        )
+        # negative coordinates count from the end, like get_color
+        x_shape, y_shape = self.shape
+        mapped = (-x_shape <= x_arr) & (x_arr < x_shape)
+        mapped &= (-y_shape <= y_arr) & (y_arr < y_shape)
+        return x_arr, y_arr, mapped
+
     @property
     def shape(self) -> tuple[int, int]:
         return (self.image_color.shape[0], self.image_color.shape[1])
@@ -144,13 +256,19 @@ class BodyPart:
     image_color: ImageColor
     # the front left down corner of the cuboid relative to the entire skin
     model_origin: R3
-
-    up: Face
-    down: Face
-    left: Face
-    right: Face
-    front: Face
-    back: Face
+    # x, y, z
+    shape: R3
+    # how far the body part's shell is inflated around the model, in texels. this
+    # is 0 for the base layer and positive for overlays.
+    inflation: float = 0.0
+    # whether the body part is textured as a mirror image of the one on the other
+    # side of the model (see `PartLayout.mirrored`)
+    mirrored: bool = False
+
+    # faces are built on first access
+    _face_cache: dict[FaceId, Face] = field(
+        factory=dict, init=False, repr=False, eq=False
+    )
 
     @classmethod
     def new(
@@ -161,6 +279,8 @@ class BodyPart:
         part_shape: R3,
         part_model_origin: R3,
         part_image_origin: R2,
+        inflation: float = 0.0,
+        mirrored: bool = False,
     ) -> BodyPart:
         image_color = _subarray(
             data=skin_image_color,
@@ -171,78 +291,67 @@ class BodyPart:
             ),
         )
 
-        def face_for_id(face_name: FaceId) -> Face:
-            return Face.new(
-                part_image_color=image_color,
-                id_=face_name,
-                part_shape=part_shape,
-            )
-
         return cls(
             id_=id_,
             image_color=image_color,
             model_origin=part_model_origin,
-            up=face_for_id("up"),
-            down=face_for_id("down"),
-            left=face_for_id("left"),
-            right=face_for_id("right"),
-            front=face_for_id("front"),
-            back=face_for_id("back"),
+            shape=part_shape,
+            inflation=inflation,
+            mirrored=mirrored,
         )
 
+    @property
+    def is_overlay(self) -> bool:
+        return self.inflation > 0
+
+    @property
+    def up(self) -> Face:
+        return self.get_face_for_id("up")
+
+    @property
+    def down(self) -> Face:
+        return self.get_face_for_id("down")
+
+    @property
+    def left(self) -> Face:
+        return self.get_face_for_id("left")
+
+    @property
+    def right(self) -> Face:
+        return self.get_face_for_id("right")
+
+    @property
+    def front(self) -> Face:
+        return self.get_face_for_id("front")
+
+    @property
+    def back(self) -> Face:
+        return self.get_face_for_id("back")
+
     @property
     def faces(self) -> tuple[Face, ...]:
         return (self.up, self.down, self.left, self.right, self.front, self.back)
 
     def get_face_for_id(self, face_id: FaceId) -> Face:
-        if face_id == "up":
-            return self.up
-        elif face_id == "down":
-            return self.down
-        elif face_id == "left":
-            return self.left
-        elif face_id == "right":
-            return self.right
-        elif face_id == "front":
-            return self.front
-        else:  # face_id == "back"
-            return self.back
-
-    @property
-    def shape(self) -> tuple[int, int, int]:
-        return (
-            self.front.shape[0],
-            self.left.shape[0],
-            self.front.shape[1],
-        )
+        face = self._face_cache.get(face_id)
+        if face is None:
+            face = Face.new(
+                part_image_color=self.image_color,
+                id_=face_id,
+                part_shape=self.shape,
+                mirrored=self.mirrored,
+            )
+            self._face_cache[face_id] = face
+        return face
 
     def enumerate_color(self) -> Iterable[tuple[R3, FaceId, ImageColor]]:
         """
         Return an iterator of (x, y, z, face, color) for each pixel of the body part.
         """
+        shape = self.shape
         for face in self.faces:
-            for xy_coord, color in face.enumerate_color():
-                if face.id_ in ("up", "down"):
-                    x, y = xy_coord
-                    if face.id_ == "down":
-                        z = 0
-                    else:  # up
-                        z = self.shape[2] - 1
-                elif face.id_ in ("left", "right"):
-                    y, z = xy_coord
-                    if face.id_ == "left":
-                        x = 0
-                    else:
-                        x = self.shape[0] - 1
-                else:  # front or back
-                    x, z = xy_coord
-                    if face.id_ == "front":
-                        y = 0
-                    else:
-                        y = self.shape[1] - 1
-                xyz_coord = (x, y, z)
-
-                yield xyz_coord, face.id_, color
+            for (u, v), color in face.enumerate_color():
+                yield face_to_model(face.id_, shape, u, v), face.id_, color
 
     def get_color(
         self, x: int | slice, y: int | slice, z: int | slice, face: FaceId
@@ -273,20 +382,110 @@ class BodyPart:
     ):
         self.get_color(x, y, z, face)[:] = color
 
-    def get_iso_polys(self, perspective: Perspective) -> Iterable[Polygon]:
+    def get_colors(
+        self,
+        x: Coords,
+        y: Coords,
+        z: Coords,
+        face: FaceIds,
+        *,
+        mask_unmapped: bool = False,
+    ) -> np.ndarray:
+        """
+        Like `get_color`, but for arrays of coordinates and face ids (or indices
+        into FACE_IDS), which are broadcast together. Returns a copy of the colors
+        with shape (..., 4).
+
+        Unmapped coordinates raise an UnmappedVoxelError, unless `mask_unmapped`
+        is set, in which case a masked array is returned with them masked out.
+        """
+        coords, selections = self._resolve(x, y, z, face)
+        mapped = np.zeros(coords[0].shape, dtype=np.bool_)
+        for _, on_face, _, _ in selections:
+            mapped |= on_face
+        _check_mapped(mapped, coords, mask_unmapped)
+
+        colors = np.zeros(coords[0].shape + (4,), dtype=self.image_color.dtype)
+        for face_obj, on_face, u, v in selections:
+            colors[on_face] = face_obj.image_color[face_obj.order][
+                u[on_face], v[on_face]
+            ]
+        return _gathered(colors, mapped, mask_unmapped)
+
+    def set_colors(
+        self,
+        x: Coords,
+        y: Coords,
+        z: Coords,
+        face: FaceIds,
+        colors: ImageColor | RGBA,
+        *,
+        mask_unmapped: bool = False,
+    ):
+        """
+        Like `set_color`, but for arrays of coordinates and face ids (or indices
+        into FACE_IDS), which are broadcast together. `colors` is either one
+        color per coordinate or a single color.
+
+        Unmapped coordinates raise an UnmappedVoxelError before anything is
+        written, unless `mask_unmapped` is set, in which case they're skipped.
+        """
+        coords, selections = self._resolve(x, y, z, face)
+        mapped = np.zeros(coords[0].shape, dtype=np.bool_)
+        for _, on_face, _, _ in selections:
+            mapped |= on_face
+        _check_mapped(mapped, coords, mask_unmapped)
+
+        colors_arr = _as_colors(colors, coords[0].shape)
+        for face_obj, on_face, u, v in selections:
+            face_obj.image_color[face_obj.order][u[on_face], v[on_face]] = (
+                colors_arr[on_face]
+            )
+
+    def _resolve(
+        self, x: Coords, y: Coords, z: Coords, face: FaceIds
+    ) -> tuple[
+        tuple[np.ndarray, ...],
+        list[tuple[Face, np.ndarray, np.ndarray, np.ndarray]],
+    ]:
+        """
+        Broadcast the coordinates, and work out which of them are on each face
+        and where.
+        """
+        x_arr, y_arr, z_arr, face_arr = np.broadcast_arrays(
+            np.asarray(x, dtype=np.intp),
+            np.asarray(y, dtype=np.intp),
+            np.asarray(z, dtype=np.intp),
+            _face_indices(face),
+        )
+        shape = self.shape
+        selections = []
+        for face_index, face_obj in enumerate(self.faces):
+            on_face, u, v = _model_to_face(face_obj.id_, shape, x_arr, y_arr, z_arr)
+            selections.append((face_obj, on_face & (face_arr == face_index), u, v))
+        return (x_arr, y_arr, z_arr, face_arr), selections
+
+    def get_iso_polys(
+        self, perspective: Projection, cull_transparent: bool = False
+    ) -> Iterable[Polygon]:
         yield from get_iso_polys(
             self.enumerate_color(),
             perspective=perspective,
+            cull_transparent=cull_transparent,
         )
 
     def to_isometric_image(
         self,
-        perspective: Perspective,
+        perspective: Projection,
         background_color: tuple[int, int, int, int] | None = None,
+        backend: RenderBackend = "imagedraw",
     ) -> Image.Image:
+        with span("polygons"):
+            polys = list(self.get_iso_polys(perspective))
         return render_isometric(
-            polys=list(self.get_iso_polys(perspective)),
+            polys=polys,
             background_color=background_color,
+            backend=backend,
         )
 
 
@@ -313,160 +512,282 @@ class Skin:
     - color: red, green, blue, alpha (0-3)
 
     The coordinate system for images has its origin at the top left corner.
+
+    Those ranges are for the classic layout. Other layouts, like slim, legacy
+    64x32 or HD skins, are described by a `SkinLayout`, which decides the size of
+    the image and model and where every body part is on both.
     """
 
     image_color: ImageColor
 
-    head: BodyPart
-    torso: BodyPart
-    left_arm: BodyPart
-    right_arm: BodyPart
-    left_leg: BodyPart
-    right_leg: BodyPart
+    layout: SkinLayout = CLASSIC_LAYOUT
+
+    # body parts and overlays are built on first access
+    _part_cache: dict[BodyPartId, BodyPart] = field(
+        factory=dict, init=False, repr=False, eq=False
+    )
+    _overlay_cache: dict[BodyPartId, BodyPart] = field(
+        factory=dict, init=False, repr=False, eq=False
+    )
 
     @classmethod
-    def new(cls, image_color: ImageColor | None = None) -> Skin:
+    def new(
+        cls,
+        image_color: ImageColor | None = None,
+        layout: SkinLayout | None = None,
+    ) -> Skin:
+        """
+        Create a skin from image colors, or a blank one. Without a `layout`, it's
+        worked out from the size of the image (see
+        `skinpy.layout.layout_for_size`), and blank skins are classic.
+        """
         if image_color is None:
+            layout = layout or CLASSIC_LAYOUT
             image_color = np.zeros(
                 (
-                    64,  # 64 pixels x (left to right)
-                    64,  # 64 pixels y (top to bottom)
+                    *layout.image_size,  # pixels x (left to right), y (top to bottom)
                     4,  # 4 color channels (RGBA)
                 ),
                 dtype=np.uint8,
             )
+        elif layout is None:
+            layout = _layout_for_image_size(image_color.shape[:2])
 
-        assert image_color.shape == (64, 64, 4)
-
-        head = BodyPart.new(
-            id_="head",
-            skin_image_color=image_color,
-            part_shape=(8, 8, 8),
-            part_model_origin=(4, 0, 24),
-            part_image_origin=(0, 0),
-        )
-        torso = BodyPart.new(
-            id_="torso",
-            skin_image_color=image_color,
-            part_shape=(8, 4, 12),
-            part_model_origin=(4, 2, 12),
-            part_image_origin=(16, 16),
-        )
-        left_arm = BodyPart.new(
-            id_="left_arm",
-            skin_image_color=image_color,
-            part_shape=(4, 4, 12),
-            part_model_origin=(0, 2, 12),
-            part_image_origin=(40, 16),
-        )
-        right_arm = BodyPart.new(
-            id_="right_arm",
-            skin_image_color=image_color,
-            part_shape=(4, 4, 12),
-            part_model_origin=(12, 2, 12),
-            part_image_origin=(32, 48),
-        )
-        left_leg = BodyPart.new(
-            id_="left_leg",
-            skin_image_color=image_color,
-            part_shape=(4, 4, 12),
-            part_model_origin=(4, 2, 0),
-            part_image_origin=(0, 16),
-        )
-        right_leg = BodyPart.new(
-            id_="right_leg",
-            skin_image_color=image_color,
-            part_shape=(4, 4, 12),
-            part_model_origin=(8, 2, 0),
-            part_image_origin=(16, 48),
-        )
+        if image_color.shape[:2] != layout.image_size or image_color.shape[2] != 4:
+            width, height = layout.image_size
+            raise InputImageException(
+                f"A {layout.name} skin is {width}x{height} RGBA pixels, but got "
+                f"image colors of shape {image_color.shape}"
+            )
 
-        return cls(
-            image_color=image_color,
-            head=head,
-            torso=torso,
-            left_arm=left_arm,
-            right_arm=right_arm,
-            left_leg=left_leg,
-            right_leg=right_leg,
-        )
+        return cls(image_color=image_color, layout=layout)
 
     @classmethod
-    def filled(cls, color: RGBA) -> Skin:
+    def filled(cls, color: RGBA, layout: SkinLayout = CLASSIC_LAYOUT) -> Skin:
         """
         Fill the skin with the given color.
         """
-        skin = cls.new()
-        for body_part in skin.body_parts:
-            for face in body_part.faces:
-                face.image_color[:] = color
+        skin = cls.new(layout=layout)
+        table = skin.voxel_table()
+        skin.image_color[table.image_x, table.image_y] = color
         return skin
 
     @classmethod
-    def from_image(cls, image: Image.Image) -> Skin:
+    def from_buffer(
+        cls,
+        buffer: np.ndarray | bytes | bytearray | memoryview,
+        row_major: bool = True,
+        layout: SkinLayout | None = None,
+    ) -> Skin:
         """
-        Create a skin from a Pillow Image. The image must be 64x64 pixels and in RGBA
-        mode, otherwise an InputImageException is raised.
+        Create a skin that wraps existing RGBA pixel data without copying it, so
+        changes to the skin show up in the buffer, and vice versa.
 
-        The image data is copied into the skin, so modifying the image after creating
-        the skin will not affect the skin, and vice versa.
+        The buffer can be anything that supports the buffer protocol, like a numpy
+        array, memoryview or bytearray, holding uint8 RGBA values: 64 * 64 * 4 of
+        them for classic skins. With `row_major`, the default, the pixels are laid
+        out like an image file's, row by row (y first, then x). Otherwise, they are
+        laid out like `image_color` (x first, then y).
+
+        Without a `layout`, it's worked out from the shape of the buffer. Flat
+        buffers are taken to be classic skins, or legacy ones if they're half as
+        big.
+
+        Wrapping a read-only buffer, like `bytes`, gives a read-only skin.
         """
+        if isinstance(buffer, np.ndarray):
+            arr = buffer
+        else:
+            arr = np.frombuffer(buffer, dtype=np.uint8)
 
-        if image.size != (64, 64):
+        if arr.dtype != np.uint8:
             raise InputImageException(
-                f"Image size must be 64x64 pixels, but got {image.size}"
+                f"Buffer dtype must be uint8, but got {arr.dtype}"
             )
 
+        if arr.ndim == 1:
+            if layout is None:
+                layout = _layout_for_image_size(
+                    (64, 32) if len(arr) == 64 * 32 * 4 else (64, 64)
+                )
+            width, height = layout.image_size
+            if len(arr) == width * height * 4:
+                shape = (height, width, 4) if row_major else (width, height, 4)
+                arr = arr.reshape(shape)
+
+        if arr.ndim != 3 or arr.shape[2] != 4:
+            raise InputImageException(
+                f"Buffer must hold RGBA pixels, but got shape {arr.shape}"
+            )
+
+        # swap because numpy indexes row-major (y first, then x), but we
+        # want column-major (x first, then y) because its more natural. this is a
+        # view, so nothing is copied.
+        if row_major:
+            arr = np.swapaxes(arr, 0, 1)
+
+        return cls.new(image_color=arr, layout=layout)
+
+    @classmethod
+    def from_image(cls, image: Image.Image, layout: SkinLayout | None = None) -> Skin:
+        """
+        Create a skin from a Pillow Image. The image must be in RGBA mode, and the
+        size of a skin: 64x64 pixels for classic and slim skins, 64x32 for legacy
+        ones, or a multiple of those for HD ones. Otherwise, an
+        InputImageException is raised.
+
+        Without a `layout`, it's worked out from the size of the image. Slim skins
+        are the same size as classic ones, so they need `layout` to be given. The
+        layout is scaled up for HD images, so `SLIM_LAYOUT` works for those too.
+
+        The image data is copied into the skin, so modifying the image after creating
+        the skin will not affect the skin, and vice versa.
+        """
+
+        if layout is None:
+            layout = _layout_for_image_size(image.size)
+        else:
+            try:
+                layout = layout.fit(image.size)
+            except ValueError as e:
+                raise InputImageException(str(e)) from None
+
         if image.mode != "RGBA":
             raise InputImageException(f"Image mode must be RGBA, but got {image.mode}")
 
-        # swap because numpy indexes row-major (y first, then x), but we
-        # want column-major (x first, then y) because its more natural
-        image_arr = np.swapaxes(np.asarray(image), 0, 1)
+        # the one copy out of the image becomes the skin's buffer. it's also when
+        # lazily opened images are decoded
+        with span("decode"):
+            image_color = np.array(image)
+        return cls.from_buffer(image_color, layout=layout)
 
-        skin = cls.new()
-        skin.image_color[:] = image_arr
-        return skin
+    @classmethod
+    def from_bytes(cls, data: bytes, layout: SkinLayout | None = None) -> Skin:
+        """
+        Create a skin from the bytes of an encoded image, like the contents of a
+        PNG file. See `from_image` for `layout`.
+        """
+        with Image.open(io.BytesIO(data)) as image:
+            return cls.from_image(image, layout=layout)
 
     @classmethod
-    def from_path(cls, path: StrPath) -> Skin:
+    def from_path(cls, path: StrPath, layout: SkinLayout | None = None) -> Skin:
         """
-        Create a skin from an image path.
+        Create a skin from an image path. See `from_image` for `layout`.
         """
-        import shutil
-        shutil.copy(path, "test.png")
-        image = Image.open(path)
-        return cls.from_image(image)
+        with Image.open(path) as image:
+            return cls.from_image(image, layout=layout)
 
     @property
     def body_parts(self) -> tuple[BodyPart, ...]:
-        return (
-            self.left_leg,
-            self.right_leg,
-            self.left_arm,
-            self.torso,
-            self.right_arm,
-            self.head,
-        )
+        return tuple(self.get_body_part_for_id(part.id_) for part in self.layout.parts)
+
+    @property
+    def head(self) -> BodyPart:
+        return self.get_body_part_for_id("head")
+
+    @property
+    def torso(self) -> BodyPart:
+        return self.get_body_part_for_id("torso")
+
+    @property
+    def left_arm(self) -> BodyPart:
+        return self.get_body_part_for_id("left_arm")
+
+    @property
+    def right_arm(self) -> BodyPart:
+        return self.get_body_part_for_id("right_arm")
+
+    @property
+    def left_leg(self) -> BodyPart:
+        return self.get_body_part_for_id("left_leg")
+
+    @property
+    def right_leg(self) -> BodyPart:
+        return self.get_body_part_for_id("right_leg")
 
     def get_body_part_for_id(self, body_part_id: BodyPartId) -> BodyPart:
-        if body_part_id == "head":
-            return self.head
-        elif body_part_id == "torso":
-            return self.torso
-        elif body_part_id == "left_arm":
-            return self.left_arm
-        elif body_part_id == "right_arm":
-            return self.right_arm
-        elif body_part_id == "left_leg":
-            return self.left_leg
-        else:  # body_part_id == "right_leg"
-            return self.right_leg
+        body_part = self._part_cache.get(body_part_id)
+        if body_part is None:
+            part = self.layout.part(body_part_id)
+            body_part = BodyPart.new(
+                id_=body_part_id,
+                skin_image_color=self.image_color,
+                part_shape=part.shape,
+                part_model_origin=part.model_origin,
+                part_image_origin=part.image_origin,
+                mirrored=part.mirrored,
+            )
+            self._part_cache[body_part_id] = body_part
+        return body_part
+
+    @property
+    def overlays(self) -> tuple[BodyPart, ...]:
+        """
+        The overlays (second layer) of the body parts, in the same order as
+        `body_parts`. Legacy skins only have one, the hat.
+        """
+        return tuple(
+            self.get_overlay_for_id(part.id_)
+            for part in self.layout.parts
+            if part.has_overlay
+        )
+
+    @property
+    def hat(self) -> BodyPart:
+        return self.get_overlay_for_id("head")
+
+    @property
+    def jacket(self) -> BodyPart:
+        return self.get_overlay_for_id("torso")
+
+    @property
+    def left_sleeve(self) -> BodyPart:
+        return self.get_overlay_for_id("left_arm")
+
+    @property
+    def right_sleeve(self) -> BodyPart:
+        return self.get_overlay_for_id("right_arm")
+
+    @property
+    def left_pants(self) -> BodyPart:
+        return self.get_overlay_for_id("left_leg")
+
+    @property
+    def right_pants(self) -> BodyPart:
+        return self.get_overlay_for_id("right_leg")
+
+    def get_overlay_for_id(self, body_part_id: BodyPartId) -> BodyPart:
+        """
+        Return the overlay of a body part: a shell around it, slightly bigger,
+        colored from its own region of the image. It has the same id, shape and
+        coordinates as the body part it covers.
+
+        Raises ValueError if the skin's layout has no overlay for the body part.
+        """
+        overlay = self._overlay_cache.get(body_part_id)
+        if overlay is None:
+            part = self.layout.part(body_part_id)
+            if part.overlay_image_origin is None:
+                raise ValueError(
+                    f"{self.layout.name} skins have no overlay on the {body_part_id}"
+                )
+            overlay = BodyPart.new(
+                id_=body_part_id,
+                skin_image_color=self.image_color,
+                part_shape=part.shape,
+                part_model_origin=part.model_origin,
+                part_image_origin=part.overlay_image_origin,
+                inflation=part.overlay_inflation,
+                mirrored=part.mirrored,
+            )
+            self._overlay_cache[body_part_id] = overlay
+        return overlay
 
     @property
     def shape(self) -> R3:
         # x, y, z
-        return (16, 8, 32)
+        return self.layout.model_shape
 
     def enumerate_color(
         self,
@@ -475,37 +796,147 @@ class Skin:
         Return an iterator of ((x, y, z), body_part, face, color) for each pixel
         of the skin.
         """
-        for body_part in self.body_parts:
-            for xyz_coord, face_id, color in body_part.enumerate_color():
-                offset = (
-                    body_part.model_origin[0] + xyz_coord[0],
-                    body_part.model_origin[1] + xyz_coord[1],
-                    body_part.model_origin[2] + xyz_coord[2],
-                )
-                yield offset, body_part.id_, face_id, color
+        table = self.voxel_table()
+        image_color = self.image_color
+        for x, y, z, part, face, image_x, image_y in zip(
+            table.x.tolist(),
+            table.y.tolist(),
+            table.z.tolist(),
+            table.body_part_index.tolist(),
+            table.face_index.tolist(),
+            table.image_x.tolist(),
+            table.image_y.tolist(),
+        ):
+            yield (
+                (x, y, z),
+                BODY_PART_IDS[part],
+                FACE_IDS[face],
+                image_color[image_x, image_y],
+            )
+
+    def voxel_table(self) -> VoxelTable:
+        """
+        Return every mapped voxel face of the skin as columns of arrays, in the
+        same order as `enumerate_color`. See `VoxelTable`.
+        """
+        return VoxelTable(self.image_color, *compile_layout(self.layout).columns)
 
     def get_color(self, x: int, y: int, z: int, face: FaceId) -> ImageColor:
-        # search for the coordinates
-        for bp in self.body_parts:
-            # are we inside or on this body part? origin guaranteed to have min value
-            if (
-                (bp.model_origin[0] <= x < bp.model_origin[0] + bp.shape[0])
-                and (bp.model_origin[1] <= y < bp.model_origin[1] + bp.shape[1])
-                and (bp.model_origin[2] <= z < bp.model_origin[2] + bp.shape[2])
-            ):
-                x_rel = x - bp.model_origin[0]
-                y_rel = y - bp.model_origin[1]
-                z_rel = z - bp.model_origin[2]
-                return bp.get_color(x_rel, y_rel, z_rel, face)
+        x_shape, y_shape, z_shape = self.shape
+        if 0 <= x < x_shape and 0 <= y < y_shape and 0 <= z < z_shape:
+            voxel_index = compile_layout(self.layout).voxel_index
+            image_x, image_y = voxel_index[x, y, z, _FACE_INDEX[face]].tolist()
+            if image_x != UNMAPPED:
+                return self.image_color[image_x, image_y]
 
         raise UnmappedVoxelError((x, y, z, face))
 
     def set_color(self, x: int, y: int, z: int, face: FaceId, color: RGBA):
         self.get_color(x, y, z, face)[:] = color
 
+    def get_colors(
+        self,
+        x: Coords,
+        y: Coords,
+        z: Coords,
+        face: FaceIds,
+        *,
+        mask_unmapped: bool = False,
+    ) -> np.ndarray:
+        """
+        Like `get_color`, but for arrays of coordinates and face ids (or indices
+        into FACE_IDS), which are broadcast together. Returns a copy of the colors
+        with shape (..., 4).
+
+        Unmapped coordinates raise an UnmappedVoxelError, unless `mask_unmapped`
+        is set, in which case a masked array is returned with them masked out.
+        """
+        coords, image_x, image_y, mapped = self._resolve(x, y, z, face)
+        _check_mapped(mapped, coords, mask_unmapped)
+        colors = self.image_color[image_x, image_y]
+        return _gathered(colors, mapped, mask_unmapped)
+
+    def set_colors(
+        self,
+        x: Coords,
+        y: Coords,
+        z: Coords,
+        face: FaceIds,
+        colors: ImageColor | RGBA,
+        *,
+        mask_unmapped: bool = False,
+    ):
+        """
+        Like `set_color`, but for arrays of coordinates and face ids (or indices
+        into FACE_IDS), which are broadcast together. `colors` is either one
+        color per coordinate or a single color.
+
+        Unmapped coordinates raise an UnmappedVoxelError before anything is
+        written, unless `mask_unmapped` is set, in which case they're skipped.
+        """
+        coords, image_x, image_y, mapped = self._resolve(x, y, z, face)
+        _check_mapped(mapped, coords, mask_unmapped)
+        colors_arr = _as_colors(colors, mapped.shape)
+        self.image_color[image_x[mapped], image_y[mapped]] = colors_arr[mapped]
+
+    def _resolve(
+        self, x: Coords, y: Coords, z: Coords, face: FaceIds
+    ) -> tuple[tuple[np.ndarray, ...], np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Broadcast the coordinates, and look up their image coordinates. Unmapped
+        coordinates get image coordinates (0, 0) and are False in the returned
+        mask.
+        """
+        x_arr, y_arr, z_arr, face_arr = np.broadcast_arrays(
+            np.asarray(x, dtype=np.intp),
+            np.asarray(y, dtype=np.intp),
+            np.asarray(z, dtype=np.intp),
+            _face_indices(face),
+        )
+        x_shape, y_shape, z_shape = self.shape
+        in_bounds = (
+            (0 <= x_arr)
+            & (x_arr < x_shape)
+            & (0 <= y_arr)
+            & (y_arr < y_shape)
+            & (0 <= z_arr)
+            & (z_arr < z_shape)
+            & (0 <= face_arr)
+            & (face_arr < len(FACE_IDS))
+        )
+        image_xy = np.zeros(x_arr.shape + (2,), dtype=np.intp)
+        image_xy[in_bounds] = compile_layout(self.layout).voxel_index[
+            x_arr[in_bounds], y_arr[in_bounds], z_arr[in_bounds], face_arr[in_bounds]
+        ]
+        mapped = in_bounds & (image_xy[..., 0] != UNMAPPED)
+        image_xy[~mapped] = 0
+        return (
+            (x_arr, y_arr, z_arr, face_arr),
+            image_xy[..., 0],
+            image_xy[..., 1],
+            mapped,
+        )
+
+    def get_iso_polys(
+        self, perspective: Projection, cull_transparent: bool = False
+    ) -> list[Polygon]:
+        """
+        Return the polygons of an isometric render of the skin, in draw order and
+        in output image coordinates.
+
+        Only polygons that can reach the output are returned: faces hidden by
+        other body parts or always painted over are culled once per perspective.
+        With `cull_transparent`, fully transparent texels are left out instead,
+        and the faces behind them, which would be culled, show through.
+        """
+        return get_render_plan(perspective, layout=self.layout).polygons(
+            self.image_color, cull_transparent=cull_transparent
+        )
+
     def to_image(self) -> Image.Image:
         """
-        Convert the skin to an image. The image will be 64x64 pixels.
+        Convert the skin to an image, the size of the layout's image (64x64 pixels
+        for classic skins).
 
         The image data is copied into the image, so modifying the skin after
         creating the image will not affect the image, and vice versa.
@@ -515,34 +946,279 @@ class Skin:
         image = Image.fromarray(image_arr, mode="RGBA")  # type: ignore
         return image
 
-    def to_isometric_image(
+    def to_array(
         self,
-        perspective: Perspective,
+        row_major: bool = True,
+        out: np.ndarray[tuple[int, int, int], np.dtype[np.uint8]] | None = None,
+    ) -> np.ndarray[tuple[int, int, int], np.dtype[np.uint8]]:
+        """
+        Return a copy of the skin's pixels, as the (height, width, 4) rows of
+        pixels of `to_image`, or with `row_major` off, as the (width, height, 4)
+        array indexed [x, y] of `image_color`.
+
+        With `out`, a uint8 array of that shape, the pixels are copied into it
+        instead, and it's returned.
+        """
+        pixels = np.swapaxes(self.image_color, 0, 1) if row_major else self.image_color
+        if out is None:
+            return pixels.copy()
+        if out.dtype != np.uint8 or out.shape != pixels.shape:
+            raise ValueError(
+                f"Output array must be uint8 with shape {pixels.shape}, but got "
+                f"{out.dtype} with shape {out.shape}"
+            )
+        np.copyto(out, pixels)
+        return out
+
+    def to_flat_view(
+        self,
+        face_id: FaceId,
+        scale: int = 1,
+        overlay: bool = True,
         background_color: tuple[int, int, int, int] | None = None,
+        body_parts: Iterable[BodyPartId] | None = None,
+        cache: RenderCache | None = None,
     ) -> Image.Image:
-        origin = (
-            0 if perspective.x == "left" else self.shape[0] - 1,
-            0 if perspective.y == "front" else self.shape[1] - 1,
-            0 if perspective.z == "down" else self.shape[2] - 1,
+        """
+        Render the skin seen straight on from one side, like a front or back view
+        of the whole body, with each texel upscaled to `scale` x `scale` pixels.
+        Pass `body_parts` to show only some of them, e.g. the head, torso and arms
+        for a bust. The image is just big enough to contain them.
+
+        With `overlay`, the overlay (second layer) is alpha-composited over the
+        body parts, flat on their faces.
+
+        This doesn't go through polygons at all: the view is compiled once per
+        layout (see `skinpy.flat.get_flat_view`), so a render is a couple of
+        array lookups, many times faster than an isometric one.
+
+        Pass a `cache` to reuse earlier renders of the same skin (see
+        `skinpy.cache.RenderCache`).
+        """
+        if scale < 1:
+            raise ValueError(f"Scale must be at least 1, but got {scale}")
+        view = get_flat_view(face_id, self.layout, body_parts)
+        width, height = view.size
+        return self._render_cached(
+            cache,
+            ("flat", face_id, view.body_part_ids, scale, overlay, background_color),
+            lambda: view.render(
+                self.image_color,
+                size=(width * scale, height * scale),
+                overlay=overlay,
+                background_color=background_color,
+            ),
         )
 
-        def dist_to_origin(body_part: BodyPart) -> float:
-            return float(
-                np.linalg.norm(np.array(body_part.model_origin) - np.array(origin))
-            )
+    def to_head_avatar(
+        self,
+        size: int,
+        overlay: bool = True,
+        background_color: tuple[int, int, int, int] | None = None,
+        cache: RenderCache | None = None,
+    ) -> Image.Image:
+        """
+        Render the front of the head as a square avatar of `size` x `size`
+        pixels, with the hat composited over it if `overlay` is set. Texels are
+        upscaled with nearest-neighbor sampling, so multiples of the head's size
+        (8 pixels for classic skins) are sharpest. See `to_flat_view` for
+        `cache`.
+        """
+        return self._render_cached(
+            cache,
+            ("avatar", size, overlay, background_color),
+            lambda: get_flat_view("front", self.layout, ("head",)).render(
+                self.image_color,
+                size=(size, size),
+                overlay=overlay,
+                background_color=background_color,
+            ),
+        )
 
-        # sort the body parts by distance to the origin, furthest first.
-        # this is the painter's algorithm: draw the furthest away first, then
-        # one closer, and so on, until the closest is drawn last.
-        parts = sorted(self.body_parts, key=dist_to_origin, reverse=True)
+    def to_isometric_image(
+        self,
+        perspective: Projection,
+        background_color: tuple[int, int, int, int] | None = None,
+        backend: RenderBackend = "imagedraw",
+        depth_test: bool = False,
+        overlay: bool = False,
+        cache: RenderCache | None = None,
+    ) -> Image.Image:
+        """
+        Render the skin to an isometric image from the given perspective, or
+        from any angle with a `skinpy.render.Camera`.
 
-        polys: list[Polygon] = []
-        for part in parts:
-            for poly in part.get_iso_polys(perspective):
-                offset = perspective.map_iso(*part.model_origin)
-                polys.append(poly.with_offset(offset))
+        The geometry of the render is compiled once per perspective (see
+        `skinpy.plan.get_render_plan`), so repeated renders only pay for
+        gathering colors and rasterizing. With the "numpy" backend, rasterizing
+        is a single array lookup.
 
-        return render_isometric(
-            polys=polys,
+        Body parts are painted furthest first. Set `depth_test` (with the "numpy"
+        backend) to have the surface nearest the viewer win each pixel instead.
+
+        With `overlay`, the overlay (second layer) is alpha-composited over the
+        body parts, as a shell around each of them. This makes the image a little
+        bigger, to fit the shells.
+
+        Pass a `cache` to reuse earlier renders of the same skin, from any `Skin`
+        with the same colors (see `skinpy.cache.RenderCache`).
+        """
+        plan = get_render_plan(perspective, overlay=overlay, layout=self.layout)
+        return self._render_cached(
+            cache,
+            ("isometric", perspective, background_color, backend, depth_test, overlay),
+            lambda: plan.render(
+                self.image_color,
+                background_color=background_color,
+                backend=backend,
+                depth_test=depth_test,
+            ),
+        )
+
+    def to_isometric_array(
+        self,
+        perspective: Projection,
+        background_color: tuple[int, int, int, int] | None = None,
+        depth_test: bool = False,
+        overlay: bool = False,
+        out: np.ndarray[tuple[int, int, int], np.dtype[np.uint8]] | None = None,
+    ) -> np.ndarray[tuple[int, int, int], np.dtype[np.uint8]]:
+        """
+        Render the skin like `to_isometric_image` with the "numpy" backend, but
+        to a (height, width, 4) array, without a Pillow image.
+
+        With `out`, a uint8 array of that shape (see `skinpy.plan.RenderPlan.shape`),
+        like a slice of a preallocated batch, the render is written into it
+        instead, and it's returned.
+        """
+        plan = get_render_plan(perspective, overlay=overlay, layout=self.layout)
+        return plan.render_array(
+            self.image_color,
             background_color=background_color,
+            depth_test=depth_test,
+            out=out,
         )
+
+    def render_animation(
+        self,
+        output: StrPath | BinaryIO,
+        views: Projection | Sequence[Projection] | None = None,
+        highlight: bool = False,
+        overlay: bool = False,
+        background_color: tuple[int, int, int, int] | None = None,
+        depth_test: bool = True,
+        format: AnimationFormat | None = None,
+        duration: int = 100,
+        loop: int = 0,
+    ) -> int:
+        """
+        Render the skin as an animated GIF, APNG or WebP, and return the number
+        of frames written.
+
+        Each of `views` is a frame, and they default to a turntable of cameras
+        around the model (see `skinpy.animation.turntable`). With `highlight`,
+        `views` is one perspective, and each frame highlights one of the texels
+        it shows instead (see `skinpy.animation.highlight_frames`).
+
+        Frames are rendered and encoded one at a time, as the difference from
+        the frame before, so long animations don't take more memory (see
+        `skinpy.animation.write_animation` for `output`, `format`, `duration`
+        and `loop`).
+        """
+        from skinpy.animation import (
+            highlight_frames,
+            turntable,
+            view_frames,
+            write_animation,
+        )
+
+        if highlight:
+            if not isinstance(views, Projection):
+                raise ValueError("Highlighting texels needs one perspective")
+            frames = highlight_frames(
+                self,
+                views,
+                overlay=overlay,
+                background_color=background_color,
+                depth_test=depth_test,
+            )
+        else:
+            if views is None:
+                views = turntable()
+            elif isinstance(views, Projection):
+                views = [views]
+            frames = view_frames(
+                self,
+                views,
+                overlay=overlay,
+                background_color=background_color,
+                depth_test=depth_test,
+            )
+        return write_animation(
+            frames, output, format=format, duration=duration, loop=loop
+        )
+
+    def _render_cached(
+        self,
+        cache: RenderCache | None,
+        options: tuple,
+        render: Callable[[], Image.Image],
+    ) -> Image.Image:
+        if cache is None:
+            return render()
+        return cache.get_or_render(self.image_color, (*options, self.layout), render)
+
+
+@frozen
+class VoxelTable:
+    """
+    Every mapped voxel face of a skin, as columns of arrays. Row i of each
+    column describes the same voxel face:
+
+    - x, y, z: coordinates of the voxel on the skin
+    - body_part_index: index into BODY_PART_IDS
+    - face_index: index into FACE_IDS
+    - image_x, image_y: coordinates of the pixel in `image_color`
+
+    These columns are the same for every skin of a layout, so they're computed
+    once per layout and shared (see `skinpy.layout.compile_layout`). They are
+    read-only.
+
+    `colors` reads the current colors of every row from the skin, into a
+    read-only copy, so that writes to it raise instead of being lost. To write
+    colors, index `image_color` with the image coordinates, e.g.
+    `table.image_color[table.image_x, table.image_y] = new_colors`.
+    """
+
+    image_color: ImageColor
+
+    x: np.ndarray[tuple[int], np.dtype[np.intp]]
+    y: np.ndarray[tuple[int], np.dtype[np.intp]]
+    z: np.ndarray[tuple[int], np.dtype[np.intp]]
+    body_part_index: np.ndarray[tuple[int], np.dtype[np.intp]]
+    face_index: np.ndarray[tuple[int], np.dtype[np.intp]]
+    image_x: np.ndarray[tuple[int], np.dtype[np.intp]]
+    image_y: np.ndarray[tuple[int], np.dtype[np.intp]]
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    @property
+    def colors(self) -> np.ndarray[tuple[int, int], np.dtype[np.uint8]]:
+        """
+        The (rows, 4) colors of each row. The rows are scattered over the
+        image, so this can't be a view of it: it's a read-only copy.
+        """
+        colors = self.image_color[self.image_x, self.image_y]
+        colors.flags.writeable = False
+        return colors
+
+
+def _layout_for_image_size(size: tuple[int, ...]) -> SkinLayout:
+    if size == (64, 64):
+        # most skins, without the cache lookup
+        return CLASSIC_LAYOUT
+    try:
+        return layout_for_size(size)  # type: ignore
+    except ValueError as e:
+        raise InputImageException(str(e)) from None
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+import numpy as np
+from attrs import frozen
+
+from skinpy.layout import CLASSIC_LAYOUT, SkinLayout
+from skinpy.plan import get_render_plan
+from skinpy.render import Projection
+from skinpy.skin import Skin
+
+if TYPE_CHECKING:
+    from skinpy.types import StrPath
+
+
+@frozen
+class SkinStack:
+    """
+    Many skins of the same layout stored in one contiguous (N, width, height, 4)
+    uint8 array, indexed the same way as `Skin.image_color` (x, then y, then
+    color).
+
+    Indexing a stack gives a `Skin` whose image colors are a view into the stack,
+    so nothing is copied and edits to the skin show up in the stack.
+    """
+
+    image_color: np.ndarray[tuple[int, int, int, int], np.dtype[np.uint8]]
+
+    layout: SkinLayout = CLASSIC_LAYOUT
+
+    @classmethod
+    def new(cls, count: int, layout: SkinLayout = CLASSIC_LAYOUT) -> SkinStack:
+        """
+        Create a stack of `count` blank skins.
+        """
+        return cls(
+            image_color=np.zeros((count, *layout.image_size, 4), dtype=np.uint8),
+            layout=layout,
+        )
+
+    @classmethod
+    def from_skins(cls, skins: Iterable[Skin]) -> SkinStack:
+        """
+        Create a stack from skins, which must all have the same layout. Their
+        image colors are copied into the stack.
+        """
+        skins = list(skins)
+        layouts = {skin.layout for skin in skins}
+        if len(layouts) > 1:
+            names = ", ".join(sorted(layout.name for layout in layouts))
+            raise ValueError(f"Skins in a stack must share a layout, but got {names}")
+        layout = layouts.pop() if layouts else CLASSIC_LAYOUT
+
+        # not np.stack, which would keep the memory layout of skins that wrap
+        # row-major buffers
+        stack = cls.new(len(skins), layout)
+        for index, skin in enumerate(skins):
+            stack.image_color[index] = skin.image_color
+        return stack
+
+    @classmethod
+    def from_paths(cls, paths: Iterable[StrPath]) -> SkinStack:
+        """
+        Create a stack from image paths.
+        """
+        return cls.from_skins(Skin.from_path(path) for path in paths)
+
+    def __len__(self) -> int:
+        return len(self.image_color)
+
+    def __getitem__(self, index: int) -> Skin:
+        return Skin.new(image_color=self.image_color[index], layout=self.layout)
+
+    def __iter__(self) -> Iterator[Skin]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def render_isometric_batch(
+        self,
+        perspective: Projection,
+        background_color: tuple[int, int, int, int] | None = None,
+        depth_test: bool = False,
+        overlay: bool = False,
+        out: np.ndarray[tuple[int, int, int, int], np.dtype[np.uint8]] | None = None,
+    ) -> np.ndarray[tuple[int, int, int, int], np.dtype[np.uint8]]:
+        """
+        Render every skin in the stack at once, returning an (N, height, width, 4)
+        array of RGBA images, or writing them into `out`, an array of that shape.
+
+        The geometry is the same for every skin, so this gathers the colors of
+        all skins and fills one label image with them, using the same plan as
+        `Skin.to_isometric_image` with the "numpy" backend.
+        """
+        return get_render_plan(
+            perspective, overlay=overlay, layout=self.layout
+        ).render_array(
+            self.image_color,
+            background_color=background_color,
+            depth_test=depth_test,
+            out=out,
+        )
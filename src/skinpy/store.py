@@ -0,0 +1,473 @@
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import struct
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator, Optional
+
+import numpy as np
+from attrs import evolve, frozen
+
+from skinpy.exception import SkinStoreError
+from skinpy.layout import CLASSIC_LAYOUT, SLIM_LAYOUT
+from skinpy.skin import Skin
+from skinpy.stack import SkinStack
+
+if TYPE_CHECKING:
+    from skinpy.layout import SkinLayout
+    from skinpy.types import StrPath
+
+logger = logging.getLogger(__name__)
+
+# A skin store is one file:
+#
+# - a header, padded to HEADER_SIZE bytes so that the payload is page aligned
+# - the payload: an (N, 64, 64, 4) uint8 array of image colors, laid out like
+#   `SkinStack.image_color` (x, then y, then color)
+# - the layout table: the index in STORE_LAYOUTS of the layout of every skin,
+#   one byte each, in payload order
+# - optionally, the id index: the UTF-8 id of every skin, in payload order,
+#   separated by newlines
+#
+# Version 1 stores have no layout table, and all their skins are classic.
+MAGIC = b"SKINPYST"
+VERSION = 2
+HEADER_SIZE = 4096
+# magic, version, flags, count, layout table offset, index offset, index length
+HEADER_FORMAT = "<8sIIQQQQ"
+# version 1 headers have no layout table offset
+V1_HEADER_FORMAT = "<8sIIQQQ"
+SKIN_NBYTES = 64 * 64 * 4
+
+# the layouts that skins in a store can have, which are all 64x64
+STORE_LAYOUTS: tuple[SkinLayout, ...] = (CLASSIC_LAYOUT, SLIM_LAYOUT)
+
+# header flags
+HAS_INDEX = 1
+
+
+@frozen
+class _Header:
+    flags: int
+    count: int
+    # None for version 1 stores, which have no layout table
+    layouts_offset: Optional[int]
+    index_offset: int
+    index_length: int
+
+    @property
+    def has_index(self) -> bool:
+        return bool(self.flags & HAS_INDEX)
+
+    @property
+    def payload_end(self) -> int:
+        return HEADER_SIZE + self.count * SKIN_NBYTES
+
+    @classmethod
+    def read(cls, file: BinaryIO) -> _Header:
+        file.seek(0)
+        raw = file.read(struct.calcsize(HEADER_FORMAT))
+        if len(raw) < struct.calcsize(V1_HEADER_FORMAT):
+            raise SkinStoreError("File is too short to be a skin store")
+        magic, version = struct.unpack_from("<8sI", raw)
+        if magic != MAGIC:
+            raise SkinStoreError("File is not a skin store")
+        if version == 1:
+            _, _, flags, count, index_offset, index_length = struct.unpack_from(
+                V1_HEADER_FORMAT, raw
+            )
+            layouts_offset = None
+        elif version == VERSION and len(raw) == struct.calcsize(HEADER_FORMAT):
+            _, _, flags, count, layouts_offset, index_offset, index_length = (
+                struct.unpack(HEADER_FORMAT, raw)
+            )
+        else:
+            raise SkinStoreError(f"Unsupported skin store version {version}")
+        return cls(
+            flags=flags,
+            count=count,
+            layouts_offset=layouts_offset,
+            index_offset=index_offset,
+            index_length=index_length,
+        )
+
+    def write(self, file: BinaryIO) -> None:
+        # only ever the current version, so stores are upgraded when rewritten
+        assert self.layouts_offset is not None
+        file.seek(0)
+        file.write(
+            struct.pack(
+                HEADER_FORMAT,
+                MAGIC,
+                VERSION,
+                self.flags,
+                self.count,
+                self.layouts_offset,
+                self.index_offset,
+                self.index_length,
+            ).ljust(HEADER_SIZE, b"\0")
+        )
+
+
+@frozen
+class SkinStore:
+    """
+    A file of many skins that is memory-mapped instead of decoded, so reading any
+    skin costs a few page faults instead of a PNG decode.
+
+    Skins from a store are views into the mapped file, like skins from a
+    `SkinStack`. Stores opened with `writable` write edits to those skins back to
+    the file.
+
+    A store can have an id for every skin. Ids don't have to be unique: appending
+    a skin with an id that's already in the store shadows the earlier one, which
+    stays in the file until the store is compacted.
+
+    Every skin keeps its layout, classic or slim (see `STORE_LAYOUTS`). Legacy and
+    HD skins can't be stored.
+    """
+
+    path: Path
+
+    # (N, 64, 64, 4), mapped from the file
+    image_color: np.ndarray[tuple[int, int, int, int], np.dtype[np.uint8]]
+
+    # (N,) index in STORE_LAYOUTS of the layout of every skin
+    layout_ids: np.ndarray[tuple[int], np.dtype[np.uint8]]
+
+    # the id of every skin, in store order, or None if the store has no ids
+    ids: Optional[tuple[str, ...]]
+
+    # the latest row of each id
+    rows_by_id: dict[str, int]
+
+    # whether edits to skins are written to the file
+    writable: bool
+
+    @classmethod
+    def create(
+        cls,
+        path: StrPath,
+        skins: Iterable[Skin] = (),
+        ids: Iterable[str] | None = None,
+    ) -> SkinStore:
+        """
+        Write a new store of `skins` to `path`, replacing any file there, and
+        open it. Pass `ids` to give the store an id index.
+        """
+        _write_store(path, skins, None if ids is None else list(ids))
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: StrPath, writable: bool = False) -> SkinStore:
+        """
+        Open the store at `path`.
+        """
+        path = Path(path)
+        with open(path, "rb") as file:
+            header = _Header.read(file)
+            layout_ids = _read_layout_ids(file, header)
+            ids: tuple[str, ...] | None = None
+            if header.has_index:
+                ids = _read_ids(file, header)
+
+        if header.count == 0:
+            # numpy can't map zero bytes
+            image_color = np.zeros((0, 64, 64, 4), dtype=np.uint8)
+        else:
+            image_color = np.memmap(
+                path,
+                dtype=np.uint8,
+                mode="r+" if writable else "r",
+                offset=HEADER_SIZE,
+                shape=(header.count, 64, 64, 4),
+            )
+
+        return cls(
+            path=path,
+            image_color=image_color,
+            layout_ids=layout_ids,
+            ids=ids,
+            rows_by_id={} if ids is None else {id_: i for i, id_ in enumerate(ids)},
+            writable=writable,
+        )
+
+    def __len__(self) -> int:
+        return len(self.image_color)
+
+    def __getitem__(self, index: int) -> Skin:
+        return Skin.new(
+            image_color=self.image_color[index],
+            layout=STORE_LAYOUTS[self.layout_ids[index]],
+        )
+
+    def __iter__(self) -> Iterator[Skin]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self.rows_by_id
+
+    def get(self, id_: str) -> Skin:
+        """
+        Return the latest skin with the given id. Raises KeyError if there is
+        none.
+        """
+        return self[self.rows_by_id[id_]]
+
+    @property
+    def stack(self) -> SkinStack:
+        """
+        Return a stack that views the whole store, e.g. for
+        `SkinStack.render_isometric_batch`. Skins in a stack share a layout, so
+        this raises SkinStoreError for stores with both classic and slim skins.
+        """
+        layout_ids = np.unique(self.layout_ids)
+        if len(layout_ids) > 1:
+            raise SkinStoreError("Can't stack a store of both classic and slim skins")
+        layout = STORE_LAYOUTS[layout_ids[0]] if len(layout_ids) else CLASSIC_LAYOUT
+        return SkinStack(image_color=self.image_color, layout=layout)
+
+    def append(
+        self, skins: Iterable[Skin], ids: Iterable[str] | None = None
+    ) -> SkinStore:
+        """
+        Append skins to the end of the store's file, and return the store
+        reopened with them. Stores with ids need an id for every skin, and stores
+        without need none.
+
+        Skins already handed out by this store stay valid. If appending fails or
+        is interrupted, the store is left as it was.
+        """
+        _append_store(self.path, skins, None if ids is None else list(ids))
+        return self.open(self.path, writable=self.writable)
+
+    def compact(self, drop_ids: Iterable[str] = ()) -> SkinStore:
+        """
+        Rewrite the store without shadowed skins and without the skins with
+        `drop_ids`, and return it reopened. The new file replaces the old one
+        only once it's complete.
+        """
+        drop = set(drop_ids)
+        if self.ids is None:
+            if drop:
+                raise SkinStoreError("Can't drop ids from a store without ids")
+            rows: list[int] = list(range(len(self)))
+        else:
+            rows = sorted(
+                row for id_, row in self.rows_by_id.items() if id_ not in drop
+            )
+
+        _write_store(
+            self.path,
+            (self[row] for row in rows),
+            None if self.ids is None else [self.ids[row] for row in rows],
+        )
+        return self.open(self.path, writable=self.writable)
+
+
+def _read_layout_ids(
+    file: BinaryIO, header: _Header
+) -> np.ndarray[tuple[int], np.dtype[np.uint8]]:
+    if header.layouts_offset is None:
+        return np.zeros(header.count, dtype=np.uint8)
+    file.seek(header.layouts_offset)
+    layout_ids = np.frombuffer(file.read(header.count), dtype=np.uint8)
+    if len(layout_ids) != header.count:
+        raise SkinStoreError("Layout table is cut short")
+    if header.count and layout_ids.max() >= len(STORE_LAYOUTS):
+        raise SkinStoreError(f"Unknown layout id {layout_ids.max()}")
+    return layout_ids
+
+
+def _read_ids(file: BinaryIO, header: _Header) -> tuple[str, ...]:
+    if header.count == 0:
+        return ()
+    file.seek(header.index_offset)
+    ids = tuple(file.read(header.index_length).decode("utf-8").split("\n"))
+    if len(ids) != header.count:
+        raise SkinStoreError(
+            f"Id index has {len(ids)} ids, but the store has {header.count} skins"
+        )
+    return ids
+
+
+def _write_payload(file: BinaryIO, skins: Iterable[Skin]) -> bytes:
+    """
+    Write the image colors of skins at the current position, returning their
+    layout table.
+    """
+    layout_ids = bytearray()
+    for skin in skins:
+        _check_storable(skin.layout)
+        # skins that wrap row-major buffers are transposed views
+        file.write(np.ascontiguousarray(skin.image_color, dtype=np.uint8).tobytes())
+        layout_ids.append(STORE_LAYOUTS.index(skin.layout))
+    return bytes(layout_ids)
+
+
+def _check_storable(layout: SkinLayout) -> None:
+    if layout not in STORE_LAYOUTS:
+        width, height = layout.image_size
+        raise SkinStoreError(
+            f"Only 64x64 classic and slim skins can be stored, not {layout.name} "
+            f"({width}x{height})"
+        )
+
+
+def _encode_index(ids: list[str] | None) -> bytes:
+    if ids is None:
+        return b""
+    if any("\n" in id_ for id_ in ids):
+        raise SkinStoreError("Ids can't contain newlines")
+    return "\n".join(ids).encode("utf-8")
+
+
+def _finish_store(
+    file: BinaryIO, layout_ids: bytes, index: bytes, has_index: bool
+) -> None:
+    """
+    Write the layout table and id index after a payload of one skin per layout
+    id, then the header, and only then cut off whatever was after the index.
+    """
+    layouts_offset = HEADER_SIZE + len(layout_ids) * SKIN_NBYTES
+    file.seek(layouts_offset)
+    file.write(layout_ids)
+    file.write(index)
+    file.flush()
+    _Header(
+        flags=HAS_INDEX if has_index else 0,
+        count=len(layout_ids),
+        layouts_offset=layouts_offset,
+        index_offset=layouts_offset + len(layout_ids),
+        index_length=len(index),
+    ).write(file)
+    file.flush()
+    file.truncate(layouts_offset + len(layout_ids) + len(index))
+
+
+def _append_store(path: StrPath, skins: Iterable[Skin], ids: list[str] | None) -> None:
+    """
+    Append skins to a store. `ids` is only read once the payload is written, so
+    it can be filled in as `skins` is consumed.
+
+    The new skins are written to a temporary file first, so a bad skin or a
+    wrong number of ids fails before the store is touched. They then go where
+    the layout table and id index are, so those are first copied out of their
+    way and the header pointed at the copies. The header only ever points at a
+    complete table and index, so the store stays readable, with the old skins or
+    the new ones, however the append ends. Version 1 stores are upgraded.
+    """
+    with open(path, "rb") as file:
+        header = _Header.read(file)
+        if (ids is None) == header.has_index:
+            raise SkinStoreError(
+                "Ids must be given if and only if the store has an id index"
+            )
+        old_layout_ids = _read_layout_ids(file, header).tobytes()
+        old_ids = _read_ids(file, header) if header.has_index else ()
+        file.seek(header.index_offset)
+        old_index = file.read(header.index_length)
+
+    with tempfile.TemporaryFile(dir=Path(path).parent) as staged:
+        layout_ids = _write_payload(staged, skins)
+        if ids is not None and len(ids) != len(layout_ids):
+            raise SkinStoreError(f"Got {len(ids)} ids for {len(layout_ids)} skins")
+        index = _encode_index(None if ids is None else [*old_ids, *ids])
+        new_end = (
+            header.payload_end
+            + len(layout_ids) * SKIN_NBYTES
+            + len(old_layout_ids)
+            + len(layout_ids)
+            + len(index)
+        )
+
+        with open(path, "r+b") as file:
+            if old_layout_ids or old_index:
+                # past the new skins, layout table and index, so that none of
+                # them overwrites it
+                moved_offset = max(file.seek(0, os.SEEK_END), new_end)
+                file.seek(moved_offset)
+                file.write(old_layout_ids)
+                file.write(old_index)
+                file.flush()
+                evolve(
+                    header,
+                    layouts_offset=moved_offset,
+                    index_offset=moved_offset + len(old_layout_ids),
+                ).write(file)
+                file.flush()
+
+            staged.seek(0)
+            file.seek(header.payload_end)
+            shutil.copyfileobj(staged, file)
+            _finish_store(file, old_layout_ids + layout_ids, index, header.has_index)
+
+
+def _write_store(path: StrPath, skins: Iterable[Skin], ids: list[str] | None) -> None:
+    """
+    Write a new store. Like with `_append_store`, `ids` is only read once the
+    payload is written. The store is written next to `path`, and replaces any
+    file there only once it's complete.
+    """
+    path = Path(path)
+    temp_path = path.with_name(path.name + ".writing")
+    try:
+        with open(temp_path, "w+b") as file:
+            # placeholder header until the count is known
+            file.write(b"\0" * HEADER_SIZE)
+            layout_ids = _write_payload(file, skins)
+            if ids is not None and len(ids) != len(layout_ids):
+                raise SkinStoreError(f"Got {len(ids)} ids for {len(layout_ids)} skins")
+            _finish_store(file, layout_ids, _encode_index(ids), ids is not None)
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+
+def pack_store(
+    path: StrPath,
+    skin_paths: Iterable[Path],
+    with_ids: bool = True,
+    append: bool = False,
+    layout: SkinLayout | None = None,
+) -> tuple[SkinStore, list[tuple[Path, str]]]:
+    """
+    Decode image files into a store at `path`, streaming them so that only one
+    is in memory at a time. Each skin's id is the stem of its file name, and
+    its layout is `layout` (see `Skin.from_image`), so pass `SLIM_LAYOUT` to
+    pack slim skins.
+
+    With `append`, the skins are added to the existing store at `path` instead
+    of replacing it, or to a new one if there's none yet.
+
+    Files that can't be loaded, and legacy (64x32) and HD skins, which don't fit
+    the store, are logged and skipped. Returns the store and the (path, error
+    message) of each of those files.
+    """
+    ids: list[str] | None = [] if with_ids else None
+    failures: list[tuple[Path, str]] = []
+
+    def skins() -> Iterator[Skin]:
+        for skin_path in skin_paths:
+            try:
+                skin = Skin.from_path(skin_path, layout=layout)
+                _check_storable(skin.layout)
+            except Exception as e:
+                message = f"{type(e).__name__}: {e}"
+                logger.warning("Skipped %s (%s)", skin_path, message)
+                failures.append((skin_path, message))
+                continue
+            if ids is not None:
+                ids.append(skin_path.stem)
+            yield skin
+
+    if append and Path(path).exists():
+        _append_store(path, skins(), ids)
+    else:
+        _write_store(path, skins(), ids)
+    return SkinStore.open(path), failures
@@ -1,4 +1,4 @@
-from typing import Literal, Union, TypeAlias
+from typing import Literal, Sequence, Union, TypeAlias
 from pathlib import Path
 
 import numpy as np
@@ -21,9 +21,26 @@ YFaceId: TypeAlias = Literal["front", "back"]
 ZFaceId: TypeAlias = Literal["up", "down"]
 FaceId: TypeAlias = Union[XFaceId, YFaceId, ZFaceId]
 
+# many coordinates at once, for bulk operations
+Coords: TypeAlias = Union[int, Sequence[int], np.ndarray]
+
+# many face identifiers at once, either as FaceIds or as indices into FACE_IDS
+FaceIds: TypeAlias = Union[FaceId, int, Sequence[FaceId], Sequence[int], np.ndarray]
+
 # body part names
 BodyPartId: TypeAlias = Literal["head", "torso", "left_arm", "right_arm", "left_leg", "right_leg"]
 
+# the order of the ids above when they're stored as integers, e.g. in arrays
+FACE_IDS: tuple[FaceId, ...] = ("up", "down", "left", "right", "front", "back")
+BODY_PART_IDS: tuple[BodyPartId, ...] = (
+    "head",
+    "torso",
+    "left_arm",
+    "right_arm",
+    "left_leg",
+    "right_leg",
+)
+
 PolygonPoints: TypeAlias = tuple[
     tuple[int, int],
     tuple[int, int],
@@ -32,3 +49,15 @@ PolygonPoints: TypeAlias = tuple[
 ]
 
 StrPath: TypeAlias = Union[str, Path]
+
+# how polygons are rasterized
+RenderBackend: TypeAlias = Literal["imagedraw", "numpy"]
+
+# how animations are encoded
+AnimationFormat: TypeAlias = Literal["gif", "apng", "webp"]
+
+# how images are encoded
+ImageFormat: TypeAlias = Literal["png", "webp", "raw"]
+
+# how zlib compresses the rows of a png
+PngStrategy: TypeAlias = Literal["default", "filtered", "huffman", "rle", "fixed"]
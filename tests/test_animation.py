@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import io
+import struct
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image, ImageSequence
+
+from skinpy import Camera, Perspective, Skin
+from skinpy.animation import (
+    _png_chunks,
+    highlight_frames,
+    turntable,
+    view_frames,
+    write_animation,
+)
+
+from tests.test_skin import LAB_PATH, STEVE_PATH
+
+PERSPECTIVE = Perspective(x="left", y="front", z="up", scaling_factor=2)
+
+
+class Unseekable(io.RawIOBase):
+    def __init__(self) -> None:
+        self.buffer = io.BytesIO()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        return self.buffer.write(data)
+
+
+def decode(data: bytes) -> tuple[list[np.ndarray], list[int]]:
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(Image.open(io.BytesIO(data))):
+        # converting loads the frame, which some formats need for its duration
+        frames.append(np.array(frame.convert("RGBA")))
+        durations.append(int(frame.info["duration"]))
+    return frames, durations
+
+
+def assert_frame_equal(actual: np.ndarray, expected: np.ndarray, format: str):
+    if format == "gif":
+        # gif has no partial alpha, and transparent pixels have no color
+        shown = expected[..., 3] >= 128
+        assert np.array_equal(actual[..., 3] > 0, shown)
+        assert np.array_equal(actual[shown], expected[shown])
+    else:
+        shown = expected[..., 3] > 0
+        assert np.array_equal(actual[shown], expected[shown])
+        assert not actual[~shown, 3].any()
+
+
+@pytest.mark.parametrize("format", ["gif", "apng", "webp"])
+def test_turntable(format: str):
+    # steve has few enough colors for gif not to quantize them
+    skin = Skin.from_path(STEVE_PATH)
+    expected = list(view_frames(skin, turntable(6, scaling_factor=2), overlay=True))
+    output = io.BytesIO()
+    assert write_animation(iter(expected), output, format=format, duration=50) == 6
+
+    frames, durations = decode(output.getvalue())
+    assert len(frames) == 6 and durations == [50] * 6
+    for actual, frame in zip(frames, expected):
+        assert_frame_equal(actual, frame, format)
+
+
+def test_view_frames():
+    skin = Skin.from_path(LAB_PATH)
+    views = [Camera(yaw=yaw, scaling_factor=2) for yaw in (0, 45, 90)]
+    frames = list(view_frames(skin, views, overlay=True))
+    assert len({frame.shape for frame in frames}) == 1
+
+    # every frame is the whole render, with the model's center in one place
+    for frame, view in zip(frames, views):
+        render = np.array(skin.to_isometric_image(view, backend="numpy", overlay=True))
+        rows, columns = np.nonzero(frame[..., 3])
+        top, left = rows.min(), columns.min()
+        rows, columns = np.nonzero(render[..., 3])
+        render = render[rows.min() : rows.max() + 1, columns.min() : columns.max() + 1]
+        height, width = render.shape[:2]
+        assert np.array_equal(frame[top : top + height, left : left + width], render)
+        assert frame[..., 3].sum() == render[..., 3].sum()
+
+    # the torso's vertical center line is at the same column from the front and
+    # from the side
+    front, _, side = (np.flatnonzero(frame[..., 3].any(axis=0)) for frame in frames)
+    assert abs((front[0] + front[-1]) - (side[0] + side[-1])) <= 2
+
+
+@pytest.mark.parametrize("format", ["gif", "apng", "webp"])
+def test_highlight(format: str):
+    skin = Skin.from_path(STEVE_PATH)
+    before = skin.image_color.copy()
+    texels = [(8, 8), (9, 8), (20, 20), (20, 20), (44, 20)]
+    frames = list(highlight_frames(skin, PERSPECTIVE, texels=texels))
+    assert np.array_equal(skin.image_color, before)
+
+    for frame, (x, y) in zip(frames, texels):
+        expected_skin = Skin.from_path(STEVE_PATH)
+        expected_skin.image_color[x, y, :3] = 255 - expected_skin.image_color[x, y, :3]
+        expected = expected_skin.to_isometric_image(PERSPECTIVE, backend="numpy")
+        assert np.array_equal(frame, np.array(expected))
+
+    output = io.BytesIO()
+    # repeated frames are shown for longer instead
+    assert write_animation(frames, output, format=format) == 4
+    decoded, durations = decode(output.getvalue())
+    assert durations == [100, 100, 200, 100]
+    for actual, expected in zip(decoded, frames[:3] + frames[4:]):
+        assert_frame_equal(actual, expected, format)
+
+
+def test_highlight_shown_texels():
+    skin = Skin.from_path(STEVE_PATH)
+    perspective = Perspective(x="left", y="front", z="up", scaling_factor=1)
+    # every default texel can be seen
+    for depth_test in (False, True):
+        base = np.array(
+            skin.to_isometric_image(perspective, backend="numpy", depth_test=depth_test)
+        )
+        for frame in highlight_frames(
+            skin, perspective, color=(255, 0, 255, 255), depth_test=depth_test
+        ):
+            assert not np.array_equal(frame, base)
+
+
+def test_deltas_are_cropped():
+    skin = Skin.from_path(STEVE_PATH)
+    frames = highlight_frames(skin, PERSPECTIVE, texels=[(8, 8), (9, 8)])
+    output = io.BytesIO()
+    write_animation(frames, output, format="apng")
+
+    sizes = [
+        struct.unpack(">II", data[4:12])
+        for data in _png_chunks(output.getvalue(), b"fcTL")
+    ]
+    width, height = skin.to_isometric_image(PERSPECTIVE).size
+    assert sizes[0] == (width, height)
+    # the second frame restores the first texel and highlights the one next to it
+    assert sizes[1][0] * sizes[1][1] < 50
+
+
+@pytest.mark.parametrize("format", ["apng", "webp"])
+def test_unseekable_output(format: str):
+    skin = Skin.from_path(STEVE_PATH)
+    expected = list(view_frames(skin, turntable(3, scaling_factor=1), overlay=True))
+    output = Unseekable()
+    write_animation(expected, output, format=format)
+
+    frames, _ = decode(output.buffer.getvalue())
+    assert len(frames) == 3
+    for actual, frame in zip(frames, expected):
+        assert_frame_equal(actual, frame, format)
+
+
+def test_render_animation(tmp_path: Path):
+    skin = Skin.from_path(STEVE_PATH)
+    path = tmp_path / "turntable.webp"
+    views = turntable(4, scaling_factor=1)
+    assert skin.render_animation(path, views) == 4
+    frames, _ = decode(path.read_bytes())
+    for actual, expected in zip(frames, view_frames(skin, views, depth_test=True)):
+        assert_frame_equal(actual, expected, "webp")
+
+    path = tmp_path / "highlight.gif"
+    assert skin.render_animation(path, PERSPECTIVE, highlight=True) > 100
+    with pytest.raises(ValueError):
+        skin.render_animation(path, views, highlight=True)
+
+
+def test_errors(tmp_path: Path):
+    frame = np.zeros((4, 4, 4), dtype=np.uint8)
+    with pytest.raises(ValueError):
+        write_animation([], tmp_path / "empty.gif")
+    with pytest.raises(ValueError):
+        write_animation([frame], tmp_path / "animation.bmp")
+    with pytest.raises(ValueError):
+        write_animation([frame], io.BytesIO())
+    with pytest.raises(ValueError):
+        write_animation(
+            [frame, np.zeros((4, 5, 4), dtype=np.uint8)], io.BytesIO(), "gif"
+        )
+    with pytest.raises(ValueError):
+        turntable(0)
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from attrs import evolve
+from click.testing import CliRunner
+
+from benchmarks.__main__ import main
+from benchmarks.cases import PERSPECTIVES, all_benchmarks
+from benchmarks.harness import (
+    Benchmark,
+    compare,
+    load_results,
+    measure,
+    save_results,
+)
+
+
+def test_cases():
+    benchmarks = all_benchmarks()
+    assert len({benchmark.name for benchmark in benchmarks}) == len(benchmarks)
+    assert {benchmark.group for benchmark in benchmarks} == {
+        "load",
+        "lookup",
+        "enumerate",
+        "render",
+        "encode",
+    }
+    assert len(PERSPECTIVES) == 8
+    assert len(all_benchmarks(quick=True)) < len(benchmarks)
+
+    # the cheap ones all run
+    for benchmark in benchmarks:
+        if benchmark.group not in ("render", "encode"):
+            benchmark.setup()()
+
+    encode = next(b for b in benchmarks if b.name.startswith("encode.raw[steve"))
+    result = measure(encode, min_time=0.001, repeats=1)
+    assert result.output_bytes is not None and result.output_bytes > 0
+
+
+def test_measure(tmp_path: Path):
+    benchmark = Benchmark(
+        "allocate", "load", lambda: lambda: bytearray(100_000), {"size": 100_000}
+    )
+    result = measure(benchmark, min_time=0.001, repeats=2)
+    assert result.number >= 1 and result.repeats == 2
+    assert result.output_bytes is None
+    assert 0 < result.min_seconds <= result.median_seconds
+    assert result.peak_bytes >= 100_000
+    assert result.allocated_bytes >= 100_000 and result.allocated_blocks >= 1
+
+    path = tmp_path / "results.json"
+    save_results(path, [result])
+    assert load_results(path) == [result]
+    assert json.loads(path.read_text())["environment"]["numpy"]
+
+
+def test_compare():
+    result = measure(Benchmark("noop", "load", lambda: lambda: None), min_time=0.001)
+    slower = evolve(result, min_seconds=result.min_seconds * 1.5)
+    bigger = evolve(result, peak_bytes=result.peak_bytes + 1_000_000)
+
+    (comparison,) = compare([slower], [result, evolve(result, name="other")])
+    assert comparison.regressions(0.6) == []
+    assert comparison.regressions(0.1) == ["time"]
+    (comparison,) = compare([bigger], [result])
+    assert comparison.regressions(0.1) == ["peak memory"]
+    (comparison,) = compare(
+        [evolve(result, output_bytes=1200)], [evolve(result, output_bytes=1000)]
+    )
+    assert comparison.regressions(0.1) == ["output size"]
+    # small changes in memory are noise
+    (comparison,) = compare(
+        [evolve(result, peak_bytes=result.peak_bytes + 100)], [result]
+    )
+    assert comparison.peak_ratio is None
+
+
+def test_command(tmp_path: Path):
+    output = tmp_path / "latest.json"
+    baseline = tmp_path / "baseline.json"
+    args = ["-k", "lookup.face.*", "--quick", "--min-time", "0.001"]
+    args += ["-o", str(output), "-b", str(baseline)]
+
+    result = CliRunner().invoke(main, [*args, "--save-baseline"])
+    assert result.exit_code == 0, result.output
+    assert len(load_results(baseline)) == 2
+
+    # a baseline much faster than anything can be
+    data = json.loads(baseline.read_text())
+    for entry in data["results"]:
+        entry["min_seconds"] /= 1000
+    baseline.write_text(json.dumps(data))
+    result = CliRunner().invoke(main, args)
+    assert result.exit_code == 1
+    assert "REGRESSED: time" in result.output
+
+    result = CliRunner().invoke(main, ["-k", "nothing"])
+    assert result.exit_code != 0
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+from click.testing import CliRunner
+from PIL import Image
+
+from skinpy import Perspective, RenderCache, Skin
+from skinpy.__main__ import cli
+from skinpy.cache import render_key
+
+from tests.test_skin import LAB_PATH, STEVE_PATH
+
+PERSPECTIVE = Perspective(x="left", y="front", z="up", scaling_factor=2)
+
+
+def test_memory_tier():
+    cache = RenderCache(max_entries=2)
+    skin = Skin.from_path(LAB_PATH)
+    expected = np.array(skin.to_isometric_image(PERSPECTIVE, overlay=True))
+
+    first = skin.to_isometric_image(PERSPECTIVE, overlay=True, cache=cache)
+    assert np.array_equal(np.array(first), expected)
+    assert cache.stats.misses == 1
+
+    # a copy of the skin, laid out column-major instead of row-major, is the same
+    # skin
+    copy = Skin.new(skin.image_color.copy())
+    second = copy.to_isometric_image(PERSPECTIVE, overlay=True, cache=cache)
+    assert np.array_equal(np.array(second), expected)
+    assert cache.stats.memory_hits == 1
+
+    # editing a returned image doesn't touch the cached one
+    second.putpixel((0, 0), (1, 2, 3, 4))
+    third = skin.to_isometric_image(PERSPECTIVE, overlay=True, cache=cache)
+    assert np.array_equal(np.array(third), expected)
+
+    # other options and other colors are other renders
+    skin.to_isometric_image(PERSPECTIVE, cache=cache)
+    skin.set_color(4, 2, 0, "front", (1, 2, 3, 255))
+    skin.to_isometric_image(PERSPECTIVE, overlay=True, cache=cache)
+    stats = cache.stats
+    assert (stats.memory_hits, stats.misses) == (2, 3)
+    assert len(cache) == 2 and stats.memory_evictions == 1
+    assert stats.hit_rate == 2 / 5
+
+
+def test_keys():
+    skin = Skin.from_path(STEVE_PATH)
+    key = render_key(skin.image_color, ("isometric", PERSPECTIVE))
+    assert key == render_key(skin.image_color.copy(), ("isometric", PERSPECTIVE))
+    assert key != render_key(
+        skin.image_color,
+        ("isometric", Perspective(x="right", y="front", z="up", scaling_factor=2)),
+    )
+    # a legacy skin with the same first half isn't the same skin
+    assert render_key(skin.image_color[:, :32], ()) != render_key(
+        skin.image_color[:32], ()
+    )
+
+
+def test_flat_views():
+    cache = RenderCache()
+    skin = Skin.from_path(LAB_PATH)
+    avatar = skin.to_head_avatar(32, cache=cache)
+    assert np.array_equal(
+        np.array(skin.to_head_avatar(32, cache=cache)), np.array(avatar)
+    )
+    skin.to_head_avatar(32, overlay=False, cache=cache)
+    skin.to_flat_view("front", body_parts=["head"], scale=4, cache=cache)
+    skin.to_flat_view("front", body_parts=["head", "torso"], scale=4, cache=cache)
+    assert (cache.stats.memory_hits, cache.stats.misses) == (1, 4)
+
+
+def test_disk_tier(tmp_path: Path):
+    directory = tmp_path / "renders"
+    skins = [Skin.from_path(LAB_PATH), Skin.from_path(STEVE_PATH)]
+    expected = [np.array(skin.to_isometric_image(PERSPECTIVE)) for skin in skins]
+
+    cache = RenderCache(directory=directory)
+    for skin in skins:
+        skin.to_isometric_image(PERSPECTIVE, cache=cache)
+    assert len(list(directory.glob("*.npy"))) == 2
+
+    # a new cache, like in another process, reads what the first one wrote
+    cache = RenderCache(directory=directory)
+    for skin, render in zip(skins, expected):
+        cached = skin.to_isometric_image(PERSPECTIVE, cache=cache)
+        assert np.array_equal(np.array(cached), render)
+    assert (cache.stats.disk_hits, cache.stats.misses) == (2, 0)
+
+    # room for about two renders: the least recently used is evicted
+    size = max(path.stat().st_size for path in directory.glob("*.npy"))
+    cache = RenderCache(directory=directory, max_disk_bytes=size * 2 + size // 2)
+    skins[0].to_isometric_image(PERSPECTIVE, cache=cache)
+    skins[0].to_isometric_image(
+        Perspective(x="right", y="front", z="up", scaling_factor=2), cache=cache
+    )
+    assert cache.stats.disk_evictions == 1
+    assert len(list(directory.glob("*.npy"))) == 2
+
+    cache = RenderCache(directory=directory)
+    for skin in skins:
+        skin.to_isometric_image(PERSPECTIVE, cache=cache)
+    assert (cache.stats.disk_hits, cache.stats.misses) == (1, 1)
+
+    # broken files are misses
+    for path in directory.glob("*.npy"):
+        path.write_bytes(b"garbage")
+    cache = RenderCache(directory=directory)
+    assert np.array_equal(
+        np.array(skins[0].to_isometric_image(PERSPECTIVE, cache=cache)), expected[0]
+    )
+    assert cache.stats.misses == 1
+
+
+def test_cli(tmp_path: Path):
+    cache_dir = tmp_path / "cache"
+    outputs = [tmp_path / "first.png", tmp_path / "second.png"]
+    for output in outputs:
+        result = CliRunner().invoke(
+            cli,
+            [
+                "render",
+                str(STEVE_PATH),
+                "-s",
+                "2",
+                "--cache-dir",
+                str(cache_dir),
+                "-o",
+                str(output),
+            ],
+        )
+        assert result.exit_code == 0, result.output
+    assert len(list(cache_dir.glob("*.npy"))) == 1
+    assert np.array_equal(
+        np.array(Image.open(outputs[0])), np.array(Image.open(outputs[1]))
+    )
+
+
+def test_render_batch(tmp_path: Path):
+    from skinpy.batch import render_batch
+
+    cache_dir = tmp_path / "cache"
+    for jobs in (1, 2):
+        report = render_batch(
+            [STEVE_PATH, LAB_PATH],
+            f"{tmp_path}/{jobs}/{{stem}}.png",
+            PERSPECTIVE,
+            jobs=jobs,
+            cache_dir=cache_dir,
+        )
+        assert report.rendered == 2
+    assert len(list(cache_dir.glob("*.npy"))) == 2
+    for stem in ("steve", "lab"):
+        assert np.array_equal(
+            np.array(Image.open(tmp_path / "1" / f"{stem}.png")),
+            np.array(Image.open(tmp_path / "2" / f"{stem}.png")),
+        )
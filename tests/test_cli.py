@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import io
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+from click.testing import CliRunner
+from PIL import Image
+
+from skinpy import Skin, Perspective, SLIM_LAYOUT
+from skinpy.__main__ import cli
+from skinpy.batch import collect_inputs
+
+from tests.test_skin import LAB_PATH, STEVE_PATH
+
+
+@pytest.fixture
+def skin_dir(tmp_path: Path) -> Path:
+    skins = tmp_path / "skins"
+    (skins / "nested").mkdir(parents=True)
+    shutil.copy(STEVE_PATH, skins / "steve.png")
+    shutil.copy(LAB_PATH, skins / "nested" / "lab.png")
+    (skins / "broken.png").write_text("not a png")
+    return skins
+
+
+def test_collect_inputs(skin_dir: Path):
+    manifest = skin_dir / "manifest.txt"
+    manifest.write_text("# comment\n\nsteve.png\n")
+
+    assert collect_inputs([skin_dir]) == [
+        skin_dir / "broken.png",
+        skin_dir / "nested" / "lab.png",
+        skin_dir / "steve.png",
+    ]
+    assert collect_inputs([str(skin_dir / "s*.png")]) == [skin_dir / "steve.png"]
+    assert collect_inputs([], manifest=manifest) == [skin_dir / "steve.png"]
+
+
+@pytest.mark.parametrize("jobs", (1, 2))
+def test_render_batch(skin_dir: Path, tmp_path: Path, jobs: int):
+    """
+    Test that every good input is rendered to its templated path, and that bad
+    inputs are reported without stopping the run.
+    """
+    out = tmp_path / "out"
+    result = CliRunner().invoke(
+        cli,
+        [
+            "render-batch",
+            str(skin_dir),
+            "-x",
+            "right",
+            "-s",
+            "3",
+            "-o",
+            f"{out}/{{parent}}/{{stem}}-{{x}}-{{scaling_factor}}.png",
+            "-j",
+            str(jobs),
+            "--max-in-flight",
+            "1",
+        ],
+    )
+
+    assert result.exit_code == 1
+    assert "Rendered 2 of 3 skins" in result.output
+    assert "broken.png" in result.output
+
+    perspective = Perspective(x="right", y="front", z="up", scaling_factor=3)
+    for source, rendered in (
+        (STEVE_PATH, out / "skins" / "steve-right-3.png"),
+        (LAB_PATH, out / "nested" / "lab-right-3.png"),
+    ):
+        expected = Skin.from_image(Image.open(source)).to_isometric_image(perspective)
+        assert np.array_equal(np.array(Image.open(rendered)), np.array(expected))
+
+
+def test_render_slim(tmp_path: Path):
+    output = tmp_path / "slim.png"
+    args = ["render", str(STEVE_PATH), "-s", "2", "--slim", "--overlay"]
+    result = CliRunner().invoke(cli, [*args, "-o", str(output)])
+    assert result.exit_code == 0, result.output
+
+    expected = Skin.from_path(STEVE_PATH, layout=SLIM_LAYOUT).to_isometric_image(
+        Perspective(x="left", y="front", z="up", scaling_factor=2), overlay=True
+    )
+    assert np.array_equal(np.array(Image.open(output)), np.array(expected))
+
+
+def test_render_profile(tmp_path: Path):
+    output = tmp_path / "steve.png"
+    result = CliRunner().invoke(
+        cli, ["render", str(STEVE_PATH), "-s", "2", "--profile", "-o", str(output)]
+    )
+    assert result.exit_code == 0, result.output
+    assert output.exists()
+    for stage in ("decode", "rasterize", "encode", "total"):
+        assert stage in result.stderr
+
+
+def test_render_encoding(tmp_path: Path):
+    expected = Skin.from_path(STEVE_PATH).to_isometric_image(
+        Perspective(x="left", y="front", z="up", scaling_factor=2)
+    )
+    args = ["render", str(STEVE_PATH), "-s", "2"]
+
+    result = CliRunner().invoke(cli, [*args, "--palette", "-o", "-"])
+    assert result.exit_code == 0, result.output
+    image = Image.open(io.BytesIO(result.stdout_bytes))
+    assert image.format == "PNG" and image.mode == "P"
+    assert np.array_equal(np.array(image.convert("RGBA")), np.array(expected))
+
+    output = tmp_path / "steve.webp"
+    result = CliRunner().invoke(cli, [*args, "--webp-method", "0", "-o", str(output)])
+    assert result.exit_code == 0, result.output
+    assert Image.open(output).format == "WEBP"
+
+    output = tmp_path / "steve.bin"
+    result = CliRunner().invoke(cli, [*args, "-f", "raw", "-o", str(output)])
+    assert result.exit_code == 0, result.output
+    assert output.read_bytes() == expected.tobytes()
+
+    result = CliRunner().invoke(cli, [*args, "-o", str(tmp_path / "steve.jpg")])
+    assert result.exit_code != 0
+    assert "image format" in result.output
+
+
+def test_animate(tmp_path: Path):
+    output = tmp_path / "turntable.png"
+    result = CliRunner().invoke(
+        cli, ["animate", str(STEVE_PATH), "-s", "1", "-n", "4", "-o", str(output)]
+    )
+    assert result.exit_code == 0, result.output
+
+    image = Image.open(output)
+    assert image.format == "PNG" and image.n_frames == 4
+
+    result = CliRunner().invoke(
+        cli, ["animate", str(STEVE_PATH), "-o", str(tmp_path / "turntable.bmp")]
+    )
+    assert result.exit_code != 0
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import io
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from skinpy import Encoding, Perspective, Skin
+from skinpy.encode import to_palette
+
+from tests.test_skin import LAB_PATH, STEVE_PATH
+
+PERSPECTIVE = Perspective.new(x="left", y="front", z="up", scaling_factor=3)
+
+
+@pytest.fixture(scope="module")
+def render() -> Image.Image:
+    return Skin.from_path(STEVE_PATH).to_isometric_image(PERSPECTIVE, overlay=True)
+
+
+def decode(data: bytes) -> np.ndarray:
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGBA"))
+
+
+@pytest.mark.parametrize(
+    "encoding",
+    [
+        Encoding(),
+        Encoding(compress_level=0),
+        Encoding(compress_level=9, strategy="rle"),
+        Encoding(strategy="filtered"),
+        Encoding(palette=True),
+        Encoding("webp", method=0),
+    ],
+)
+def test_lossless(render: Image.Image, encoding: Encoding):
+    data = encoding.encode(render)
+    assert np.array_equal(decode(data), np.asarray(render))
+
+
+def test_sizes(render: Image.Image):
+    default = Encoding().encode(render)
+    assert default == Encoding.for_path("render.png").encode(render)
+    assert len(Encoding(compress_level=9).encode(render)) < len(default)
+    assert len(Encoding(compress_level=0).encode(render)) > len(default)
+
+    paletted = Encoding(palette=True).encode(render)
+    assert Image.open(io.BytesIO(paletted)).mode == "P"
+    assert len(paletted) < len(default)
+
+
+def test_raw(render: Image.Image):
+    data = Encoding("raw").encode(render)
+    pixels = np.frombuffer(data, np.uint8).reshape(render.height, render.width, 4)
+    assert np.array_equal(pixels, np.asarray(render))
+    assert Encoding("raw").encode(render.convert("RGB"))[3::4] == b"\xff" * (
+        render.width * render.height
+    )
+
+
+def test_palette():
+    # the lab skin renders to more colors than a palette holds
+    image = Skin.from_path(LAB_PATH).to_isometric_image(PERSPECTIVE, overlay=True)
+    pixels = np.asarray(image)
+    assert len(np.unique(pixels.reshape(-1, 4), axis=0)) > 256
+
+    paletted = to_palette(image)
+    assert paletted.mode == "P"
+    # quantized to nearly the same colors
+    error = np.abs(np.asarray(paletted.convert("RGBA"), dtype=np.int_) - pixels)
+    assert error.mean() < 4
+
+
+def test_save(render: Image.Image, tmp_path: Path):
+    path = tmp_path / "render.webp"
+    encoding = Encoding.for_path(path)
+    assert encoding.format == "webp"
+    encoding.save(render, path)
+    out = io.BytesIO()
+    encoding.save(render, out)
+    assert path.read_bytes() == out.getvalue()
+    assert Image.open(path).format == "WEBP"
+
+    assert Encoding.for_path(tmp_path / "render.rgba").format == "raw"
+    assert Encoding.for_path(tmp_path / "render", "png", palette=True).palette
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"format": "jpeg"},
+        {"compress_level": 10},
+        {"strategy": "fast"},
+        {"format": "webp", "palette": True},
+        {"format": "webp", "method": 7},
+    ],
+)
+def test_invalid(kwargs):
+    with pytest.raises(ValueError):
+        Encoding(**kwargs)
+
+
+def test_unknown_suffix():
+    with pytest.raises(ValueError, match="image format"):
+        Encoding.for_path("render.jpg")
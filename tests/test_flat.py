@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import pytest
+
+import numpy as np
+from PIL import Image
+
+from skinpy import (
+    CLASSIC_LAYOUT,
+    LEGACY_LAYOUT,
+    SLIM_LAYOUT,
+    FACE_IDS,
+    Skin,
+    SkinStack,
+    get_flat_view,
+)
+
+from skinpy.flat import RESIZED_LABELS_CACHE_SIZE, _resized_labels
+
+from tests.test_skin import LAB_PATH
+
+
+def random_skin(seed: int = 0) -> Skin:
+    rng = np.random.default_rng(seed)
+    image_color = rng.integers(0, 256, (64, 64, 4), dtype=np.uint8)
+    # a mix of transparent, translucent and opaque texels
+    image_color[..., 3] = rng.choice([0, 128, 255], (64, 64))
+    return Skin.new(image_color)
+
+
+def region(skin: Skin, x: int, y: int, width: int, height: int) -> np.ndarray:
+    # a region of the skin image, row-major like a rendered image
+    return np.swapaxes(skin.image_color[x : x + width, y : y + height], 0, 1)
+
+
+def test_head_avatar():
+    skin = random_skin()
+    face = region(skin, 8, 8, 8, 8)
+    hat = region(skin, 40, 8, 8, 8)
+
+    avatar = np.array(skin.to_head_avatar(8, overlay=False))
+    assert np.array_equal(avatar, face)
+
+    expected = Image.alpha_composite(Image.fromarray(face), Image.fromarray(hat))
+    avatar = np.array(skin.to_head_avatar(8))
+    assert np.array_equal(avatar, np.array(expected))
+
+    # upscaled by repeating texels
+    big = np.array(skin.to_head_avatar(64))
+    assert np.array_equal(big, avatar.repeat(8, axis=0).repeat(8, axis=1))
+    # or sampling them, for other sizes
+    odd = np.array(skin.to_head_avatar(12))
+    assert odd.shape == (12, 12, 4)
+    sampled = np.arange(12) * 8 // 12
+    assert np.array_equal(odd, avatar[sampled][:, sampled])
+
+
+def test_front_and_back():
+    skin = random_skin()
+    front = np.array(skin.to_flat_view("front", overlay=False))
+    back = np.array(skin.to_flat_view("back", overlay=False))
+    assert front.shape == back.shape == (32, 16, 4)
+
+    # (view x, view y, image x, image y, width, height) of each body part's face
+    for view, regions in (
+        (
+            front,
+            [
+                (4, 0, 8, 8, 8, 8),  # head
+                (4, 8, 20, 20, 8, 12),  # torso
+                (0, 8, 44, 20, 4, 12),  # left arm
+                (12, 8, 36, 52, 4, 12),  # right arm
+                (4, 20, 4, 20, 4, 12),  # left leg
+                (8, 20, 20, 52, 4, 12),  # right leg
+            ],
+        ),
+        (
+            back,
+            [
+                (4, 0, 24, 8, 8, 8),
+                (4, 8, 32, 20, 8, 12),
+                (12, 8, 52, 20, 4, 12),
+                (0, 8, 44, 52, 4, 12),
+                (8, 20, 12, 20, 4, 12),
+                (4, 20, 28, 52, 4, 12),
+            ],
+        ),
+    ):
+        covered = np.zeros(view.shape[:2], dtype=np.bool_)
+        for view_x, view_y, x, y, width, height in regions:
+            assert np.array_equal(
+                view[view_y : view_y + height, view_x : view_x + width],
+                region(skin, x, y, width, height),
+            )
+            covered[view_y : view_y + height, view_x : view_x + width] = True
+        # and everywhere else, like beside the head, is transparent
+        assert (view[~covered] == 0).all()
+
+
+def test_sides():
+    skin = random_skin()
+    left = np.array(skin.to_flat_view("left", overlay=False))
+    assert left.shape == (32, 8, 4)
+
+    # the head, then the left arm in front of the torso, then the left leg in
+    # front of the right leg
+    assert np.array_equal(left[0:8, 0:8], region(skin, 0, 8, 8, 8))
+    assert np.array_equal(left[8:20, 2:6], region(skin, 40, 20, 4, 12))
+    assert np.array_equal(left[20:32, 2:6], region(skin, 0, 20, 4, 12))
+
+    right = np.array(skin.to_flat_view("right", overlay=False))
+    assert np.array_equal(right[8:20, 2:6], region(skin, 40, 52, 4, 12))
+
+    up = np.array(skin.to_flat_view("up", overlay=False))
+    assert up.shape == (8, 16, 4)
+    assert np.array_equal(up[:, 4:12], region(skin, 8, 0, 8, 8))
+
+
+@pytest.mark.parametrize("face_id", FACE_IDS)
+def test_overlay(face_id):
+    """
+    Test that the overlay is composited over each texel of the base layer.
+    """
+    skin = random_skin()
+    base = skin.to_flat_view(face_id, overlay=False)
+    overlay_only = Skin.new(skin.image_color.copy())
+    for part in overlay_only.body_parts:
+        part.image_color[:] = 0
+    overlay = overlay_only.to_flat_view(face_id, overlay=True)
+
+    expected = Image.alpha_composite(base, overlay)
+    assert np.array_equal(
+        np.array(skin.to_flat_view(face_id, overlay=True)), np.array(expected)
+    )
+
+
+def test_layouts():
+    skin = Skin.from_path(LAB_PATH, layout=SLIM_LAYOUT)
+    front = np.array(skin.to_flat_view("front", overlay=False))
+    # slim arms leave a column free on either side
+    assert front.shape == (32, 14, 4)
+    assert np.array_equal(front[8:20, 0:3], region(skin, 44, 20, 3, 12))
+
+    legacy = Skin.new(random_skin().image_color[:, :32].copy())
+    assert legacy.layout is LEGACY_LAYOUT
+    front = np.array(legacy.to_flat_view("front"))
+    # right limbs mirror the left ones
+    assert np.array_equal(front[8:20, 12:16], front[8:20, 0:4][:, ::-1])
+    assert np.array_equal(front[20:32, 8:12], front[20:32, 4:8][:, ::-1])
+
+    image = Image.open(LAB_PATH)
+    hd = Skin.from_image(image.resize((128, 128), Image.Resampling.NEAREST))
+    assert np.array_equal(
+        np.array(hd.to_head_avatar(64)),
+        np.array(Skin.from_image(image).to_head_avatar(64)),
+    )
+
+
+def test_batch():
+    skins = [random_skin(seed) for seed in range(3)]
+    stack = SkinStack.from_skins(skins)
+    view = get_flat_view("front")
+    renders = view.render_array(stack.image_color, size=(32, 64))
+    assert renders.shape == (3, 64, 32, 4)
+    for skin, render in zip(skins, renders):
+        assert np.array_equal(render, np.array(skin.to_flat_view("front", scale=2)))
+
+
+def test_view_cache():
+    assert get_flat_view("front", CLASSIC_LAYOUT, ["torso", "head"]) is (
+        get_flat_view("front", CLASSIC_LAYOUT, ("head", "torso"))
+    )
+    assert get_flat_view("front", body_part_ids=["head"]).size == (8, 8)
+    assert get_flat_view("front", body_part_ids=["head", "torso"]).size == (8, 20)
+
+
+def test_resized_labels_cache():
+    """
+    Test that label images resized for sizes that aren't whole multiples are
+    cached, but only so many of them.
+    """
+    view = get_flat_view("front", body_part_ids=["head"])
+    assert view.labels_for_size((13, 13)) is view.labels_for_size([13, 13])
+
+    skin = random_skin()
+    for size in range(1, 100):
+        skin.to_head_avatar(size)
+    assert _resized_labels.cache_info().currsize <= RESIZED_LABELS_CACHE_SIZE
+
+
+def test_errors():
+    skin = random_skin()
+    with pytest.raises(ValueError):
+        skin.to_flat_view("sideways")  # type: ignore
+    with pytest.raises(ValueError):
+        skin.to_flat_view("front", scale=0)
+    with pytest.raises(ValueError):
+        skin.to_flat_view("front", body_parts=["tail"])  # type: ignore
+    with pytest.raises(ValueError):
+        skin.to_flat_view("front", body_parts=[])
+    with pytest.raises(ValueError):
+        skin.to_head_avatar(0)
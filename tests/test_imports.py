@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+from importlib import metadata
+from pathlib import Path
+
+import pytest
+
+import skinpy
+
+SRC_PATH = Path(skinpy.__file__).parent.parent
+
+# modules that are too slow to import for `import skinpy` or `skinpy --help`
+HEAVY_MODULES = ("numpy", "PIL", "attrs", "skinpy.render", "skinpy.skin")
+
+# microseconds that importing skinpy itself, without its dependencies, may take.
+# a generous ceiling, so that only imports becoming eager again trip it
+IMPORT_BUDGET_US = 50_000
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess[str]:
+    return subprocess.run(
+        [sys.executable, *args],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=SRC_PATH,
+    )
+
+
+def loaded_modules(code: str) -> set[str]:
+    code += "\nimport sys\nprint('\\n'.join(sys.modules))"
+    return set(run_python("-c", code).stdout.splitlines())
+
+
+def test_import_is_lazy():
+    modules = loaded_modules("import skinpy")
+    assert not modules & set(HEAVY_MODULES)
+
+    # the names are all still there, and import what they need on first use
+    modules = loaded_modules("import skinpy\nskinpy.Skin.new()")
+    assert {"numpy", "PIL", "skinpy.render", "skinpy.skin"} <= modules
+
+
+def test_cli_import_is_lazy():
+    modules = loaded_modules(
+        "from click.testing import CliRunner\n"
+        "from skinpy.__main__ import cli\n"
+        "CliRunner().invoke(cli, ['--help'])\n"
+        "CliRunner().invoke(cli, ['render', '--help'])"
+    )
+    assert "skinpy.__main__" in modules
+    assert not modules & set(HEAVY_MODULES)
+
+
+def test_import_time():
+    stderr = run_python("-X", "importtime", "-c", "import skinpy").stderr
+    # lines of "import time: self [us] | cumulative | imported package"
+    cumulative = {
+        name.strip(): int(total)
+        for _, total, name in (
+            line.split("|") for line in stderr.splitlines()[1:] if "|" in line
+        )
+    }
+    assert cumulative["skinpy"] < IMPORT_BUDGET_US
+
+
+def test_exports():
+    assert set(skinpy.__all__) <= set(dir(skinpy))
+    for name in skinpy.__all__:
+        assert getattr(skinpy, name) is not None
+    with pytest.raises(AttributeError):
+        skinpy.NotAThing  # type: ignore
+
+
+def test_version():
+    try:
+        version = metadata.version("skinpy")
+    except metadata.PackageNotFoundError:
+        pytest.skip("skinpy isn't installed")
+    output = run_python("-m", "skinpy", "--version").stdout
+    assert version in output
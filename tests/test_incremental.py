@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import pytest
+
+import numpy as np
+
+from skinpy import IncrementalRenderer, Perspective, Skin
+
+from tests.test_flat import random_skin
+from tests.test_skin import LAB_PATH
+
+PERSPECTIVE = Perspective(x="left", y="front", z="up", scaling_factor=3)
+
+
+def full_render(skin: Skin, **kwargs) -> np.ndarray:
+    return np.array(skin.to_isometric_image(PERSPECTIVE, backend="numpy", **kwargs))
+
+
+@pytest.mark.parametrize("overlay", [False, True])
+@pytest.mark.parametrize("depth_test", [False, True])
+def test_edits(overlay: bool, depth_test: bool):
+    options = dict(
+        overlay=overlay, depth_test=depth_test, background_color=(9, 9, 9, 255)
+    )
+    skin = random_skin()
+    renderer = IncrementalRenderer(skin, PERSPECTIVE, **options)
+    assert np.array_equal(renderer.render_array(), full_render(skin, **options))
+
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        x, y = rng.integers(0, 64, 2)
+        skin.image_color[x, y] = rng.integers(0, 256, 4)
+        renderer.update()
+        assert np.array_equal(renderer.render_array(), full_render(skin, **options))
+
+    # edits everywhere at once
+    skin.image_color[:] = rng.integers(0, 256, skin.image_color.shape)
+    assert renderer.update() == (0, 0, *renderer.size)
+    assert np.array_equal(renderer.render_array(), full_render(skin, **options))
+
+
+def test_redrawn_box():
+    skin = Skin.from_path(LAB_PATH)
+    renderer = IncrementalRenderer(skin, PERSPECTIVE)
+    assert renderer.update() is None
+
+    before = renderer.render_array()
+    skin.set_color(4, 2, 0, "front", (1, 2, 3, 255))
+    box = renderer.update()
+    assert box is not None
+    after = renderer.render_array()
+    left, upper, right, lower = box
+    # a texel is a few pixels at this scale, and nothing outside the box changed
+    assert 0 < (right - left) * (lower - upper) < 100
+    changed = np.any(before != after, axis=-1)
+    assert changed[upper:lower, left:right].any()
+    changed[upper:lower, left:right] = False
+    assert not changed.any()
+
+    # texels that can't be seen from the perspective don't redraw anything
+    skin.set_color(5, 7, 25, "back", (1, 2, 3, 255))
+    assert renderer.update() is None
+    # and neither does setting a texel to its own color
+    skin.set_color(4, 2, 0, "front", (1, 2, 3, 255))
+    assert renderer.update() is None
+
+
+def test_renders_are_copies():
+    skin = random_skin()
+    renderer = IncrementalRenderer(skin, PERSPECTIVE)
+    image = renderer.render()
+    image.putpixel((0, 0), (1, 2, 3, 4))
+    assert np.array_equal(renderer.render_array(), full_render(skin))
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import pytest
+
+import numpy as np
+from PIL import Image
+
+from skinpy import (
+    CLASSIC_LAYOUT,
+    LEGACY_LAYOUT,
+    SLIM_LAYOUT,
+    InputImageException,
+    Perspective,
+    Skin,
+    SkinLayout,
+    SkinStack,
+    UnmappedVoxelError,
+    layout_for_size,
+)
+from skinpy.layout import LAYOUT_CACHE_SIZE, compile_layout, face_layout
+
+from tests.test_skin import LAB_PATH, STEVE_PATH, RED
+
+LAYOUTS = [
+    CLASSIC_LAYOUT,
+    SLIM_LAYOUT,
+    LEGACY_LAYOUT,
+    CLASSIC_LAYOUT.scaled(2),
+    SLIM_LAYOUT.scaled(4),
+]
+
+
+def test_layout_for_size():
+    assert layout_for_size((64, 64)) is CLASSIC_LAYOUT
+    assert layout_for_size((64, 32)) is LEGACY_LAYOUT
+    assert layout_for_size((128, 128)) == CLASSIC_LAYOUT.scaled(2)
+    assert layout_for_size((256, 128)).name == "legacy@4x"
+    assert SLIM_LAYOUT.fit((128, 128)).name == "slim@2x"
+
+    for size in ((32, 32), (64, 48), (100, 100), (128, 64 * 3)):
+        with pytest.raises(ValueError):
+            layout_for_size(size)  # type: ignore
+    with pytest.raises(ValueError):
+        SLIM_LAYOUT.fit((64, 32))
+
+    # HD skins are capped, since their tables grow with the cube of the factor
+    assert layout_for_size((512, 256)).name == "legacy@8x"
+    for size in ((1024, 1024), (64 * 100, 64 * 100)):
+        with pytest.raises(ValueError, match="at most"):
+            layout_for_size(size)  # type: ignore
+    with pytest.raises(ValueError, match="at most"):
+        SLIM_LAYOUT.fit((1024, 1024))
+
+
+def test_layout_caches_are_bounded():
+    layouts = [
+        layout.scaled(factor)
+        for layout in (CLASSIC_LAYOUT, SLIM_LAYOUT, LEGACY_LAYOUT)
+        for factor in (1, 2, 3, 4)
+    ]
+    assert len(layouts) > LAYOUT_CACHE_SIZE
+    for layout in layouts:
+        compile_layout(layout)
+    assert compile_layout.cache_info().currsize <= LAYOUT_CACHE_SIZE
+    assert compile_layout.cache_info().maxsize == LAYOUT_CACHE_SIZE
+    assert layout_for_size.cache_info().maxsize == LAYOUT_CACHE_SIZE
+    assert face_layout.cache_info().maxsize is not None
+
+
+@pytest.mark.parametrize("layout", LAYOUTS, ids=lambda layout: layout.name)
+def test_compiled_tables(layout: SkinLayout):
+    """
+    Test that every voxel face on the surface of each body part is mapped to a
+    pixel of the image, and that only mirrored body parts share pixels.
+    """
+    compiled = compile_layout(layout)
+    assert compile_layout(layout) is compiled
+
+    x, y, z, part_index, face_index, image_x, image_y = compiled.columns
+    expected_rows = sum(
+        2 * (sx * sy + sy * sz + sx * sz)
+        for sx, sy, sz in (part.shape for part in layout.parts)
+    )
+    assert len(x) == expected_rows
+    assert ((0 <= image_x) & (image_x < layout.image_size[0])).all()
+    assert ((0 <= image_y) & (image_y < layout.image_size[1])).all()
+
+    pixels = image_x * layout.image_size[1] + image_y
+    mirrored_rows = sum(
+        2 * (sx * sy + sy * sz + sx * sz)
+        for sx, sy, sz in (part.shape for part in layout.parts if part.mirrored)
+    )
+    assert len(np.unique(pixels)) == expected_rows - mirrored_rows
+
+    # every voxel face resolves back to its pixel
+    index = compiled.voxel_index[x, y, z, face_index]
+    assert np.array_equal(index, np.stack((image_x, image_y), axis=1))
+
+    # overlays never share pixels with the base layer
+    _, _, _, _, _, overlay_x, overlay_y = compiled.overlay_columns
+    overlay_pixels = overlay_x * layout.image_size[1] + overlay_y
+    assert not np.isin(overlay_pixels, pixels).any()
+    assert len(overlay_pixels) == sum(
+        2 * (sx * sy + sy * sz + sx * sz)
+        for sx, sy, sz in (part.shape for part in layout.parts if part.has_overlay)
+    )
+
+
+def test_slim():
+    skin = Skin.from_path(STEVE_PATH, layout=SLIM_LAYOUT)
+
+    assert skin.layout is SLIM_LAYOUT
+    assert skin.left_arm.shape == skin.right_arm.shape == (3, 4, 12)
+    assert skin.left_arm.model_origin == (1, 2, 12)
+    assert skin.left_sleeve.shape == (3, 4, 12)
+
+    # the arms are a texel thinner than classic ones, on the outside
+    with pytest.raises(UnmappedVoxelError):
+        skin.get_color(0, 2, 12, "front")
+    with pytest.raises(UnmappedVoxelError):
+        skin.get_color(15, 2, 12, "front")
+    assert skin.voxel_table().face_index.shape == (1568,)
+    assert np.array_equal(
+        compile_layout(SLIM_LAYOUT).voxel_index[1, 2, 12, 4], (44, 31)
+    )
+    assert np.array_equal(
+        compile_layout(SLIM_LAYOUT).voxel_index[14, 2, 12, 3], (39, 63)
+    )
+
+    perspective = Perspective(x="left", y="front", z="up")
+    classic = Skin.from_path(STEVE_PATH).to_isometric_image(perspective)
+    slim = skin.to_isometric_image(perspective, overlay=True)
+    assert slim.size != classic.size
+
+    stack = SkinStack.from_skins([skin, skin])
+    assert stack.layout is SLIM_LAYOUT and stack[0].layout is SLIM_LAYOUT
+    assert np.array_equal(
+        stack.render_isometric_batch(perspective, overlay=True)[1], np.array(slim)
+    )
+    with pytest.raises(ValueError):
+        SkinStack.from_skins([skin, Skin.new()])
+
+
+def test_legacy():
+    """
+    Test that legacy skins are recognized by their size, and that their right
+    limbs mirror the left ones.
+    """
+    image = Image.open(LAB_PATH).crop((0, 0, 64, 32))
+    skin = Skin.from_image(image)
+    assert skin.layout is LEGACY_LAYOUT
+    assert Skin.from_buffer(image.tobytes()).layout is LEGACY_LAYOUT
+
+    skin.image_color[:] = np.random.default_rng(0).integers(0, 256, (64, 32, 4))
+    for left, right in (
+        (skin.left_arm, skin.right_arm),
+        (skin.left_leg, skin.right_leg),
+    ):
+        assert not left.mirrored and right.mirrored
+        x = np.arange(4)[:, np.newaxis]
+        z = np.arange(12)
+        # the front is flipped left to right
+        assert np.array_equal(
+            right.get_colors(x, 0, z, "front"), left.get_colors(3 - x, 0, z, "front")
+        )
+        # and the sides trade places
+        assert np.array_equal(
+            right.get_colors(0, x, z, "left"), left.get_colors(3, x, z, "right")
+        )
+
+    assert [part.id_ for part in skin.overlays] == ["head"]
+    with pytest.raises(ValueError):
+        skin.jacket
+
+    perspective = Perspective(x="left", y="front", z="up")
+    assert np.array_equal(
+        np.array(skin.to_isometric_image(perspective, backend="numpy")),
+        np.array(skin.to_isometric_image(perspective)),
+    )
+    skin.to_isometric_image(perspective, overlay=True)
+
+
+def test_hd():
+    """
+    Test that an HD skin maps every voxel face to the pixels of the classic skin
+    it was scaled up from.
+    """
+    image = Image.open(LAB_PATH)
+    classic = Skin.from_image(image)
+    hd = Skin.from_image(image.resize((128, 128), Image.Resampling.NEAREST))
+
+    assert hd.layout == CLASSIC_LAYOUT.scaled(2)
+    assert hd.shape == (32, 16, 64)
+    assert hd.head.shape == (16, 16, 16)
+
+    table = hd.voxel_table()
+    assert np.array_equal(
+        table.colors,
+        classic.get_colors(table.x // 2, table.y // 2, table.z // 2, table.face_index),
+    )
+
+    perspective = Perspective(x="left", y="front", z="up", scaling_factor=2)
+    rendered = hd.to_isometric_image(perspective, overlay=True)
+    expected = classic.to_isometric_image(
+        Perspective(x="left", y="front", z="up", scaling_factor=4), overlay=True
+    )
+    assert rendered.size == expected.size
+
+
+def test_wrong_size():
+    with pytest.raises(InputImageException):
+        Skin.from_image(Image.new("RGBA", (64, 48)))
+    with pytest.raises(InputImageException):
+        Skin.from_image(Image.new("RGBA", (64, 32)), layout=SLIM_LAYOUT)
+    with pytest.raises(InputImageException):
+        Skin.new(np.zeros((64, 64, 4), dtype=np.uint8), layout=LEGACY_LAYOUT)
+
+    skin = Skin.filled(RED, layout=LEGACY_LAYOUT)
+    assert skin.image_color.shape == (64, 32, 4)
+    assert (skin.voxel_table().colors == RED).all()
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import logging
+
+import pytest
+
+from skinpy import Perspective, Skin
+from skinpy.profile import (
+    LoggingSink,
+    StageStats,
+    add_sink,
+    profiling,
+    remove_sink,
+    span,
+)
+
+from tests.test_skin import STEVE_PATH
+
+PERSPECTIVE = Perspective.new(x="left", y="front", z="up", scaling_factor=3)
+
+
+def test_span():
+    # without sinks, every span is the same do-nothing object
+    assert span("decode") is span("encode")
+    with span("decode"):
+        pass
+
+    with profiling(StageStats()):
+        assert span("decode") is not span("decode")
+
+
+def test_profiling():
+    calls: list[tuple[str, float]] = []
+
+    def sink(stage: str, seconds: float) -> None:
+        calls.append((stage, seconds))
+
+    with profiling(sink):
+        with span("work"):
+            pass
+        with pytest.raises(ValueError):
+            with span("fail"):
+                raise ValueError
+    with span("after"):
+        pass
+
+    assert [stage for stage, _ in calls] == ["work", "fail"]
+    assert all(seconds >= 0 for _, seconds in calls)
+
+
+def test_add_sink():
+    stats = StageStats()
+    add_sink(stats)
+    try:
+        with span("work"):
+            pass
+    finally:
+        remove_sink(stats)
+    with span("work"):
+        pass
+    assert stats.stages["work"].count == 1
+    with pytest.raises(ValueError):
+        remove_sink(stats)
+
+
+@pytest.mark.parametrize("overlay", [False, True])
+@pytest.mark.parametrize("backend", ["imagedraw", "numpy"])
+def test_render_stages(overlay: bool, backend: str):
+    stats = StageStats()
+    with profiling(stats):
+        skin = Skin.from_path(STEVE_PATH)
+        skin.to_isometric_image(PERSPECTIVE, overlay=overlay, backend=backend)
+        skin.head.to_isometric_image(PERSPECTIVE)
+
+    assert stats.stages["decode"].count == 1
+    assert stats.stages["polygons"].count >= 2
+    assert stats.stages["rasterize"].count == 2
+    # the body part is rendered from its polygons, without a plan
+    assert stats.stages["bounds"].count == 1
+
+
+def test_report():
+    stats = StageStats()
+    stats("decode", 0.002)
+    stats("rasterize", 0.001)
+    stats("rasterize", 0.003)
+    assert stats.stages["rasterize"].count == 2
+    assert stats.stages["rasterize"].total == pytest.approx(0.004)
+
+    lines = stats.report().splitlines()
+    assert [line.split()[0] for line in lines] == ["stage", "decode", "rasterize"]
+    assert lines[2].split()[1:6:2] == ["2", "ms", "ms"]
+
+    lines = stats.report(total=0.01).splitlines()
+    assert lines[-2].split()[:2] == ["(other)", "4.000"]
+    assert lines[-1].split()[-1] == "100.0%"
+    assert lines[1].split()[-1] == "20.0%"
+
+
+def test_logging_sink(caplog: pytest.LogCaptureFixture):
+    with caplog.at_level(logging.DEBUG, logger="skinpy.profile"):
+        with profiling(LoggingSink()):
+            with span("encode"):
+                pass
+    assert "encode took" in caplog.text
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from skinpy import Perspective, Skin
+from skinpy.serve import RenderServer
+
+from tests.test_skin import LAB_PATH, STEVE_PATH
+
+
+async def request(
+    port: int,
+    method: str,
+    target: str,
+    body: bytes = b"",
+    headers: dict[str, str] | None = None,
+) -> tuple[int, dict[str, str], bytes]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    lines = [f"{method} {target} HTTP/1.1", "Host: localhost", "Connection: close"]
+    if body:
+        lines.append(f"Content-Length: {len(body)}")
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+    response = await reader.read()
+    writer.close()
+
+    head, _, content = response.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode().split("\r\n")
+    response_headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        response_headers[name.lower()] = value.strip()
+    return int(status_line.split()[1]), response_headers, content
+
+
+def serve(test, executor=None, **kwargs) -> None:
+    """
+    Run the coroutine function `test` with a server and its port.
+    """
+
+    async def main():
+        server = RenderServer(executor=executor or ThreadPoolExecutor(2), **kwargs)
+        listener = await server.start(port=0)
+        try:
+            await test(server, listener.sockets[0].getsockname()[1])
+        finally:
+            listener.close()
+            await listener.wait_closed()
+
+    asyncio.run(main())
+
+
+def test_render():
+    skin_bytes = LAB_PATH.read_bytes()
+    skin = Skin.from_path(LAB_PATH)
+
+    async def test(server, port):
+        status, headers, body = await request(
+            port, "POST", "/render?x=right&scale=2", skin_bytes
+        )
+        assert status == 200 and headers["content-type"] == "image/png"
+        expected = skin.to_isometric_image(
+            Perspective(x="right", y="front", z="up", scaling_factor=2), overlay=True
+        )
+        assert np.array_equal(np.array(Image.open(io.BytesIO(body))), expected)
+        assert "immutable" in headers["cache-control"]
+
+        # the client's copy is still good
+        status, _, body = await request(
+            port,
+            "POST",
+            "/render?x=right&scale=2",
+            skin_bytes,
+            {"If-None-Match": headers["etag"]},
+        )
+        assert status == 304 and body == b""
+        # other parameters are another render
+        _, other, _ = await request(port, "POST", "/render?scale=2", skin_bytes)
+        assert other["etag"] != headers["etag"]
+
+        status, _, body = await request(
+            port, "POST", "/avatar?size=16&overlay=0", skin_bytes
+        )
+        assert status == 200
+        expected = skin.to_head_avatar(16, overlay=False)
+        assert np.array_equal(np.array(Image.open(io.BytesIO(body))), expected)
+
+    serve(test)
+
+
+def test_skin_dir(tmp_path: Path):
+    (tmp_path / "skins").mkdir()
+    (tmp_path / "skins" / "steve.png").write_bytes(STEVE_PATH.read_bytes())
+    (tmp_path / "secret.png").write_bytes(STEVE_PATH.read_bytes())
+
+    async def test(server, port):
+        status, headers, body = await request(port, "GET", "/avatar/steve.png")
+        assert status == 200 and headers["cache-control"] == "no-cache"
+        expected = Skin.from_path(STEVE_PATH).to_head_avatar(64)
+        assert np.array_equal(np.array(Image.open(io.BytesIO(body))), expected)
+
+        for target in (
+            "/avatar/missing.png",
+            "/avatar/../secret.png",
+            "/avatar/%2E%2E/secret.png",
+            "/avatar/..%2Fsecret.png",
+            "/nothing/steve.png",
+        ):
+            status, _, _ = await request(port, "GET", target)
+            assert status == 404, target
+
+    serve(test, skin_dir=tmp_path / "skins")
+
+
+def test_errors():
+    skin_bytes = STEVE_PATH.read_bytes()
+
+    async def test(server, port):
+        for method, target, body in (
+            ("POST", "/render?scale=0", skin_bytes),
+            ("POST", "/render?x=up", skin_bytes),
+            ("POST", "/avatar?overlay=maybe", skin_bytes),
+            ("POST", "/render", b"not a png"),
+            ("POST", "/render", b"\x89PNG"),
+        ):
+            status, _, _ = await request(port, method, target, body)
+            assert status == 400, target
+        assert (await request(port, "GET", "/avatar/steve.png"))[0] == 404
+        assert (await request(port, "DELETE", "/render"))[0] == 405
+        assert (await request(port, "POST", "/render", b"x" * 200_000))[0] == 413
+
+    serve(test, max_body_bytes=100_000)
+
+
+def test_hd_skins():
+    """
+    Test that HD skins, which are tiny as PNGs but huge to render, are turned
+    away unless the server allows them.
+    """
+    out = io.BytesIO()
+    Image.new("RGBA", (512, 512)).save(out, "PNG")
+    hd_bytes = out.getvalue()
+    assert len(hd_bytes) < 4096
+
+    async def test(server, port):
+        status, _, body = await request(port, "POST", "/avatar?size=8", hd_bytes)
+        assert status == 400 and b"512x512" in body
+
+    serve(test)
+
+    async def test_allowed(server, port):
+        status, _, _ = await request(port, "POST", "/avatar?size=8", hd_bytes)
+        assert status == 200
+
+    serve(test_allowed, max_skin_size=512)
+
+
+def test_backpressure_and_metrics():
+    skin_bytes = STEVE_PATH.read_bytes()
+    release = threading.Event()
+    executor = ThreadPoolExecutor(1)
+    # keep the only worker busy until the queue has filled up
+    executor.submit(release.wait)
+
+    async def test(server, port):
+        queued = [
+            asyncio.create_task(
+                request(port, "POST", f"/render?scale={scale}", skin_bytes)
+            )
+            for scale in (1, 2)
+        ]
+        while server.pending < 2:
+            await asyncio.sleep(0.01)
+
+        status, headers, _ = await request(port, "POST", "/render", skin_bytes)
+        assert status == 503 and headers["retry-after"] == "1"
+
+        _, _, body = await request(port, "GET", "/metrics")
+        metrics = body.decode()
+        assert "skinpy_render_queue_depth 1" in metrics
+        assert "skinpy_renders_in_progress 1" in metrics
+        assert "skinpy_rejected_requests_total 1" in metrics
+
+        release.set()
+        assert [(await task)[0] for task in queued] == [200, 200]
+
+        _, _, body = await request(port, "GET", "/metrics")
+        metrics = body.decode()
+        assert 'skinpy_requests_total{endpoint="render",status="200"} 2' in metrics
+        assert 'skinpy_requests_total{endpoint="render",status="503"} 1' in metrics
+        assert "skinpy_render_duration_seconds_count 2" in metrics
+        assert (
+            'skinpy_request_duration_seconds_bucket{endpoint="render",le="+Inf"} 3'
+            in metrics
+        )
+
+    serve(test, executor=executor, workers=1, max_queue=2)
+
+
+def test_keep_alive():
+    skin_bytes = STEVE_PATH.read_bytes()
+
+    async def test(server, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for _ in range(2):
+            writer.write(
+                b"POST /avatar?size=8 HTTP/1.1\r\n"
+                + f"Content-Length: {len(skin_bytes)}\r\n".encode()
+                + b"Expect: 100-continue\r\n\r\n"
+                + skin_bytes
+            )
+            assert await reader.readline() == b"HTTP/1.1 100 Continue\r\n"
+            await reader.readline()
+            assert await reader.readline() == b"HTTP/1.1 200 OK\r\n"
+            headers = {}
+            while (line := await reader.readline()) != b"\r\n":
+                name, _, value = line.decode().partition(":")
+                headers[name.lower()] = value.strip()
+            assert headers["connection"] == "keep-alive"
+            await reader.readexactly(int(headers["content-length"]))
+        writer.close()
+
+    serve(test)
+
+
+def test_cache(tmp_path: Path):
+    skin_bytes = STEVE_PATH.read_bytes()
+    cache_dir = tmp_path / "cache"
+
+    async def test(server, port):
+        status, _, body = await request(port, "POST", "/render?scale=2", skin_bytes)
+        assert status == 200
+        assert len(list(cache_dir.glob("*.npy"))) == 1
+        # the cached render is served the same
+        assert (await request(port, "POST", "/render?scale=2", skin_bytes))[2] == body
+
+    serve(test, cache_dir=cache_dir, cache_max_bytes=1 << 20)
@@ -8,6 +8,8 @@ import numpy as np
 from PIL import Image
 
 from skinpy import (
+    BODY_PART_IDS,
+    FACE_IDS,
     Skin,
     BodyPart,
     Face,
@@ -18,6 +20,8 @@ from skinpy import (
     XFaceId,
     YFaceId,
     ZFaceId,
+    UnmappedVoxelError,
+    InputImageException,
 )
 
 # fixture base path
@@ -52,6 +56,146 @@ def test_round_trip():
     assert np.array_equal(np_img1, np_img2), f"Image {STEVE_PATH} did not round trip."
 
 
+def test_to_array():
+    """
+    Test that arrays are copies in either order, and can be written into a
+    caller's buffer.
+    """
+    image = np.array(Image.open(LAB_PATH))
+    skin = Skin.from_path(LAB_PATH)
+
+    rows = skin.to_array()
+    assert np.array_equal(rows, image)
+    assert rows.flags.c_contiguous and not np.shares_memory(rows, skin.image_color)
+    columns = skin.to_array(row_major=False)
+    assert np.array_equal(columns, skin.image_color)
+    assert not np.shares_memory(columns, skin.image_color)
+
+    batch = np.zeros((2, 64, 64, 4), dtype=np.uint8)
+    out = batch[1]
+    assert skin.to_array(out=out) is out
+    assert np.array_equal(batch[1], image) and not batch[0].any()
+
+    with pytest.raises(ValueError):
+        skin.to_array(out=np.zeros((64, 64, 3), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        skin.to_array(out=np.zeros((64, 64, 4), dtype=np.float32))
+
+
+def test_loading(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """
+    Test that every way of loading a skin gives the same colors, and that
+    loading doesn't write anything to the working directory.
+    """
+    monkeypatch.chdir(tmp_path)
+    expected = np.swapaxes(np.array(Image.open(LAB_PATH)), 0, 1)
+
+    for skin in (
+        Skin.from_path(LAB_PATH),
+        Skin.from_bytes(LAB_PATH.read_bytes()),
+        Skin.from_image(Image.open(LAB_PATH)),
+    ):
+        assert np.array_equal(skin.image_color, expected)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_from_buffer():
+    """
+    Test that skins from buffers share memory with the buffer.
+    """
+    row_major = np.array(Image.open(LAB_PATH))
+    skin = Skin.from_buffer(row_major)
+    assert np.shares_memory(skin.image_color, row_major)
+    assert np.array_equal(skin.get_color(4, 0, 24, "front"), row_major[15, 8])
+
+    skin.set_color(4, 0, 24, "front", RED)
+    assert np.array_equal(row_major[15, 8], RED)
+
+    column_major = np.swapaxes(row_major, 0, 1).copy()
+    skin = Skin.from_buffer(column_major, row_major=False)
+    assert np.shares_memory(skin.image_color, column_major)
+    assert np.array_equal(skin.get_color(4, 0, 24, "front"), RED)
+
+    data = bytearray(row_major.tobytes())
+    skin = Skin.from_buffer(memoryview(data))
+    skin.set_color(4, 0, 24, "front", GREEN)
+    assert tuple(data[(15 * 64 + 8) * 4 : (15 * 64 + 9) * 4]) == GREEN
+
+    skin = Skin.from_buffer(bytes(data))
+    assert np.array_equal(skin.get_color(4, 0, 24, "front"), GREEN)
+    with pytest.raises(ValueError):
+        skin.set_color(4, 0, 24, "front", RED)
+
+
+@pytest.mark.parametrize(
+    "buffer",
+    [
+        np.zeros((64, 32, 4), dtype=np.uint8),
+        np.zeros((64, 64, 4), dtype=np.float64),
+        bytes(64 * 64 * 3),
+    ],
+)
+def test_from_buffer_invalid(buffer: np.ndarray | bytes):
+    with pytest.raises(InputImageException):
+        Skin.from_buffer(buffer)
+
+
+def test_lazy_body_parts():
+    """
+    Test that body parts and faces are built once, on first access, as views of
+    the skin.
+    """
+    skin = Skin.from_path(STEVE_PATH)
+
+    assert skin.head is skin.head
+    assert skin.head.front is skin.head.get_face_for_id("front")
+    assert skin.get_body_part_for_id("left_arm") is skin.left_arm
+    assert np.shares_memory(skin.head.front.image_color, skin.image_color)
+    assert skin.torso.shape == (8, 4, 12)
+
+    skin.head.front.set_color(0, 0, RED)
+    assert np.array_equal(skin.get_color(4, 0, 24, "front"), RED)
+
+    with pytest.raises(ValueError):
+        skin.get_body_part_for_id("tail")  # type: ignore
+    with pytest.raises(ValueError):
+        skin.head.get_face_for_id("inside")  # type: ignore
+
+
+def test_overlay_body_parts():
+    """
+    Test that overlays are shells around their body parts, mapped from the
+    second layer regions of the image.
+    """
+    skin = Skin.from_path(STEVE_PATH)
+
+    assert skin.hat is skin.get_overlay_for_id("head")
+    assert skin.hat.is_overlay and not skin.head.is_overlay
+    assert skin.hat.shape == skin.head.shape
+    assert skin.hat.model_origin == skin.head.model_origin
+    assert [part.id_ for part in skin.overlays] == [
+        part.id_ for part in skin.body_parts
+    ]
+
+    for part, region in (
+        (skin.hat, (slice(32, 64), slice(0, 16))),
+        (skin.jacket, (slice(16, 40), slice(32, 48))),
+        (skin.left_sleeve, (slice(40, 56), slice(32, 48))),
+        (skin.right_sleeve, (slice(48, 64), slice(48, 64))),
+        (skin.left_pants, (slice(0, 16), slice(32, 48))),
+        (skin.right_pants, (slice(0, 16), slice(48, 64))),
+    ):
+        assert np.shares_memory(part.image_color, skin.image_color[region])
+        assert part.image_color.shape[:2] == skin.image_color[region].shape[:2]
+
+    skin.hat.front.image_color[:] = RED
+    assert (skin.image_color[40:48, 8:16] == RED).all()
+
+    with pytest.raises(ValueError):
+        skin.get_overlay_for_id("tail")  # type: ignore
+
+
 @pytest.mark.parametrize(
     "face_id",
     [
@@ -216,3 +360,130 @@ def test_iso_image(
     assert np.array_equal(
         actual, expected
     ), f"Generated isometric image did not match fixture at ({fixture_path})."
+
+
+def test_voxel_table():
+    """
+    Test that the voxel table describes the same voxels, in the same order, as
+    enumerating the skin.
+    """
+    skin = Skin.from_image(Image.open(LAB_PATH))
+    table = skin.voxel_table()
+
+    enumerated = list(skin.enumerate_color())
+    assert len(table) == len(enumerated) == 1632
+
+    for i, ((x, y, z), body_part_id, face_id, color) in enumerate(enumerated):
+        assert (table.x[i], table.y[i], table.z[i]) == (x, y, z)
+        assert BODY_PART_IDS[table.body_part_index[i]] == body_part_id
+        assert FACE_IDS[table.face_index[i]] == face_id
+        assert np.array_equal(table.colors[i], color)
+        assert np.array_equal(skin.get_color(x, y, z, face_id), color)
+
+    # columns are shared between skins, and can't be modified
+    assert Skin.new().voxel_table().x is table.x
+    assert not table.x.flags.writeable
+
+    # colors are a copy, so writing to them would be lost
+    with pytest.raises(ValueError, match="read-only"):
+        table.colors[0] = 0
+
+
+def test_voxel_table_write():
+    skin = Skin.new()
+    table = skin.voxel_table()
+
+    head = table.body_part_index == BODY_PART_IDS.index("head")
+    skin.image_color[table.image_x[head], table.image_y[head]] = RED
+
+    for (x, y, z), body_part_id, face_id, color in skin.enumerate_color():
+        expected = RED if body_part_id == "head" else (0, 0, 0, 0)
+        assert np.array_equal(color, expected)
+
+
+@pytest.mark.parametrize(
+    "coord",
+    [
+        (8, 4, 20, "front"),  # inside the torso
+        (8, 4, 31, "down"),  # top of the head, wrong face
+        (0, 0, 0, "front"),  # no body part here
+        (-1, 2, 0, "front"),  # out of bounds
+        (16, 2, 12, "right"),  # out of bounds
+    ],
+)
+def test_get_color_unmapped(coord: tuple[int, int, int, FaceId]):
+    skin = Skin.new()
+
+    with pytest.raises(UnmappedVoxelError):
+        skin.get_color(*coord)
+
+
+def test_bulk_colors():
+    """
+    Test that the bulk getters and setters agree with the single ones at every
+    level.
+    """
+    skin = Skin.from_image(Image.open(LAB_PATH))
+    table = skin.voxel_table()
+
+    colors = skin.get_colors(table.x, table.y, table.z, table.face_index)
+    assert np.array_equal(colors, table.colors)
+
+    face_ids = np.array(FACE_IDS)[table.face_index]
+    assert np.array_equal(skin.get_colors(table.x, table.y, table.z, face_ids), colors)
+
+    for body_part in skin.body_parts:
+        rows = table.body_part_index == BODY_PART_IDS.index(body_part.id_)
+        x = table.x[rows] - body_part.model_origin[0]
+        y = table.y[rows] - body_part.model_origin[1]
+        z = table.z[rows] - body_part.model_origin[2]
+        assert np.array_equal(
+            body_part.get_colors(x, y, z, table.face_index[rows]), colors[rows]
+        )
+
+    face = skin.torso.back
+    u, v = np.indices(face.shape).reshape(2, -1)
+    expected = [face.get_color(i, j) for i, j in zip(u, v)]
+    assert np.array_equal(face.get_colors(u, v), expected)
+
+    # write everything back, reversed
+    skin.set_colors(table.x, table.y, table.z, table.face_index, colors[::-1])
+    assert np.array_equal(table.colors, colors[::-1])
+
+    skin.head.set_colors(0, np.arange(8), 0, "left", RED)
+    for y in range(8):
+        assert np.array_equal(skin.head.get_color(0, y, 0, "left"), RED)
+
+    face.set_colors([0, -1], [0, -1], [GREEN, WHITE])
+    assert np.array_equal(face.get_color(0, 0), GREEN)
+    assert np.array_equal(face.get_color(-1, -1), WHITE)
+
+
+def test_bulk_colors_unmapped():
+    skin = Skin.filled(WHITE)
+    x = [4, 8, 0]
+    y = [0, 4, 0]
+    z = [24, 20, 0]
+
+    with pytest.raises(UnmappedVoxelError):
+        skin.get_colors(x, y, z, "front")
+
+    with pytest.raises(UnmappedVoxelError):
+        skin.set_colors(x, y, z, "front", RED)
+    assert np.array_equal(skin.get_color(4, 0, 24, "front"), WHITE)
+
+    colors = skin.get_colors(x, y, z, "front", mask_unmapped=True)
+    assert colors.mask.tolist() == [[False] * 4, [True] * 4, [True] * 4]
+    assert np.array_equal(colors[0], WHITE)
+
+    skin.set_colors(x, y, z, "front", RED, mask_unmapped=True)
+    assert np.array_equal(skin.get_color(4, 0, 24, "front"), RED)
+
+    with pytest.raises(UnmappedVoxelError):
+        skin.head.get_colors([0, 1], [0, 1], [0, 0], "left")
+
+    with pytest.raises(UnmappedVoxelError):
+        skin.head.front.get_colors([0, 8], [0, 0])
+
+    with pytest.raises(ValueError):
+        skin.get_colors(x, y, z, "sideways")
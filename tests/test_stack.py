@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from itertools import product
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from skinpy import Skin, SkinStack, Perspective
+
+from tests.test_skin import LAB_PATH, STEVE_PATH, RED
+
+
+def test_stack_views():
+    """
+    Test that skins from a stack share memory with the stack.
+    """
+    stack = SkinStack.from_paths([STEVE_PATH, LAB_PATH])
+
+    assert stack.image_color.shape == (2, 64, 64, 4)
+    assert stack.image_color.flags.c_contiguous
+    assert len(stack) == 2
+
+    skin = stack[1]
+    assert np.shares_memory(skin.image_color, stack.image_color)
+
+    skin.set_color(4, 0, 24, "front", RED)
+    assert np.array_equal(stack.image_color[1, 8, 15], RED)
+    assert np.array_equal(stack[1].get_color(4, 0, 24, "front"), RED)
+
+
+@pytest.mark.parametrize("hat_alpha", (128, 255))
+def test_render_isometric_batch(hat_alpha: int):
+    """
+    Test that rendering a stack gives the same images as rendering each skin.
+    """
+    skins = [Skin.from_image(Image.open(path)) for path in (STEVE_PATH, LAB_PATH)]
+    skins.append(Skin.filled(RED))
+    # a translucent or opaque overlay, to composite across the batch
+    skins[-1].hat.image_color[..., 3] = hat_alpha
+    stack = SkinStack.from_skins(skins)
+
+    for perspective in (
+        Perspective(x="left", y="front", z="up"),
+        Perspective(x="right", y="back", z="down", scaling_factor=3),
+    ):
+        for depth_test, overlay in product((False, True), (False, True)):
+            batch = stack.render_isometric_batch(
+                perspective,
+                background_color=(0, 0, 0, 255),
+                depth_test=depth_test,
+                overlay=overlay,
+            )
+            for skin, rendered in zip(skins, batch):
+                expected = skin.to_isometric_image(
+                    perspective,
+                    background_color=(0, 0, 0, 255),
+                    backend="numpy",
+                    depth_test=depth_test,
+                    overlay=overlay,
+                )
+                assert np.array_equal(rendered, np.array(expected))
+
+            out = np.empty_like(batch)
+            result = stack.render_isometric_batch(
+                perspective,
+                background_color=(0, 0, 0, 255),
+                depth_test=depth_test,
+                overlay=overlay,
+                out=out,
+            )
+            assert result is out and np.array_equal(out, batch)
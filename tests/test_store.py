@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import shutil
+import struct
+from pathlib import Path
+
+import numpy as np
+import pytest
+from click.testing import CliRunner
+from PIL import Image
+
+from skinpy import (
+    CLASSIC_LAYOUT,
+    LEGACY_LAYOUT,
+    SLIM_LAYOUT,
+    Perspective,
+    Skin,
+    SkinStore,
+    SkinStoreError,
+)
+from skinpy.__main__ import cli
+
+from tests.test_skin import LAB_PATH, STEVE_PATH, RED, GREEN
+
+
+def test_store_round_trip(tmp_path: Path):
+    """
+    Test that skins come back out of a store the same, as views into the file.
+    """
+    path = tmp_path / "skins.store"
+    skins = [Skin.from_path(STEVE_PATH), Skin.from_path(LAB_PATH)]
+
+    store = SkinStore.create(path, skins, ids=["steve", "lab"])
+
+    assert len(store) == 2
+    assert isinstance(store.image_color, np.memmap)
+    assert np.array_equal(store.get("lab").image_color, skins[1].image_color)
+    assert np.array_equal(store[0].image_color, skins[0].image_color)
+    assert np.shares_memory(store[0].image_color, store.image_color)
+    assert np.array_equal(store.stack.image_color, store.image_color)
+    assert "steve" in store and "alex" not in store
+
+    # read-only by default
+    with pytest.raises(ValueError):
+        store[0].set_color(4, 0, 24, "front", RED)
+
+    writable = SkinStore.open(path, writable=True)
+    writable[0].set_color(4, 0, 24, "front", RED)
+    writable.image_color.flush()
+    assert np.array_equal(SkinStore.open(path)[0].get_color(4, 0, 24, "front"), RED)
+
+
+def test_store_append_and_compact(tmp_path: Path):
+    path = tmp_path / "skins.store"
+    store = SkinStore.create(path, [Skin.filled(RED)], ids=["a"])
+    old_skin = store[0]
+
+    store = store.append([Skin.filled(GREEN), Skin.filled(RED)], ids=["b", "a"])
+
+    assert len(store) == 3
+    assert store.ids == ("a", "b", "a")
+    assert store.rows_by_id == {"a": 2, "b": 1}
+    # skins from before the append are still readable
+    assert np.array_equal(old_skin.get_color(4, 0, 24, "front"), RED)
+
+    size_before = path.stat().st_size
+    store = store.compact(drop_ids=["b"])
+
+    assert store.ids == ("a",)
+    assert np.array_equal(store.get("a").get_color(4, 0, 24, "front"), RED)
+    assert path.stat().st_size < size_before
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_store_failed_writes(tmp_path: Path):
+    """
+    Test that appends and rewrites that fail part way leave the store as it was.
+    """
+    path = tmp_path / "skins.store"
+    SkinStore.create(path, [Skin.filled(RED), Skin.filled(GREEN)], ids=["a", "b"])
+    original = path.read_bytes()
+
+    def interrupted():
+        yield Skin.filled(GREEN)
+        raise KeyboardInterrupt
+
+    with pytest.raises(SkinStoreError):
+        SkinStore.open(path).append(
+            [Skin.filled(GREEN), Skin.new(np.zeros((64, 32, 4), np.uint8))],
+            ids=["c", "d"],
+        )
+    with pytest.raises(SkinStoreError):
+        SkinStore.open(path).append([Skin.filled(GREEN)], ids=["c", "d"])
+    with pytest.raises(KeyboardInterrupt):
+        SkinStore.open(path).append(interrupted(), ids=["c", "d"])
+    with pytest.raises(KeyboardInterrupt):
+        SkinStore.create(path, interrupted(), ids=["c", "d"])
+
+    assert path.read_bytes() == original
+    assert list(tmp_path.iterdir()) == [path]
+
+    # an index bigger than the skins appended after it
+    ids = [f"skin-{i:05}" for i in range(2000)]
+    store = SkinStore.create(path, [Skin.filled(RED)] * len(ids), ids=ids)
+    store = store.append([Skin.filled(GREEN)], ids=["green"])
+    assert store.ids == (*ids, "green")
+    assert np.array_equal(store.get("green").get_color(4, 0, 24, "front"), GREEN)
+    # the skins, a layout byte each and the index
+    assert path.stat().st_size == 4096 + len(store) * (64 * 64 * 4 + 1) + len(
+        "\n".join(store.ids)
+    )
+
+
+def test_store_without_ids(tmp_path: Path):
+    path = tmp_path / "skins.store"
+    store = SkinStore.create(path)
+    assert len(store) == 0 and store.ids is None
+
+    store = store.append([Skin.filled(RED)])
+    assert len(store) == 1
+
+    with pytest.raises(SkinStoreError):
+        store.append([Skin.filled(RED)], ids=["a"])
+    with pytest.raises(SkinStoreError):
+        store.compact(drop_ids=["a"])
+
+
+def test_store_layouts(tmp_path: Path):
+    """
+    Test that slim skins come back out of a store slim, through appends and
+    compaction.
+    """
+    path = tmp_path / "skins.store"
+    store = SkinStore.create(
+        path,
+        [Skin.filled(RED), Skin.filled(GREEN, layout=SLIM_LAYOUT)],
+        ids=["classic", "slim"],
+    )
+    store = store.append([Skin.filled(RED, layout=SLIM_LAYOUT)], ids=["classic"])
+    assert [skin.layout for skin in store] == [
+        CLASSIC_LAYOUT,
+        SLIM_LAYOUT,
+        SLIM_LAYOUT,
+    ]
+    with pytest.raises(SkinStoreError, match="classic and slim"):
+        store.stack
+
+    store = store.compact(drop_ids=["classic"])
+    assert store.get("slim").layout == SLIM_LAYOUT
+    assert store.stack.layout == SLIM_LAYOUT
+    assert np.array_equal(
+        store.stack.render_isometric_batch(Perspective(x="left", y="front", z="up"))[0],
+        store.get("slim").to_isometric_array(Perspective(x="left", y="front", z="up")),
+    )
+
+    with pytest.raises(SkinStoreError, match="legacy"):
+        store.append([Skin.new(layout=LEGACY_LAYOUT)], ids=["legacy"])
+
+
+def test_store_version_1(tmp_path: Path):
+    """
+    Test that stores from before layouts were recorded open with classic skins,
+    and are upgraded when appended to.
+    """
+    path = tmp_path / "skins.store"
+    red = Skin.filled(RED)
+    index = b"a\nb"
+    path.write_bytes(
+        struct.pack(
+            "<8sIIQQQ", b"SKINPYST", 1, 1, 2, 4096 + 2 * 64 * 64 * 4, len(index)
+        ).ljust(4096, b"\0")
+        + np.ascontiguousarray(red.image_color).tobytes() * 2
+        + index
+    )
+
+    store = SkinStore.open(path)
+    assert store.ids == ("a", "b")
+    assert [skin.layout for skin in store] == [CLASSIC_LAYOUT, CLASSIC_LAYOUT]
+
+    store = store.append([Skin.filled(GREEN, layout=SLIM_LAYOUT)], ids=["c"])
+    assert store.ids == ("a", "b", "c")
+    assert [skin.layout for skin in store] == [
+        CLASSIC_LAYOUT,
+        CLASSIC_LAYOUT,
+        SLIM_LAYOUT,
+    ]
+    assert np.array_equal(store[0].image_color, red.image_color)
+
+
+def test_store_invalid(tmp_path: Path):
+    path = tmp_path / "skins.store"
+    path.write_bytes(STEVE_PATH.read_bytes())
+
+    with pytest.raises(SkinStoreError):
+        SkinStore.open(path)
+
+
+def test_pack_cli(tmp_path: Path):
+    skins = tmp_path / "skins"
+    skins.mkdir()
+    shutil.copy(STEVE_PATH, skins / "steve.png")
+    shutil.copy(LAB_PATH, skins / "lab.png")
+    (skins / "broken.png").write_text("not a png")
+    path = tmp_path / "skins.store"
+
+    result = CliRunner().invoke(cli, ["pack", str(skins), "-o", str(path)])
+
+    assert result.exit_code == 1
+    assert "broken.png" in result.output
+    store = SkinStore.open(path)
+    assert store.ids == ("lab", "steve")
+    assert np.array_equal(
+        store.get("steve").image_color, Skin.from_path(STEVE_PATH).image_color
+    )
+
+    result = CliRunner().invoke(
+        cli, ["pack", str(skins / "lab.png"), "-o", str(path), "--append"]
+    )
+    assert result.exit_code == 0
+    assert len(SkinStore.open(path)) == 3
+
+    result = CliRunner().invoke(cli, ["compact", str(path)])
+    assert result.exit_code == 0
+    assert SkinStore.open(path).ids == ("steve", "lab")
+
+    result = CliRunner().invoke(
+        cli, ["pack", str(skins / "lab.png"), "-o", str(path), "--append", "--slim"]
+    )
+    assert result.exit_code == 0
+    store = SkinStore.open(path)
+    assert store.get("steve").layout == CLASSIC_LAYOUT
+    assert store.get("lab").layout == SLIM_LAYOUT
+
+
+def test_pack_append_creates_store(tmp_path: Path):
+    """
+    Test that appending to a store that doesn't exist yet creates it.
+    """
+    path = tmp_path / "skins.store"
+
+    result = CliRunner().invoke(
+        cli, ["pack", str(STEVE_PATH), "-o", str(path), "--append"]
+    )
+    assert result.exit_code == 0, result.output
+    assert SkinStore.open(path).ids == ("steve",)
+
+    result = CliRunner().invoke(
+        cli, ["pack", str(LAB_PATH), "-o", str(path), "--append", "--no-ids"]
+    )
+    assert result.exit_code == 2
+    assert "id index" in result.output
+
+
+def test_pack_other_sizes(tmp_path: Path):
+    """
+    Test that legacy and HD skins are skipped, without breaking a new store or
+    the one they're appended to.
+    """
+    skins = tmp_path / "skins"
+    skins.mkdir()
+    shutil.copy(STEVE_PATH, skins / "steve.png")
+    lab = Image.open(LAB_PATH)
+    lab.crop((0, 0, 64, 32)).save(skins / "legacy.png")
+    lab.resize((128, 128), Image.Resampling.NEAREST).save(skins / "hd.png")
+    path = tmp_path / "skins.store"
+
+    result = CliRunner().invoke(cli, ["pack", str(skins), "-o", str(path)])
+    assert result.exit_code == 1
+    assert "legacy.png" in result.output and "64x32" in result.output
+    assert "hd.png" in result.output and "128x128" in result.output
+    assert SkinStore.open(path).ids == ("steve",)
+
+    result = CliRunner().invoke(cli, ["pack", str(skins), "-o", str(path), "--append"])
+    assert result.exit_code == 1
+    store = SkinStore.open(path)
+    assert store.ids == ("steve", "steve")
+    assert np.array_equal(store[1].image_color, store[0].image_color)